@@ -0,0 +1,129 @@
+"""
+请求准入控制
+============
+
+限制同时处理的识别请求数 (max_in_flight)，超出时最多排队 max_queue 个；
+队列已满或排队超过 queue_timeout 秒的请求直接拒绝 (429 + Retry-After)，
+突发负载下服务按容量降级，而不是不断堆积线程直到内存耗尽。
+"""
+import math
+import time
+import threading
+
+from metrics import Histogram
+
+QUEUE_WAIT_MS_BUCKETS = [1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class AdmissionRejected(Exception):
+    """队列已满或排队超时，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """已准入的请求，处理完成后调用 release() (可重复调用)"""
+
+    __slots__ = ('_controller', '_started', '_released')
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._started = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.perf_counter() - self._started)
+
+
+class AdmissionController:
+    """
+    有界并发 + 有界排队 (线程安全)
+
+    参数:
+        max_in_flight: 同时处理的请求数上限
+        max_queue: 等待处理的请求数上限 (0 表示不排队，满载时立即拒绝)
+        queue_timeout: 单个请求最长排队秒数
+    """
+
+    def __init__(self, max_in_flight=4, max_queue=16, queue_timeout=30):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_wait_histogram = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+        self._service_seconds = None  # 请求处理耗时的指数移动平均 (估算 Retry-After)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        等待处理名额
+
+        返回:
+            AdmissionTicket
+        异常:
+            AdmissionRejected: 队列已满或排队超时
+        """
+        start = time.perf_counter()
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise AdmissionRejected('服务繁忙，请稍后重试', self._retry_after())
+                self.queued += 1
+                try:
+                    deadline = start + self.queue_timeout
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            self.rejected += 1
+                            raise AdmissionRejected('排队超时，请稍后重试', self._retry_after())
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            self.admitted += 1
+        self.queue_wait_histogram.observe((time.perf_counter() - start) * 1000)
+        return AdmissionTicket(self)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'service_ms': round(self._service_seconds * 1000, 1) if self._service_seconds else None,
+                'queue_wait_ms': self.queue_wait_histogram.snapshot(),
+            }
+
+    # ---------- 内部方法 ----------
+
+    def _release(self, elapsed):
+        with self._cond:
+            self.in_flight -= 1
+            if self._service_seconds is None:
+                self._service_seconds = elapsed
+            else:
+                self._service_seconds += 0.2 * (elapsed - self._service_seconds)
+            self._cond.notify()
+
+    def _retry_after(self):
+        """预计排在队尾的请求开始处理前需要等待的秒数 (至少 1 秒)"""
+        service = self._service_seconds or 1.0
+        waves = (self.queued + 1) / self.max_in_flight
+        return max(1, math.ceil(service * waves))
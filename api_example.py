@@ -18,6 +18,9 @@ API_URL = "http://localhost:5000/api/ocr"
 OCR_SERVICE_LOCAL = '1'      # 本地 PaddleOCR
 OCR_SERVICE_OCRSPACE = '2'   # OCR.space 在线
 
+# 复用 keep-alive 连接，多次调用不必每次重新建立连接
+_session = requests.Session()
+
 
 def ocr_file(file_path: str, ocr_service: str = OCR_SERVICE_LOCAL, save_result: bool = False) -> dict:
     """
@@ -43,7 +46,7 @@ def ocr_file(file_path: str, ocr_service: str = OCR_SERVICE_LOCAL, save_result:
             'save_result': 'true' if save_result else 'false'
         }
         
-        response = requests.post(API_URL, files=files, data=data)
+        response = _session.post(API_URL, files=files, data=data)
         response.raise_for_status()
         
         return response.json()
@@ -140,19 +143,28 @@ def example_get_lines():
 
 
 def example_batch_process():
-    """批量处理示例 - 对比两种服务"""
+    """批量处理示例 - 并发提交并对比两种服务 (大批量请使用 batch_client.py)"""
     import glob
+    from batch_client import BatchClient
     
     pdf_files = glob.glob("*.pdf")
-    for pdf in pdf_files:
-        # 使用本地识别
-        result1 = ocr_file(pdf, ocr_service=OCR_SERVICE_LOCAL)
-        # 使用 OCR.space
-        result2 = ocr_file(pdf, ocr_service=OCR_SERVICE_OCRSPACE)
+    amounts = {}
+    for service in (OCR_SERVICE_LOCAL, OCR_SERVICE_OCRSPACE):
+        def collect(record, data, service=service):
+            amounts.setdefault(record['file'], {})[service] = data['invoice_amount'] if data else None
         
-        if result1.get('success') and result2.get('success'):
-            amount1 = result1['data']['invoice_amount']
-            amount2 = result2['data']['invoice_amount']
+        client = BatchClient(API_URL, concurrency=4, ocr_service=service)
+        try:
+            summary = client.run(pdf_files, on_record=collect)
+        finally:
+            client.close()
+        print(f"服务 {service}: {summary['succeeded']}/{summary['requests']} 成功, "
+              f"p95 {summary['latency_ms']['p95']}ms")
+    
+    for pdf in pdf_files:
+        amount1 = amounts[pdf].get(OCR_SERVICE_LOCAL)
+        amount2 = amounts[pdf].get(OCR_SERVICE_OCRSPACE)
+        if amount1 is not None and amount2 is not None:
             print(f"{pdf}: 本地=￥{amount1}, OCR.space=￥{amount2}")
 
 
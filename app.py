@@ -3,13 +3,16 @@ OCR Web Application - Main Flask Application
 Supports image (JPG, PNG, JPEG) and PDF file OCR recognition
 """
 import os
-import re
-import uuid
+import math
+import time
+import atexit
 import logging
-import requests
+import threading
+import contextvars
 import base64
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request, Response, render_template, request, jsonify, send_file, g
 from werkzeug.utils import secure_filename
 from PIL import Image
 import io
@@ -23,26 +26,294 @@ logger = logging.getLogger(__name__)
 
 # Import configuration
 from config import (Config, ALLOWED_EXTENSIONS, OCR_CONFIG, UPLOAD_FOLDER, 
-                    RESULT_FOLDER, OCRSPACE_CONFIG)
+                    RESULT_FOLDER, OCRSPACE_CONFIG, OCRSPACE_CLIENT_CONFIG, OCRSPACE_CHUNK_CONFIG,
+                    CACHE_FOLDER, CACHE_CONFIG, RESULT_STORE_CONFIG,
+                    PDF_CONFIG, ENGINE_POOL_CONFIG, BATCHER_CONFIG, JOB_CONFIG,
+                    AMOUNT_ROI_CONFIG, PREPROCESS_CONFIG, WARMUP_CONFIG, INVOICE_FIELDS,
+                    ROUTER_CONFIG, PROFILER_CONFIG, UPLOAD_CONFIG, RESPONSE_CONFIG, ADMISSION_CONFIG,
+                    DEADLINE_CONFIG)
+from ocr_cache import OCRCache
+from result_store import ResultStore
+from upload_buffer import SpoolBuffer, UploadBuffer, open_pdf
+from pdf_render import PageRenderer
+from responses import RESPONSE_FORMATS, dumps, ocr_text_fields, negotiate_encoding, json_response
+from ocr_engine import (create_ocr_engine, parse_ocr_result, warmup_engine, engine_factory_name,
+                        normalize_boxes, line_details, restore_lines)
+from engine_pool import EnginePool
+from batch_scheduler import MicroBatcher
+from jobs import JobManager, JobQueueFull, PRIORITIES
+from preprocess import prepare_image
+from invoice_extractor import InvoiceExtractor, AMOUNT_XIAOXIE_SCORE
+from ocrspace_client import OCRSpaceClient, OCRSpaceError, OCRSpaceTimeout
+from router import LatencyRouter
+from admission import AdmissionController, AdmissionRejected
+from deadline import Deadline, as_completed_until
+from profiler import RequestProfiler, export_pstats, export_text, export_collapsed
+from metrics import (REGISTRY, STAGE_SECONDS_BUCKETS, stage, begin_request_timings, server_timing_header,
+                     peak_rss_bytes)
+
+
+class UploadRequest(Request):
+    """Keep uploaded files in memory; only files over UPLOAD_CONFIG['memory_max_bytes'] are spooled to disk"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpoolBuffer(UPLOAD_CONFIG['memory_max_bytes'], dir=UPLOAD_FOLDER)
+
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
+app.request_class = UploadRequest
+
+# Sampled per-request profiling (/admin/profiles)
+profiler = RequestProfiler(
+    sample_rate=PROFILER_CONFIG['sample_rate'],
+    secret=PROFILER_CONFIG['secret'],
+    mode=PROFILER_CONFIG['mode'],
+    interval_ms=PROFILER_CONFIG['interval_ms'],
+    max_profiles=PROFILER_CONFIG['max_profiles']
+)
+
+# Prometheus metrics (/metrics); stage timings come from metrics.stage()
+OCR_RECOGNITIONS = REGISTRY.counter(
+    'ocr_recognitions_total', 'OCR runs by engine and outcome (ok / truncated / error / cached)',
+    ['engine', 'outcome'])
+OCR_PAGES = REGISTRY.counter(
+    'ocr_pages_total', 'Pages processed by engine and source (ocr / text layer)', ['engine', 'source'])
+OCR_TRUNCATED = REGISTRY.counter(
+    'ocr_truncated_total', 'Recognitions stopped early by reason (timeout / disconnected)', ['engine', 'reason'])
+UPLOAD_BYTES = REGISTRY.counter(
+    'ocr_upload_bytes_total', 'Bytes of uploaded files received', ['endpoint'])
+PDF_RENDERED_PIXELS = REGISTRY.counter(
+    'ocr_pdf_rendered_pixels_total', 'Pixels rendered from PDF pages for OCR')
+PDF_RENDER_PEAK_BYTES = REGISTRY.histogram(
+    'ocr_pdf_render_peak_bytes', 'Largest page-buffer footprint held at once per PDF',
+    [1 << 20, 4 << 20, 16 << 20, 32 << 20, 64 << 20, 128 << 20, 256 << 20, 512 << 20, 1 << 30])
+HTTP_REQUESTS = REGISTRY.counter(
+    'ocr_http_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'method', 'status'])
+HTTP_SECONDS = REGISTRY.histogram(
+    'ocr_http_request_duration_seconds', 'HTTP request handling time (until the response starts)',
+    STAGE_SECONDS_BUCKETS, ['endpoint'])
+
+# OCR result cache (memory LRU + size-bounded disk tier)
+ocr_cache = OCRCache(
+    CACHE_FOLDER,
+    memory_entries=CACHE_CONFIG['memory_entries'],
+    disk_max_bytes=CACHE_CONFIG['disk_max_bytes'],
+    enabled=CACHE_CONFIG['enabled']
+)
+
+# Saved OCR results (/download, /api/results, /api/extract): SQLite index + sharded, compressed files
+result_store = ResultStore(
+    RESULT_FOLDER,
+    max_bytes=RESULT_STORE_CONFIG['max_bytes'],
+    ttl_seconds=RESULT_STORE_CONFIG['ttl_days'] * 86400,
+    compression=RESULT_STORE_CONFIG['compression']
+)
+
+# Bounded concurrency + queue for recognition endpoints (429 + Retry-After when full)
+admission = AdmissionController(
+    max_in_flight=ADMISSION_CONFIG['max_in_flight'],
+    max_queue=ADMISSION_CONFIG['max_queue'],
+    queue_timeout=ADMISSION_CONFIG['queue_timeout']
+)
+
+# Precompiled invoice field extractors (single pass over the OCR lines)
+# (invoice_amount is always extracted; the API responses depend on it)
+invoice_extractor = InvoiceExtractor(dict.fromkeys(['invoice_amount', *INVOICE_FIELDS]))
+amount_extractor = InvoiceExtractor(['invoice_amount'])
 
 # Lazy load PaddleOCR to speed up startup
 _ocr_instance = None
+_ocr_lock = threading.Lock()
 
 def get_ocr():
     """Get or create PaddleOCR instance (lazy loading)"""
     global _ocr_instance
     if _ocr_instance is None:
-        logger.info("Initializing PaddleOCR engine...")
-        from paddleocr import PaddleOCR
-        _ocr_instance = PaddleOCR(**OCR_CONFIG)
-        logger.info("PaddleOCR engine initialized successfully")
+        with _ocr_lock:
+            if _ocr_instance is None:
+                logger.info("Initializing PaddleOCR engine...")
+                _ocr_instance = create_ocr_engine(OCR_CONFIG)
+                logger.info("PaddleOCR engine initialized successfully")
     return _ocr_instance
 
 
+# Engine worker pool (enabled when ENGINE_POOL_CONFIG['size'] > 0)
+_engine_pool = None
+_engine_pool_lock = threading.Lock()
+
+def get_engine_pool():
+    """Get or start the PaddleOCR worker pool, None when the pool is disabled"""
+    global _engine_pool
+    if ENGINE_POOL_CONFIG['size'] <= 0:
+        return None
+    if _engine_pool is None:
+        with _engine_pool_lock:
+            if _engine_pool is None:
+                pool = EnginePool(
+                    ENGINE_POOL_CONFIG['size'],
+                    OCR_CONFIG,
+                    cpu_threads=ENGINE_POOL_CONFIG['cpu_threads'],
+                    task_timeout=ENGINE_POOL_CONFIG['task_timeout'],
+                    warmup_runs=WARMUP_CONFIG['warmup_runs'],
+                    interactive_reserve=ENGINE_POOL_CONFIG['interactive_reserve']
+                )
+                pool.start()
+                atexit.register(pool.shutdown)
+                _engine_pool = pool
+    return _engine_pool
+
+
+# Engine load / warmup state reported by /readyz
+_engine_state = {
+    'ready': False,
+    'loading': False,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'error': None
+}
+
+def load_and_warmup_engine():
+    """
+    Load the OCR engine (or start the worker pool) and run a synthetic warmup inference
+    
+    Load and warmup times are recorded in _engine_state for /readyz.
+    """
+    _engine_state.update(loading=True, error=None)
+    try:
+        pool = get_engine_pool()
+        if pool is not None:
+            if not pool.wait_ready(timeout=WARMUP_CONFIG['timeout']):
+                raise Exception(f"Engine pool not ready after {WARMUP_CONFIG['timeout']}s")
+            workers = pool.health()['workers']
+            _engine_state['load_seconds'] = max(w['load_seconds'] or 0 for w in workers)
+            _engine_state['warmup_seconds'] = max(w['warmup_seconds'] or 0 for w in workers)
+        else:
+            start = time.perf_counter()
+            ocr = get_ocr()
+            _engine_state['load_seconds'] = round(time.perf_counter() - start, 2)
+            start = time.perf_counter()
+            if WARMUP_CONFIG['warmup_runs'] > 0:
+                warmup_engine(ocr, WARMUP_CONFIG['warmup_runs'])
+            _engine_state['warmup_seconds'] = round(time.perf_counter() - start, 2)
+        _engine_state['ready'] = True
+        logger.info(f"OCR engine ready: load {_engine_state['load_seconds']}s, "
+                    f"warmup {_engine_state['warmup_seconds']}s")
+    except Exception as e:
+        _engine_state['error'] = str(e)
+        logger.error(f"OCR engine warmup failed: {str(e)}")
+    finally:
+        _engine_state['loading'] = False
+
+
+def start_engine_warmup():
+    """Load and warm up the engine in the background (eager startup mode)"""
+    threading.Thread(target=load_and_warmup_engine, name='ocr-warmup', daemon=True).start()
+
+
+# Cross-request micro-batching for single images (enabled via BATCHER_CONFIG)
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Get or start the micro-batching scheduler, None when batching is disabled"""
+    global _batcher
+    if not BATCHER_CONFIG['enabled']:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    process_image_batch,
+                    max_batch_size=BATCHER_CONFIG['max_batch_size'],
+                    max_wait_ms=BATCHER_CONFIG['max_wait_ms'],
+                    # One batch in flight per pool worker so every core stays busy
+                    max_concurrent_batches=max(1, ENGINE_POOL_CONFIG['size'])
+                )
+    return _batcher
+
+
+# True while running an async job: its OCR goes to the engine pool's background lane
+_background_work = contextvars.ContextVar('background_work', default=False)
+
+
+def run_job(job):
+    """Background job body: OCR the saved upload and build the result payload"""
+    payload = job.payload
+    token = _background_work.set(True)
+    try:
+        texts, fields, cached = run_ocr(
+            payload['upload'], payload['filename'], payload['ocr_service'],
+            progress=job.update_progress
+        )
+    finally:
+        _background_work.reset(token)
+    result_filename = save_result(texts, payload['filename']) if texts else None
+    return {
+        'lines': texts,
+        'line_count': len(texts),
+        'invoice_amount': fields['invoice_amount'],
+        'invoice_fields': fields,
+        'ocr_service': payload['ocr_service_name'],
+        'cached': cached,
+        'download_file': result_filename
+    }
+
+
+def cleanup_job(job):
+    """Release the upload buffer once a job has finished"""
+    job.payload['upload'].close()
+
+
+# Asynchronous job queue for large documents (/api/jobs)
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager():
+    """Get or start the background job manager"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                manager = JobManager(
+                    run_job,
+                    workers=JOB_CONFIG['workers'],
+                    max_queue=JOB_CONFIG['max_queue'],
+                    max_finished=JOB_CONFIG['max_finished'],
+                    cleanup_fn=cleanup_job
+                )
+                manager.start()
+                _job_manager = manager
+    return _job_manager
+
+
+# Latency-aware engine router for ocr_service=auto
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """Get or create the engine router (tracks every local / OCR.space recognition)"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                prior = ROUTER_CONFIG['prior_ms_per_page']
+                _router = LatencyRouter(
+                    {
+                        'local': {'prior_ms_per_page': prior['local'],
+                                  'capacity': max(1, ENGINE_POOL_CONFIG['size'])},
+                        'ocrspace': {'prior_ms_per_page': prior['ocrspace'],
+                                     'capacity': OCRSPACE_CLIENT_CONFIG['max_concurrency']},
+                    },
+                    window=ROUTER_CONFIG['window'],
+                    hedge=ROUTER_CONFIG['hedge'],
+                    hedge_min_ms=ROUTER_CONFIG['hedge_min_ms'],
+                    failure_cooldown=ROUTER_CONFIG['failure_cooldown']
+                )
+    return _router
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
@@ -54,85 +325,243 @@ def get_file_extension(filename):
     return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
 
 
-def process_image(image_path):
-    """Process a single image with OCR (PaddleOCR 3.x API)"""
-    ocr = get_ocr()
+def preprocess_image(image, stats=None):
+    """
+    Apply the in-memory preprocessing stage (EXIF orientation, RGB, size cap)
+    
+    Always returns an HxWx3 uint8 BGR ndarray, which is what the OCR engine
+    and the worker pool accept. When PREPROCESS_CONFIG is disabled, ndarrays
+    pass through unchanged and file paths / bytes are only decoded (no size
+    cap). stats, if given, accumulates pixel counts and time under
+    stats['preprocess'].
+    """
+    if not PREPROCESS_CONFIG['enabled']:
+        if hasattr(image, 'shape'):
+            return image
+        with stage('preprocess'):
+            return prepare_image(image, max_side=None)
+    prep_stats = stats.setdefault('preprocess', {}) if stats is not None else None
+    with stage('preprocess'):
+        return prepare_image(image, max_side=PREPROCESS_CONFIG['max_side'], stats=prep_stats)
+
+
+def process_image(image, stats=None):
+    """
+    Process a single image with OCR (PaddleOCR 3.x API)
+    
+    image: file path, image bytes, or an HxWx3 uint8 BGR ndarray (e.g. a rendered PDF page)
+    
+    The image is preprocessed (or at least decoded to an ndarray) in memory
+    first, so the engine only ever receives ndarrays (see preprocess_image).
+    Concurrent single-image requests are merged into one batch when the
+    micro-batching scheduler is enabled (async jobs bypass it so that their
+    work stays in the engine pool's background lane).
+    """
+    image = preprocess_image(image, stats=stats)
+    batcher = get_batcher() if not _background_work.get() else None
+    if batcher is not None:
+        # Includes the time spent waiting for the batch to fill
+        with stage('ocr.batched'):
+            return batcher.predict(image)
+    return process_image_batch([image])[0]
+
+
+def pixmap_to_ndarray(pix):
+    """
+    Wrap a PyMuPDF pixmap as an HxWx3 BGR ndarray without copying.
+    
+    The array is a view over pix.samples_mv, so the pixmap must stay alive
+    while the array is in use.
+    """
+    import numpy as np
+    
+    image = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n == 1:
+        return np.repeat(image, 3, axis=2)
+    # RGB -> BGR (PaddleOCR expects cv2 channel order); a strided view, no copy
+    return image[:, :, 2::-1]
+
+
+def process_image_batch(images):
+    """
+    OCR several images with a single predict() call
+    
+    Returns one list of text lines per input image, in input order. Lines
+    are OCRLine strings whose boxes are fractions of their image's size.
+    Dispatches to the engine worker pool when it is enabled; async jobs use
+    the pool's background lane.
+    """
+    if not images:
+        return []
     try:
-        # Use new predict() API for PaddleOCR 3.x
-        result = ocr.predict(image_path)
-        if result is None or len(result) == 0:
-            return []
-        
-        # Extract text from OCR result
-        # PaddleOCR 3.x returns result in different format
-        texts = []
-        for item in result:
-            if item is None:
-                continue
-            # Handle new result format
-            if hasattr(item, 'rec_texts'):
-                # Direct access to recognized texts
-                texts.extend(item.rec_texts)
-            elif isinstance(item, dict):
-                # Dictionary format with 'rec_text' key
-                if 'rec_text' in item:
-                    texts.append(item['rec_text'])
-                elif 'rec_texts' in item:
-                    texts.extend(item['rec_texts'])
-            elif isinstance(item, list):
-                # Legacy format: list of [bbox, (text, score)]
-                for line in item:
-                    if line and len(line) >= 2:
-                        if isinstance(line[1], tuple):
-                            texts.append(line[1][0])
-                        elif isinstance(line[1], str):
-                            texts.append(line[1])
-        return texts
+        pool = get_engine_pool()
+        if pool is not None:
+            with stage('ocr.predict'):
+                results = pool.predict(images, background=_background_work.get())
+        else:
+            ocr = get_ocr()
+            # Use new predict() API for PaddleOCR 3.x (detection + recognition in one call)
+            with stage('ocr.predict'):
+                result = ocr.predict(list(images))
+            result = list(result) if result is not None else []
+            if len(result) != len(images):
+                raise Exception(f"OCR engine returned {len(result)} results for {len(images)} images")
+            results = [parse_ocr_result(item) for item in result]
+        return [normalize_boxes(lines, image) for lines, image in zip(results, images)]
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
+        logger.error(f"Error processing image batch: {str(e)}")
         raise
 
 
-def process_pdf(pdf_path):
-    """Process PDF file - convert to images and OCR each page using PyMuPDF"""
+def extract_text_layer(page):
+    """
+    Return the text lines of a born-digital PDF page from its embedded text layer,
+    or None when the layer is missing or too sparse to trust (e.g. scanned pages)
+    """
+    text = page.get_text('text', sort=True)
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    char_count = sum(len(line.replace(' ', '')) for line in lines)
+    if char_count < PDF_CONFIG['text_layer_min_chars']:
+        return None
+    return lines
+
+
+def mark_truncated(stats, deadline, engine, pages_done, pages_total):
+    """Record that a recognition stopped early at its deadline (stats may be None)"""
+    reason = deadline.reason or 'timeout'
+    OCR_TRUNCATED.inc(engine=engine, reason=reason)
+    logger.warning(f"OCR stopped after {pages_done}/{pages_total} pages ({engine}, {reason})")
+    if stats is not None:
+        stats.update({
+            'truncated': True,
+            'truncated_reason': reason,
+            'pages': pages_total,
+            'pages_done': pages_done,
+        })
+
+
+def make_page_renderer():
+    """
+    PDF renderer for one request (see pdf_render.PageRenderer)
+    
+    Per-page zoom: target DPI, capped by the pixel budget and by the side
+    length preprocessing would shrink the page to anyway.
+    """
+    return PageRenderer(
+        dpi=PDF_CONFIG['dpi'],
+        max_pixels=PDF_CONFIG['max_page_pixels'],
+        max_side=PREPROCESS_CONFIG['max_side'] if PREPROCESS_CONFIG['enabled'] else None,
+        max_bytes=PDF_CONFIG['max_render_bytes']
+    )
+
+
+def record_render_stats(renderer):
+    """Export a finished renderer's pixel and peak-buffer counts as metrics, returning its stats"""
+    render_stats = renderer.stats()
+    PDF_RENDERED_PIXELS.inc(render_stats['pixels'])
+    if render_stats['pages']:
+        PDF_RENDER_PEAK_BYTES.observe(render_stats['peak_bytes'])
+    return render_stats
+
+
+def iter_pdf_pages(pdf_source, stats=None, batch_size=None, deadline=None):
+    """
+    OCR PDF pages in batches using PyMuPDF, rendering pages in memory
+    
+    pdf_source: UploadBuffer, PDF bytes or file path (see upload_buffer.open_pdf)
+    
+    Generator yielding (page_number, total_pages, page_texts, source) in page
+    order as soon as each batch finishes. source is 'text' when the page's
+    embedded text layer was used (PDF_CONFIG['text_layer']) and 'ocr' when
+    the page was rasterized and OCR'd. Pages needing OCR are grouped into
+    batches of batch_size (default PDF_CONFIG['batch_size']) for one
+    predict() call each. If a dict is passed as stats, it is filled with
+    page count, per-page sources, batch size and throughput (pages/sec)
+    once all pages are done.
+    
+    Each page is rendered at the zoom that hits PDF_CONFIG['dpi'] within the
+    per-page pixel budget, and a batch is split further when its page buffers
+    would exceed PDF_CONFIG['max_render_bytes'] (see pdf_render.PageRenderer);
+    stats['render'] reports pixels rendered, peak buffer bytes and zoom range.
+    
+    deadline (a deadline.Deadline) is checked between batches: once it has
+    expired or the client disconnected, the remaining pages are skipped and
+    stats gets truncated / truncated_reason / pages_done (see mark_truncated).
+    """
     pdf_document = None
     try:
-        import fitz  # PyMuPDF
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            raise Exception("PDF processing requires PyMuPDF. Please run: pip install pymupdf")
         
-        # Open PDF
-        logger.info(f"Converting PDF to images: {pdf_path}")
-        pdf_document = fitz.open(pdf_path)
+        # Open PDF (from memory when the upload was not spooled to disk)
+        pdf_document = open_pdf(pdf_source)
+        logger.info(f"Processing PDF pages: {getattr(pdf_source, 'filename', pdf_document.name) or 'in-memory PDF'}")
         
-        all_texts = []
         total_pages = len(pdf_document)
+        batch_size = max(1, batch_size or PDF_CONFIG['batch_size'])
+        renderer = make_page_renderer()
+        page_sources = []
+        start_time = time.perf_counter()
         
-        for i in range(total_pages):
-            logger.info(f"Processing page {i + 1}/{total_pages}")
+        for batch_start in range(0, total_pages, batch_size):
+            if deadline is not None and deadline.expired():
+                mark_truncated(stats, deadline, 'local', batch_start, total_pages)
+                break
+            batch_pages = range(batch_start, min(batch_start + batch_size, total_pages))
             
-            # Get page and convert to image
-            page = pdf_document[i]
-            # Use higher resolution for better OCR accuracy
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom = ~144 DPI
-            pix = page.get_pixmap(matrix=mat)
+            # Born-digital pages: take the embedded text layer, skip OCR
+            page_texts = {}
+            if PDF_CONFIG['text_layer']:
+                with stage('pdf.text_layer'):
+                    for i in batch_pages:
+                        lines = extract_text_layer(pdf_document[i])
+                        if lines is not None:
+                            page_texts[i] = lines
+            ocr_pages = [i for i in batch_pages if i not in page_texts]
             
-            # Save image temporarily
-            temp_image_path = os.path.join(UPLOAD_FOLDER, f"temp_page_{uuid.uuid4().hex}.png")
-            pix.save(temp_image_path)
+            if ocr_pages:
+                logger.info(f"OCR pages {', '.join(str(i + 1) for i in ocr_pages)}/{total_pages}")
+                
+                # Render in memory-bounded groups; keep pixmaps alive while their buffers are in use
+                for group in renderer.groups(pdf_document, ocr_pages, batch_size):
+                    with stage('pdf.render'):
+                        pixmaps = [renderer.render(pdf_document[i], zoom) for i, zoom in group]
+                    images = [preprocess_image(pixmap_to_ndarray(pix), stats=stats) for pix in pixmaps]
+                    
+                    # Hand the pixel buffers straight to the OCR engine (no temp PNG)
+                    page_texts.update(zip([i for i, _ in group], process_image_batch(images)))
+                    
+                    # Release the page buffers before rendering the next group
+                    del images, pixmaps
+                    renderer.release()
             
-            try:
-                # OCR the page
-                page_texts = process_image(temp_image_path)
-                if page_texts:
-                    all_texts.append(f"--- 第 {i + 1} 页 ---")
-                    all_texts.extend(page_texts)
-            finally:
-                # Clean up temp file
-                if os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
-        
-        return all_texts
-    except ImportError:
-        raise Exception("PDF processing requires PyMuPDF. Please run: pip install pymupdf")
+            for i in batch_pages:
+                source = 'ocr' if i in ocr_pages else 'text'
+                page_sources.append(source)
+                OCR_PAGES.inc(engine='local', source=source)
+                yield i + 1, total_pages, page_texts[i], source
+        
+        render_stats = record_render_stats(renderer)
+        
+        elapsed = time.perf_counter() - start_time
+        pages_done = len(page_sources)
+        pages_per_sec = pages_done / elapsed if elapsed > 0 else 0.0
+        text_pages = page_sources.count('text')
+        logger.info(f"PDF finished: {pages_done}/{total_pages} pages ({text_pages} from text layer) in {elapsed:.2f}s "
+                    f"({pages_per_sec:.2f} pages/sec, batch_size={batch_size})")
+        if stats is not None:
+            stats.update({
+                'pages': total_pages,
+                'text_layer_pages': text_pages,
+                'ocr_pages': pages_done - text_pages,
+                'page_sources': page_sources,
+                'batch_size': batch_size,
+                'render': render_stats,
+                'elapsed_ms': round(elapsed * 1000, 1),
+                'pages_per_sec': round(pages_per_sec, 3),
+            })
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}")
         raise
@@ -142,86 +571,246 @@ def process_pdf(pdf_path):
             pdf_document.close()
 
 
+def process_pdf(pdf_source, stats=None, progress=None, deadline=None):
+    """
+    Process PDF file - OCR every page and merge the results with page markers
+    
+    progress, if given, is called as progress(pages_done, pages_total)
+    after each page. See iter_pdf_pages() for stats and deadline (the
+    pages finished before the deadline are returned).
+    """
+    all_texts = []
+    for page_number, total_pages, page_texts, _ in iter_pdf_pages(pdf_source, stats=stats, deadline=deadline):
+        if page_texts:
+            all_texts.append(f"--- 第 {page_number} 页 ---")
+            all_texts.extend(page_texts)
+        if progress is not None:
+            progress(page_number, total_pages)
+    return all_texts
+
+
 # ==================== 第三方 OCR API 处理 ====================
 
-def process_ocrspace(file_path):
+# Shared OCR.space client (pooled connections, concurrency limit, rate limit, retries)
+_ocrspace_client = None
+_ocrspace_client_lock = threading.Lock()
+
+def get_ocrspace_client():
+    """Get or create the shared OCR.space client"""
+    global _ocrspace_client
+    if _ocrspace_client is None:
+        with _ocrspace_client_lock:
+            if _ocrspace_client is None:
+                _ocrspace_client = OCRSpaceClient(
+                    OCRSPACE_CONFIG['endpoint'],
+                    OCRSPACE_CONFIG['api_key'],
+                    language=OCRSPACE_CONFIG['language'],
+                    engine=OCRSPACE_CONFIG['engine'],
+                    **OCRSPACE_CLIENT_CONFIG
+                )
+    return _ocrspace_client
+
+
+def parse_ocrspace_results(parsed_results, first_page=1, markers=None):
+    """
+    把 OCR.space 的 ParsedResults 转为识别行列表
+    
+    参数:
+        parsed_results: 接口返回的 ParsedResults 列表 (每页一项)
+        first_page: 第一项对应的页码 (分块上传时为块的起始页)
+        markers: 是否插入分页标记，默认多页时插入
+    """
+    if markers is None:
+        markers = len(parsed_results) > 1
+    texts = []
+    for i, page_result in enumerate(parsed_results):
+        page_number = first_page + i
+        if page_result.get('FileParseExitCode') == 1:
+            parsed_text = page_result.get('ParsedText', '')
+            if parsed_text:
+                # 按行分割
+                lines = [line.strip() for line in parsed_text.split('\n') if line.strip()]
+                if markers:
+                    texts.append(f"--- 第 {page_number} 页 ---")
+                texts.extend(lines)
+        else:
+            error_msg = page_result.get('ErrorMessage', 'Unknown error')
+            logger.warning(f"Page {page_number} OCR failed: {error_msg}")
+    return texts
+
+
+def split_pdf_chunks(pdf_document, pages_per_chunk):
+    """
+    按页拆分已打开的 PDF
+    
+    返回:
+        [(起始页索引, 块 PDF 字节), ...]
+    """
+    import fitz  # PyMuPDF
+    
+    chunks = []
+    total_pages = len(pdf_document)
+    for start in range(0, total_pages, pages_per_chunk):
+        end = min(start + pages_per_chunk, total_pages) - 1
+        with fitz.open() as chunk:
+            chunk.insert_pdf(pdf_document, from_page=start, to_page=end)
+            chunks.append((start, chunk.tobytes()))
+    return chunks
+
+
+def process_ocrspace_chunked(upload, stats=None, progress=None, deadline=None):
+    """
+    大 PDF 拆成页块并发提交 OCR.space，按页序重组结果
+    
+    块数超过 max_parallel 时排队提交；某块失败只重试该块 (最多 chunk_retries 轮)，
+    仍失败的页跳过并记入 stats['failed_pages']，全部块失败时抛出异常。
+    deadline 到期 (或客户端断开) 时取消未开始的块、不再等待进行中的块，
+    返回已完成的块并在 stats 中标记 truncated，未完成的页记入 stats['pending_pages']。
+    
+    返回:
+        识别文本列表；PDF 页数不足 min_pages 时返回 None (由调用方整份上传)
+    """
+    config = OCRSPACE_CHUNK_CONFIG
+    pages_per_chunk = max(1, config['pages_per_chunk'])
+    with open_pdf(upload) as pdf_document:
+        total_pages = len(pdf_document)
+        if total_pages < max(config['min_pages'], pages_per_chunk + 1):
+            return None
+        chunks = split_pdf_chunks(pdf_document, pages_per_chunk)
+    
+    client = get_ocrspace_client()
+    base_name = os.path.splitext(upload.filename)[0]
+    results = {}   # 起始页索引 -> 识别行
+    errors = {}    # 起始页索引 -> 最后一次错误
+    pages_done = 0
+    pending = chunks
+    start_time = time.perf_counter()
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, config['max_parallel']), thread_name_prefix='ocrspace-chunk')
+    try:
+        for attempt in range(config['chunk_retries'] + 1):
+            futures = {
+                executor.submit(client.parse, f"{base_name}_p{start + 1}.pdf", data, deadline=deadline): (start, data)
+                for start, data in pending
+            }
+            failed = []
+            for future in as_completed_until(futures, deadline):
+                start, data = futures[future]
+                try:
+                    parsed_results = future.result()
+                except OCRSpaceError as e:
+                    logger.warning(f"OCR.space chunk at page {start + 1} failed "
+                                   f"(attempt {attempt + 1}): {str(e)}")
+                    errors[start] = e
+                    failed.append((start, data))
+                    continue
+                errors.pop(start, None)
+                results[start] = parse_ocrspace_results(parsed_results, first_page=start + 1, markers=True)
+                pages_done += min(pages_per_chunk, total_pages - start)
+                if progress is not None:
+                    progress(pages_done, total_pages)
+            # 到期后不再重试 (块超时多半是截止时间导致的)
+            if not failed or (deadline is not None and deadline.expired()):
+                break
+            pending = failed
+    finally:
+        # 到期时丢弃未开始的块，进行中的请求在后台结束 (超时不超过截止时间)
+        truncated = deadline is not None and deadline.expired() and pages_done < total_pages
+        executor.shutdown(wait=not truncated, cancel_futures=truncated)
+    
+    if truncated:
+        mark_truncated(stats, deadline, 'ocrspace', pages_done, total_pages)
+    elif not results:
+        raise next(iter(errors.values()))
+    
+    # 失败的块 -> failed_pages；到期时既没有结果也没有失败的块 (未开始或进行中) -> pending_pages
+    failed_pages = []
+    pending_pages = []
+    for start, _ in chunks:
+        if start in results:
+            continue
+        pages = range(start + 1, min(start + pages_per_chunk, total_pages) + 1)
+        (failed_pages if start in errors else pending_pages).extend(pages)
+    
+    if stats is not None:
+        stats['pages'] = total_pages
+        stats['pages_done'] = pages_done
+        stats['chunks'] = len(chunks)
+        stats['pages_per_chunk'] = pages_per_chunk
+        stats['failed_pages'] = failed_pages
+        stats['pending_pages'] = pending_pages
+        stats['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+    
+    texts = []
+    for start in sorted(results):
+        texts.extend(results[start])
+    return texts
+
+
+def process_ocrspace(upload, stats=None, progress=None, deadline=None):
     """
     使用 OCR.space API 处理图片/PDF
     
     参数:
-        file_path: 文件路径
+        upload: UploadBuffer (内存中的文件直接作为 multipart 内容转发)
+        stats: 可选字典，填入页数；分块处理时另填块数、失败页
+        progress: 可选回调 progress(已完成页数, 总页数)
+        deadline: 可选截止时间 (deadline.Deadline)，请求超时和重试不超过剩余时间；
+                  到期时返回已完成的页 (整份上传时为空列表) 并在 stats 中标记 truncated
     返回:
         识别文本列表
     """
     try:
-        api_key = OCRSPACE_CONFIG['api_key']
-        endpoint = OCRSPACE_CONFIG['endpoint']
-        
-        # 读取文件
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-        
-        # 获取文件扩展名
-        ext = get_file_extension(file_path)
-        filename = os.path.basename(file_path)
-        
-        # 准备请求
-        payload = {
-            'apikey': api_key,
-            'language': OCRSPACE_CONFIG['language'],
-            'OCREngine': OCRSPACE_CONFIG['engine'],
-            'isOverlayRequired': 'false',
-        }
+        filename = upload.filename
         
-        files = {
-            'file': (filename, file_data)
-        }
+        if OCRSPACE_CHUNK_CONFIG['enabled'] and get_file_extension(filename) == 'pdf':
+            logger.info(f"Calling OCR.space API in page chunks for: {filename}")
+            chunk_stats = {} if stats is None else stats
+            with stage('ocrspace.request'):
+                texts = process_ocrspace_chunked(upload, stats=chunk_stats, progress=progress, deadline=deadline)
+            if texts is not None:
+                OCR_PAGES.inc(chunk_stats['pages_done'], engine='ocrspace', source='ocr')
+                logger.info(f"OCR.space extracted {len(texts)} lines")
+                return texts
         
         logger.info(f"Calling OCR.space API for: {filename}")
-        
-        # 发送请求
-        response = requests.post(
-            endpoint,
-            files=files,
-            data=payload,
-            timeout=60
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # 检查错误
-        if result.get('IsErroredOnProcessing'):
-            error_msg = result.get('ErrorMessage', ['Unknown error'])
-            raise Exception(f"OCR.space API error: {error_msg}")
-        
-        # 提取文本
-        texts = []
-        parsed_results = result.get('ParsedResults', [])
-        
-        for i, page_result in enumerate(parsed_results):
-            if page_result.get('FileParseExitCode') == 1:
-                parsed_text = page_result.get('ParsedText', '')
-                if parsed_text:
-                    # 按行分割
-                    lines = [line.strip() for line in parsed_text.split('\n') if line.strip()]
-                    if len(parsed_results) > 1:
-                        texts.append(f"--- 第 {i + 1} 页 ---")
-                    texts.extend(lines)
-            else:
-                error_msg = page_result.get('ErrorMessage', 'Unknown error')
-                logger.warning(f"Page {i + 1} OCR failed: {error_msg}")
+        try:
+            with stage('ocrspace.request'):
+                if upload.in_memory:
+                    parsed_results = get_ocrspace_client().parse(filename, upload.data, deadline=deadline)
+                else:
+                    with upload.open() as f:
+                        parsed_results = get_ocrspace_client().parse(filename, f, deadline=deadline)
+        except OCRSpaceTimeout:
+            if deadline is None or not deadline.expired():
+                raise
+            # 整份上传没有部分结果
+            mark_truncated(stats, deadline, 'ocrspace', 0, count_pages(upload, get_file_extension(filename)))
+            return []
+        texts = parse_ocrspace_results(parsed_results)
+        OCR_PAGES.inc(len(parsed_results), engine='ocrspace', source='ocr')
+        if stats is not None:
+            stats['pages'] = len(parsed_results)
+        if progress is not None:
+            progress(1, 1)
         
         logger.info(f"OCR.space extracted {len(texts)} lines")
         return texts
         
-    except requests.exceptions.Timeout:
+    except OCRSpaceTimeout:
         raise Exception("OCR.space API 请求超时，请稍后重试")
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"OCR.space API 网络错误: {str(e)}")
-    except Exception as e:
+    except OCRSpaceError as e:
         logger.error(f"OCR.space error: {str(e)}")
-        raise
+        raise Exception(str(e))
+
+
+def extract_invoice_fields(texts):
+    """
+    从识别结果中一次扫描提取全部配置的发票字段 (INVOICE_FIELDS)
+    返回: {字段名: 值}，发票金额未找到为 "0"，其他字段未找到为 ""
+    """
+    with stage('extract'):
+        return invoice_extractor.extract(texts)
 
 
 def extract_invoice_amount(texts):
@@ -236,76 +825,553 @@ def extract_invoice_amount(texts):
     注意: 多个"小写"匹配时优先选择位置最靠后的 (通常是价税合计)
     返回: 金额字符串，未找到返回 "0"
     """
-    xiaoxie_candidates = []  # 小写相关的匹配 (行号, 金额值, 金额字符串)
-    other_candidates = []    # 其他匹配 (备用)
+    return amount_extractor.extract(texts)['invoice_amount']
+
+
+def find_confident_amount(texts):
+    """返回"小写"规则命中的发票金额，没有时返回 None"""
+    candidate = amount_extractor.best(texts).get('invoice_amount')
+    if candidate is not None and candidate.score >= AMOUNT_XIAOXIE_SCORE:
+        return candidate.value
+    return None
+
+
+class RunningInvoiceAmount:
+    """
+    逐页更新的发票金额估计 (用于流式返回)
+    
+    与 extract_invoice_amount 规则一致: "小写"匹配优先，同类匹配取位置最靠后的；
+    只保留当前最佳结果，内存不随页数增长
+    """
+    
+    def __init__(self):
+        self.amount = "0"
+        self._score = 0
+    
+    def update(self, page_texts):
+        """加入一页识别结果，返回当前金额估计"""
+        candidate = amount_extractor.best(page_texts).get('invoice_amount')
+        if candidate is not None and candidate.score >= self._score:
+            self.amount = candidate.value
+            self._score = candidate.score
+        return self.amount
+
+
+# ==================== 发票金额快速提取 (ROI) ====================
+
+def iter_region_batches(upload, extension, region, stats=None):
+    """
+    按比例区域裁剪页面，按批产出预处理后的 BGR ndarray 列表
+    
+    PDF 只渲染区域内像素 (clip)，缩放、单页像素上限和渲染内存上限与整页渲染相同
+    (PageRenderer，预算按区域尺寸计算)，渲染像素计入监控指标；
+    每批的像素缓冲在调用方处理完该批、取下一批时释放。
+    跳过自带文本层的页面 (由调用方单独处理)。
+    """
+    x0, y0, x1, y1 = region
+    
+    if extension == 'pdf':
+        renderer = make_page_renderer()
+        try:
+            with open_pdf(upload) as pdf_document:
+                pages = [i for i in range(min(len(pdf_document), AMOUNT_ROI_CONFIG['max_pages']))
+                         if not (PDF_CONFIG['text_layer'] and extract_text_layer(pdf_document[i]) is not None)]
+                for group in renderer.groups(pdf_document, pages, max(1, len(pages)), region=region):
+                    with stage('pdf.render'):
+                        pixmaps = [renderer.render(pdf_document[i], zoom, region=region) for i, zoom in group]
+                    images = [preprocess_image(pixmap_to_ndarray(pix), stats=stats) for pix in pixmaps]
+                    yield images
+                    del images, pixmaps
+                    renderer.release()
+        finally:
+            render_stats = record_render_stats(renderer)
+            if stats is not None:
+                stats['roi_render'] = render_stats
+    else:
+        image = preprocess_image(upload.source, stats=stats)
+        height, width = image.shape[:2]
+        yield [image[int(height * y0):int(height * y1), int(width * x0):int(width * x1)]]
+
+
+def extract_amount_fast(upload, filename, ocr_service, stats=None, deadline=None):
+    """
+    只提取发票金额的快速路径 (mode=amount)
+    
+    顺序:
+        1. 结果缓存命中时直接返回缓存中的金额
+        2. PDF 自带文本层的页面直接从文本中提取
+        3. 依次识别 AMOUNT_ROI_CONFIG['regions'] 中的区域，找到"小写"金额即停止
+        4. 以上都未找到时回退到整页识别 (deadline 只作用于这一步，见 run_ocr)
+    
+    返回:
+        (发票金额, 金额来源: cache / text_layer / roi / full_page)
+    """
+    start_time = time.perf_counter()
+    extension = get_file_extension(filename)
+    ocr_service = resolve_ocr_service(upload, filename, ocr_service)
+    
+    def finish(amount, source, **extra):
+        if stats is not None:
+            stats.update(extra)
+            stats['amount_source'] = source
+            stats['total_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+        return amount, source
+    
+    _, cached = lookup_cache(upload, filename, ocr_service)
+    if cached is not None:
+        return finish(cached['invoice_amount'], 'cache')
+    
+    if ocr_service == 'local':
+        # 电子发票: 文本层中直接查找
+        if extension == 'pdf' and PDF_CONFIG['text_layer']:
+            text_lines = []
+            with open_pdf(upload) as pdf_document:
+                for i in range(min(len(pdf_document), AMOUNT_ROI_CONFIG['max_pages'])):
+                    text_lines.extend(extract_text_layer(pdf_document[i]) or [])
+            amount = find_confident_amount(text_lines)
+            if amount is not None:
+                return finish(amount, 'text_layer')
+        
+        # 只识别金额所在区域，命中即停止
+        roi_start = time.perf_counter()
+        for n, region in enumerate(AMOUNT_ROI_CONFIG['regions'], 1):
+            region_texts = []
+            images_done = 0
+            for images in iter_region_batches(upload, extension, region, stats=stats):
+                images_done += len(images)
+                for page_texts in process_image_batch(images):
+                    region_texts.extend(page_texts)
+            if not images_done:
+                break
+            amount = find_confident_amount(region_texts)
+            if amount is not None:
+                logger.info(f"Invoice amount found in region {n}: {region}")
+                return finish(amount, 'roi', regions_tried=n,
+                              roi_ms=round((time.perf_counter() - roi_start) * 1000, 1))
+        roi_ms = round((time.perf_counter() - roi_start) * 1000, 1)
+    else:
+        roi_ms = 0.0
+    
+    # 回退: 整页识别
+    full_start = time.perf_counter()
+    run_stats = {}
+    texts, fields, _ = run_ocr(upload, filename, ocr_service, stats=run_stats, deadline=deadline)
+    return finish(fields['invoice_amount'], 'full_page', roi_ms=roi_ms,
+                  full_page_ms=round((time.perf_counter() - full_start) * 1000, 1),
+                  **truncation_fields(run_stats))
+
+
+def get_engine_settings(ocr_service):
+    """返回影响识别结果的引擎配置 (用于计算缓存键)"""
+    if ocr_service == 'ocrspace':
+        # api_key 不影响识别结果，不参与缓存键
+        return {k: v for k, v in OCRSPACE_CONFIG.items() if k != 'api_key'}
+    settings = {
+        **OCR_CONFIG,
+        'preprocess': PREPROCESS_CONFIG,
+        'pdf_dpi': PDF_CONFIG['dpi'],
+        'pdf_max_page_pixels': PDF_CONFIG['max_page_pixels'],
+        'pdf_max_render_bytes': PDF_CONFIG['max_render_bytes'],
+        'pdf_text_layer': PDF_CONFIG['text_layer'],
+        'pdf_text_layer_min_chars': PDF_CONFIG['text_layer_min_chars'],
+    }
+    if engine_factory_name():
+        # 替代引擎 (基准测试用) 的结果不能与 PaddleOCR 共用缓存
+        settings['engine_factory'] = engine_factory_name()
+    return settings
+
+
+def lookup_cache(upload, filename, ocr_service):
+    """
+    查询 OCR 结果缓存
+    
+    返回:
+        (缓存键, 缓存值)；缓存关闭时缓存键为 None，未命中时缓存值为 None
+    """
+    if not ocr_cache.enabled:
+        return None, None
+    
+    with stage('cache.lookup'):
+        with upload.open() as f:
+            cache_key = OCRCache.make_key(f, f"{ocr_service}:{get_file_extension(filename)}",
+                                          get_engine_settings(ocr_service))
+        cached = ocr_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"OCR cache hit: {filename}")
+    return cache_key, cached
+
+
+def count_pages(upload, extension):
+    """PDF 返回页数，图片返回 1"""
+    if extension != 'pdf':
+        return 1
+    with open_pdf(upload) as pdf_document:
+        return len(pdf_document)
+
+
+def resolve_ocr_service(upload, filename, ocr_service):
+    """auto 模式下返回预计最快的引擎 (不执行识别)，其他模式原样返回"""
+    if ocr_service != 'auto':
+        return ocr_service
+    return get_router().choose(count_pages(upload, get_file_extension(filename)))[0]
+
+
+def run_ocr(upload, filename, ocr_service, stats=None, progress=None, track=True, deadline=None):
+    """
+    执行 OCR 识别并提取发票金额 (带结果缓存)
+    
+    参数:
+        upload: 上传文件的 UploadBuffer (内存或临时文件)
+        filename: 原始文件名 (用于判断文件类型)
+        ocr_service: 'local'、'ocrspace' 或 'auto' (自动路由到预计更快的引擎)
+        stats: 可选字典，填入处理统计 (如 PDF 页数、pages/sec)
+        progress: 可选回调 progress(已完成页数, 总页数)
+        track: 是否计入自动路由的耗时统计 (auto 模式由路由器自行记录)
+        deadline: 可选截止时间 (deadline.Deadline)，到期或客户端断开时停止识别剩余页面，
+                  返回已完成的页，stats 中标记 truncated / pages_done (不写入缓存)
+    返回:
+        (识别文本列表, 发票字段字典 (含 invoice_amount), 是否命中缓存)
+    """
+    if ocr_service == 'auto':
+        return run_ocr_auto(upload, filename, stats=stats, progress=progress, deadline=deadline)
+    
+    extension = get_file_extension(filename)
+    
+    cache_key, cached = lookup_cache(upload, filename, ocr_service)
+    if cached is not None:
+        OCR_RECOGNITIONS.inc(engine=ocr_service, outcome='cached')
+        if progress is not None:
+            pages = count_pages(upload, extension)
+            progress(pages, pages)
+        fields = cached.get('fields') or extract_invoice_fields(cached['lines'])
+        return restore_lines(cached['lines'], cached.get('details')), fields, True
+    
+    run_stats = {} if stats is None else stats
+    if deadline is not None and deadline.expired():
+        # 排队期间已到期、客户端已断开或对冲中已有结果: 不再识别
+        pages_total = None if upload.closed else count_pages(upload, extension)
+        mark_truncated(run_stats, deadline, ocr_service, 0, pages_total)
+        OCR_RECOGNITIONS.inc(engine=ocr_service, outcome='truncated')
+        return [], extract_invoice_fields([]), False
+    
+    try:
+        with (get_router().track(ocr_service) if track else nullcontext()) as sample:
+            # 根据选择的服务进行处理
+            if ocr_service == 'ocrspace':
+                # 使用 OCR.space API
+                texts = process_ocrspace(upload, stats=run_stats, progress=progress, deadline=deadline)
+            elif extension == 'pdf':
+                # 使用本地 PaddleOCR
+                texts = process_pdf(upload, stats=run_stats, progress=progress, deadline=deadline)
+            else:
+                texts = process_image(upload.source, stats=run_stats)
+                OCR_PAGES.inc(engine='local', source='ocr')
+            if sample is not None:
+                # 提前结束时按实际完成的页数计算每页耗时
+                sample.pages = run_stats.get('pages_done', run_stats.get('pages')) or 1
+    except Exception:
+        OCR_RECOGNITIONS.inc(engine=ocr_service, outcome='error')
+        raise
+    OCR_RECOGNITIONS.inc(engine=ocr_service, outcome='truncated' if run_stats.get('truncated') else 'ok')
+    
+    if progress is not None and ocr_service == 'local' and extension != 'pdf':
+        progress(1, 1)
+    
+    # 一次扫描提取发票金额及其他字段
+    fields = extract_invoice_fields(texts)
+    
+    # 部分页识别失败、提前结束或上传文件已被释放 (对冲落选) 的结果不缓存
+    if (cache_key is not None and not run_stats.get('failed_pages') and not run_stats.get('truncated')
+            and not upload.closed):
+        store_cached_result(cache_key, texts, fields)
+    
+    return texts, fields, False
+
+
+def store_cached_result(cache_key, texts, fields):
+    """写入 OCR 结果缓存 (与 lookup_cache 对应)"""
+    ocr_cache.set(cache_key, {
+        'lines': texts,
+        'details': line_details(texts),  # per-line [score, box] for format=boxes
+        'invoice_amount': fields['invoice_amount'],
+        'fields': fields
+    })
+
+
+def run_ocr_auto(upload, filename, stats=None, progress=None, deadline=None):
+    """
+    ocr_service=auto: 由路由器选择预计更快的引擎 (可对冲)，首选引擎失败时改用另一个
+    
+    任一引擎已有缓存结果时直接返回；stats['route'] 记录实际使用的引擎。
+    """
+    extension = get_file_extension(filename)
+    pages = count_pages(upload, extension)
+    router = get_router()
+    
+    for engine in router.choose(pages):
+        _, cached = lookup_cache(upload, filename, engine)
+        if cached is not None:
+            if stats is not None:
+                stats['route'] = {'engine': engine, 'pages': pages, 'cached': True}
+            if progress is not None:
+                progress(pages, pages)
+            fields = cached.get('fields') or extract_invoice_fields(cached['lines'])
+            return restore_lines(cached['lines'], cached.get('details')), fields, True
+    
+    # 对冲时两个引擎可能同时汇报进度，只转发递增的进度
+    progress_lock = threading.Lock()
+    progress_done = [0]
+    
+    def forward_progress(done, total):
+        with progress_lock:
+            if done <= progress_done[0]:
+                return
+            progress_done[0] = done
+        progress(done, total)
+    
+    engine_stats = {}
+    
+    def attempt(engine, superseded):
+        engine_stats[engine] = {}
+        # The losing attempt of a hedge stops at its next page batch / request,
+        # before the caller releases the upload buffer
+        if deadline is None:
+            engine_deadline = Deadline(superseded=superseded)
+        else:
+            engine_deadline = deadline.superseded_by(superseded)
+        return run_ocr(upload, filename, engine, stats=engine_stats[engine],
+                       progress=forward_progress if progress is not None else None, track=False,
+                       deadline=engine_deadline)
+    
+    engine, (texts, fields, cached) = router.run(attempt, pages)
+    if stats is not None:
+        stats.update(engine_stats.get(engine, {}))
+        stats['route'] = {'engine': engine, 'pages': pages, 'cached': cached}
+    return texts, fields, cached
+
+
+def parse_page_marker(line):
+    """合并结果中的分页标记 "--- 第 N 页 ---" 返回页码 N，其他行返回 None"""
+    prefix, suffix = '--- 第 ', ' 页 ---'
+    if line.startswith(prefix) and line.endswith(suffix):
+        number = line[len(prefix):-len(suffix)]
+        if number.isdigit():
+            return int(number)
+    return None
+
+
+def iter_cached_pages(lines, total_pages):
+    """
+    按分页标记把缓存中的合并结果拆回各页
+    
+    与 iter_pdf_pages 一样为每一页产出 (页码, 总页数, 该页的行, 'cache')，
+    没有文字的页 (合并结果中没有标记) 产出空列表。
+    """
+    pages = {}
+    current = pages.setdefault(1, [])
+    for line in lines:
+        page_number = parse_page_marker(line)
+        if page_number is not None:
+            current = pages.setdefault(page_number, [])
+        else:
+            current.append(line)
+    for page_number in range(1, total_pages + 1):
+        yield page_number, total_pages, pages.get(page_number, []), 'cache'
+
+
+def iter_ocr_events(upload, filename, ocr_service, ocr_service_name, deadline=None):
+    """
+    流式 OCR: 逐页产出事件字典，结束后释放上传文件缓冲
+    
+    本地识别 PDF 时每页完成即产出该页结果；全部页完成、未 truncated 且页数不超过
+    PDF_CONFIG['stream_cache_max_pages'] 时写入结果缓存 (更长的 PDF 不保留已返回的页)；
+    缓存命中时按分页标记拆回各页，事件形状与实际识别相同 (并恢复每行的分数和检测框)；
+    图片及 OCR.space 一次产出全部行。
+    事件:
+        {"event": "page", "page": N, "pages_total": T, "source": "text/ocr/cache",
+         "lines": [...], "invoice_amount": 当前金额估计}
+        {"event": "done", "pages_total": T, "line_count": 总行数, "invoice_amount": 最终金额,
+         "truncated": 是否因截止时间提前结束 (是时另有 pages_done), ...}
+        {"event": "error", "error": 错误信息}
+    """
+    pages = None
+    stats = {}
+    try:
+        extension = get_file_extension(filename)
+        cached = False
+        ocr_service = resolve_ocr_service(upload, filename, ocr_service)
+        
+        cache_key = None
+        if ocr_service == 'local' and extension == 'pdf':
+            cache_key, cached_value = lookup_cache(upload, filename, ocr_service)
+            if cached_value is not None:
+                cached = True
+                cache_key = None
+                lines = restore_lines(cached_value['lines'], cached_value.get('details'))
+                pages = iter_cached_pages(lines, count_pages(upload, extension))
+            else:
+                pages = iter_pdf_pages(upload, stats=stats, batch_size=PDF_CONFIG['stream_batch_size'],
+                                       deadline=deadline)
+        else:
+            texts, _, cached = run_ocr(upload, filename, ocr_service, stats=stats, deadline=deadline)
+            pages = iter([(1, 1, texts, 'cache' if cached else 'ocr')])
+        
+        running_amount = RunningInvoiceAmount()
+        line_count = 0
+        total_pages = 0
+        all_texts = []  # 与 process_pdf 相同的合并结果 (带分页标记)，识别完整时写入缓存
+        for page_number, total_pages, page_texts, source in pages:
+            line_count += len(page_texts)
+            if cache_key is not None and total_pages > PDF_CONFIG['stream_cache_max_pages']:
+                # 不缓存，也就不必保留已返回的页
+                cache_key = None
+                all_texts = []
+            if cache_key is not None and page_texts:
+                all_texts.append(f"--- 第 {page_number} 页 ---")
+                all_texts.extend(page_texts)
+            yield {
+                'event': 'page',
+                'page': page_number,
+                'pages_total': total_pages,
+                'source': source,
+                'lines': page_texts,
+                'invoice_amount': running_amount.update(page_texts)
+            }
+        
+        if cache_key is not None and not stats.get('truncated') and not upload.closed:
+            store_cached_result(cache_key, all_texts, extract_invoice_fields(all_texts))
+        
+        yield {
+            'event': 'done',
+            'pages_total': total_pages,
+            'line_count': line_count,
+            'invoice_amount': running_amount.amount,
+            'ocr_service': ocr_service_name,
+            'cached': cached,
+            **truncation_fields(stats)
+        }
+    except Exception as e:
+        logger.error(f"Streaming OCR error: {str(e)}")
+        yield {'event': 'error', 'error': str(e)}
+    finally:
+        # 客户端断开时生成器被关闭，同时停止剩余页面的识别
+        if pages is not None and hasattr(pages, 'close'):
+            pages.close()
+        upload.close()
+
+
+def stream_ocr_response(events, stream_format):
+    """将 OCR 事件流包装为 NDJSON 或 Server-Sent Events 响应"""
+    def generate():
+        for event in events:
+            payload = dumps(event)
+            if stream_format == 'sse':
+                yield b"event: " + event['event'].encode() + b"\ndata: " + payload + b"\n\n"
+            else:
+                yield payload + b'\n'
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁用 nginx 缓冲
+    return response
+
+
+def parse_ocr_service(value):
+    """解析 API 的 ocr_service 参数 (1=本地, 2=OCR.space, auto=自动选择)，返回 (服务标识, 服务名称)"""
+    if value == '2':
+        return 'ocrspace', 'OCR.space'
+    if value in ('3', 'auto'):
+        return 'auto', '自动选择'
+    return 'local', '本地 PaddleOCR'
+
+
+def request_deadline():
+    """
+    Build the request's Deadline from the timeout (seconds) or deadline (Unix
+    timestamp) form field, falling back to DEADLINE_CONFIG['default_timeout']
+    
+    The clock starts when the request arrived, so time spent waiting for an
+    admission slot counts. Client disconnects (environ['ocr.disconnected'],
+    set by asgi.py) also end the deadline. Raises ValueError on a bad value
+    (not a finite number, a timeout <= 0, or a deadline already past).
+    """
+    cancelled = request.environ.get('ocr.disconnected')
+    start = g.get('request_start')
+    timeout = request.form.get('timeout', '').strip()
+    deadline = request.form.get('deadline', '').strip()
+    if deadline:
+        deadline = float(deadline)
+        if not math.isfinite(deadline):
+            raise ValueError('deadline 必须为有限数值')
+        timeout = deadline - time.time() + (time.perf_counter() - start if start is not None else 0)
+        if timeout <= 0:
+            raise ValueError('deadline 已过')
+    elif timeout:
+        timeout = float(timeout)
+        if not math.isfinite(timeout) or timeout <= 0:
+            raise ValueError('timeout 必须为大于 0 的有限数值')
+    else:
+        timeout = DEADLINE_CONFIG['default_timeout'] or None
+    if timeout is not None and DEADLINE_CONFIG['max_timeout']:
+        timeout = min(timeout, DEADLINE_CONFIG['max_timeout'])
+    if timeout is None and cancelled is None:
+        return None
+    return Deadline(timeout, start=start, cancelled=cancelled)
+
+
+def truncation_fields(stats):
+    """Partial-result flags for responses: truncated, plus pages_done / pages_total when it is"""
+    if not stats.get('truncated'):
+        return {'truncated': False}
+    return {
+        'truncated': True,
+        'truncated_reason': stats['truncated_reason'],
+        'pages_done': stats['pages_done'],
+        'pages_total': stats['pages'],
+        **({'pending_pages': stats['pending_pages']} if stats.get('pending_pages') else {}),
+    }
+
+
+def receive_upload(file, filename, in_memory=True):
+    """
+    Take over an uploaded file as an UploadBuffer, recording the time and bytes received
     
-    for i, text in enumerate(texts):
-        # 模式1: (小写)￥xxx.xx 或 (小写）￥xxx.xx
-        match = re.search(r'[（\(]小写[）\)]\s*[￥¥]?\s*([\d,]+\.?\d*)', text)
-        if match:
-            amount = match.group(1).replace(',', '')
-            try:
-                if float(amount) >= 100:
-                    xiaoxie_candidates.append((i, float(amount), amount))
-            except ValueError:
-                pass
-        
-        # 模式2: 小写 xxx.xx (同一行，不带括号)
-        match = re.search(r'小写\s+(\d[\d,]*\.?\d*)', text)
-        if match:
-            amount = match.group(1).replace(',', '')
-            try:
-                if float(amount) >= 100:
-                    xiaoxie_candidates.append((i, float(amount), amount))
-            except ValueError:
-                pass
-        
-        # 模式3: 如果当前行是"小写"，检查下一行是否是金额
-        if text.strip() in ['小写', '(小写)', '（小写）']:
-            if i + 1 < len(texts):
-                next_line = texts[i + 1].strip()
-                # 下一行是纯金额数字
-                match = re.match(r'^(\d[\d,]*\.\d{2})$', next_line)
-                if match:
-                    amount = match.group(1).replace(',', '')
-                    try:
-                        if float(amount) >= 100:
-                            xiaoxie_candidates.append((i, float(amount), amount))
-                    except ValueError:
-                        pass
-        
-        # 模式4: 独立的大金额行 (通常 > 10000) - 备用
-        match = re.match(r'^(\d{5,}\.?\d*)$', text.strip())
-        if match:
-            amount = match.group(1)
+    Small files stay in memory; only files over UPLOAD_CONFIG['memory_max_bytes']
+    were spooled to UPLOAD_FOLDER while the form was parsed. With in_memory=False
+    (queued async jobs) small files are written to UPLOAD_FOLDER as well, so a
+    full job queue does not pin uploads in RSS. Close the buffer when done.
+    """
+    with stage('upload.receive'):
+        upload = UploadBuffer.from_file_storage(file, filename, UPLOAD_CONFIG['memory_max_bytes'],
+                                                dir=UPLOAD_FOLDER)
+        if not in_memory:
             try:
-                if float(amount) >= 10000:
-                    other_candidates.append((i, float(amount), amount))
-            except ValueError:
-                pass
-    
-    # 优先选择"小写"相关匹配中位置最靠后的
-    if xiaoxie_candidates:
-        xiaoxie_candidates.sort(key=lambda x: -x[0])  # 按行号降序
-        return xiaoxie_candidates[0][2]
-    
-    # 如果没有小写匹配，选择其他匹配中位置最靠后的
-    if other_candidates:
-        other_candidates.sort(key=lambda x: -x[0])
-        return other_candidates[0][2]
-    
-    return "0"
+                upload.to_disk(dir=UPLOAD_FOLDER)
+            except BaseException:
+                upload.close()
+                raise
+    UPLOAD_BYTES.inc(upload.size, endpoint=request.endpoint or '')
+    return upload
+
+
+def api_json_response(payload, status=200):
+    """Fast-encoded JSON response, compressed when the client accepts br / gzip"""
+    encoding = negotiate_encoding(request.accept_encodings) if RESPONSE_CONFIG['compression'] else None
+    return json_response(
+        payload,
+        status=status,
+        encoding=encoding,
+        min_size=RESPONSE_CONFIG['compress_min_bytes'],
+        gzip_level=RESPONSE_CONFIG['gzip_level'],
+        brotli_quality=RESPONSE_CONFIG['brotli_quality']
+    )
 
 
 def save_result(texts, filename):
-    """Save OCR result to a text file"""
-    result_filename = f"{os.path.splitext(filename)[0]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    result_path = os.path.join(RESULT_FOLDER, result_filename)
-    
-    with open(result_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(texts))
-    
-    return result_filename
+    """Save OCR result to the result store, returning its id (download_file)"""
+    with stage('save_result'):
+        return result_store.put(texts, filename)
 
 
 @app.route('/')
@@ -345,58 +1411,62 @@ def upload_file():
                 'error': f'不支持的文件格式。支持的格式: {", ".join(ALLOWED_EXTENSIONS)}'
             }), 400
         
-        # Secure the filename and save
+        try:
+            deadline = request_deadline()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'timeout 必须为正数 (秒)，deadline 必须为未来的 Unix 时间戳'
+            }), 400
+        
+        # Secure the filename and take over the upload buffer
         original_filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(file_path)
+        upload = receive_upload(file, original_filename)
         
         logger.info(f"File uploaded: {original_filename}")
         
         try:
             # 获取 OCR 服务选择 (默认使用本地)
             ocr_service = request.form.get('ocr_service', 'local')
-            extension = get_file_extension(original_filename)
+            if ocr_service not in ('ocrspace', 'auto'):
+                ocr_service = 'local'
             
             logger.info(f"Using OCR service: {ocr_service}")
             
-            # 根据选择的服务进行处理
-            if ocr_service == 'ocrspace':
-                # 使用 OCR.space API
-                texts = process_ocrspace(file_path)
-            else:
-                # 使用本地 PaddleOCR
-                if extension == 'pdf':
-                    texts = process_pdf(file_path)
-                else:
-                    texts = process_image(file_path)
+            stats = {}
+            texts, fields, cached = run_ocr(upload, original_filename, ocr_service, stats=stats,
+                                            deadline=deadline)
+            partial = truncation_fields(stats)
             
             if not texts:
                 return jsonify({
                     'success': True,
                     'text': '',
-                    'message': '未能识别出任何文字内容',
-                    'download_file': None
+                    'message': '识别超时，未完成任何页面' if partial['truncated'] else '未能识别出任何文字内容',
+                    'download_file': None,
+                    **partial
                 })
             
             # Save result to file
             result_filename = save_result(texts, original_filename)
             
-            # 提取发票金额
-            invoice_amount = extract_invoice_amount(texts)
-            
+            message = f'成功识别 {len(texts)} 行文字'
+            if partial['truncated']:
+                message += f" (超时，已完成 {partial['pages_done']}/{partial['pages_total']} 页)"
             return jsonify({
                 'success': True,
                 'text': '\n'.join(texts),
-                'message': f'成功识别 {len(texts)} 行文字',
+                'message': message,
                 'download_file': result_filename,
-                'invoice_amount': invoice_amount  # 发票金额
+                'invoice_amount': fields['invoice_amount'],  # 发票金额
+                'invoice_fields': fields,
+                'cached': cached,
+                **partial
             })
             
         finally:
-            # Clean up uploaded file
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # Release the upload buffer
+            upload.close()
                 
     except Exception as e:
         logger.error(f"Error during OCR processing: {str(e)}")
@@ -406,23 +1476,38 @@ def upload_file():
         }), 500
 
 
-@app.route('/download/<filename>')
-def download_file(filename):
-    """Download OCR result file"""
+@app.route('/download/<result_id>')
+def download_file(result_id):
+    """Download OCR result file (supports Range and ETag / If-None-Match)"""
     try:
-        file_path = os.path.join(RESULT_FOLDER, secure_filename(filename))
-        if not os.path.exists(file_path):
+        meta = result_store.get(result_id)
+        if meta is None:
             return jsonify({
                 'success': False,
                 'error': '文件不存在'
             }), 404
         
+        if meta['compression'] == 'none':
+            body = result_store.path(meta)
+        else:
+            body = io.BytesIO(result_store.read_bytes(meta))
+        # Results never change after they are saved: content hash as strong ETag
         return send_file(
-            file_path,
+            body,
             as_attachment=True,
-            download_name=filename,
-            mimetype='text/plain'
+            download_name=result_store.download_name(meta),
+            mimetype='text/plain',
+            etag=meta['sha256'],
+            last_modified=meta['created_at'],
+            conditional=True,
+            max_age=3600
         )
+    except FileNotFoundError:
+        # Evicted between the index lookup and the read
+        return jsonify({
+            'success': False,
+            'error': '文件不存在'
+        }), 404
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         return jsonify({
@@ -446,18 +1531,35 @@ def api_ocr():
         ocr_service: OCR 服务 (可选, 默认 1)
             - 1: 本地识别 (PaddleOCR)
             - 2: OCR.space (在线)
-        save_result: 是否保存结果文件 (可选, 默认 false)
+        save_result: 是否保存结果文件 (可选, 默认 false, 流式模式下不保存)
+        stream: 流式返回 (可选) - ndjson / sse，每页识别完成即返回该页结果
+        mode: 识别模式 (可选, 默认 full) - amount: 只返回发票金额，
+              先识别金额所在区域，未找到再整页识别
+        format: 返回内容 (可选, 默认 full) - full: text + lines, lines: 只返回 lines, text: 只返回 text,
+                boxes: lines 为 [{"text", "score", "box": [x0, y0, x1, y1]}]
+                (box 为相对图片/页面宽高的比例，PDF 文本层与 OCR.space 的行为 null)
+        timeout: 最长处理秒数 (可选，从收到请求开始计时，含排队时间)
+        deadline: 截止时间 Unix 时间戳 (可选，与 timeout 二选一)
+                  到期后停止识别剩余页面，返回已完成的页并标记 truncated
+    
+    客户端发送 Accept-Encoding: br / gzip 时响应被压缩。
     
     返回 JSON:
     {
         "success": true/false,
         "data": {
-            "text": "识别的完整文本",
-            "lines": ["第1行", "第2行", ...],
+            "text": "识别的完整文本 (format=full/text)",
+            "lines": ["第1行", "第2行", ...] (format=full/lines),
             "line_count": 行数,
             "invoice_amount": "发票金额 (如有)",
+            "invoice_fields": {"invoice_number": "发票号码", "issue_date": "开票日期", ...},
             "ocr_service": "使用的 OCR 服务",
-            "download_file": "结果文件名 (如果 save_result=true)"
+            "cached": 是否命中结果缓存,
+            "truncated": 是否因 timeout / deadline 或客户端断开提前结束,
+            "pages_done": 已完成页数, "pages_total": 总页数 (truncated 为 true 时),
+            "stats": {"pages": 页数, "page_sources": ["text"/"ocr", ...], "pages_per_sec": 吞吐量, ...}
+                     (PDF 本地识别时; text=使用 PDF 内嵌文本层, ocr=渲染后识别),
+            "download_file": "结果 id (如果 save_result=true)，下载: /download/<id>，查询: /api/results/<id>"
         },
         "error": "错误信息 (如果失败)"
     }
@@ -495,65 +1597,100 @@ def api_ocr():
             }), 400
         
         # 获取 OCR 服务选择 (1=本地, 2=OCR.space)
-        ocr_service_param = request.form.get('ocr_service', '1')
-        if ocr_service_param == '2':
-            ocr_service = 'ocrspace'
-            ocr_service_name = 'OCR.space'
-        else:
-            ocr_service = 'local'
-            ocr_service_name = '本地 PaddleOCR'
+        ocr_service, ocr_service_name = parse_ocr_service(request.form.get('ocr_service', '1'))
         
         # 是否保存结果
         save_result_file = request.form.get('save_result', 'false').lower() == 'true'
         
-        # 保存文件
+        # 识别模式: full=完整识别 (默认), amount=只提取发票金额
+        mode = request.form.get('mode', 'full').lower()
+        if mode not in ('full', 'amount'):
+            return jsonify({
+                'success': False,
+                'error': 'mode 参数必须为 full 或 amount'
+            }), 400
+        
+        # 返回内容: full / lines / text / boxes
+        response_format = request.form.get('format', 'full').lower()
+        if response_format not in RESPONSE_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f'format 参数必须为 {", ".join(RESPONSE_FORMATS)} 之一'
+            }), 400
+        
+        # 流式返回格式 (ndjson / sse)，为空时返回完整 JSON
+        stream_format = request.form.get('stream', '').lower()
+        if stream_format not in ('', 'ndjson', 'sse'):
+            return jsonify({
+                'success': False,
+                'error': 'stream 参数必须为 ndjson 或 sse'
+            }), 400
+        
+        # 截止时间 (timeout 秒 / deadline 时间戳)
+        try:
+            deadline = request_deadline()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'timeout 必须为正数 (秒)，deadline 必须为未来的 Unix 时间戳'
+            }), 400
+        
+        # 接收文件 (小文件只保存在内存)
         original_filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(file_path)
+        upload = receive_upload(file, original_filename)
         
         logger.info(f"API OCR request: {original_filename}, service: {ocr_service_name}")
         
+        if stream_format:
+            # 上传文件缓冲由事件生成器在结束时释放
+            events = iter_ocr_events(upload, original_filename, ocr_service, ocr_service_name, deadline=deadline)
+            return stream_ocr_response(events, stream_format)
+        
         try:
-            # 根据选择的服务进行处理
-            extension = get_file_extension(original_filename)
-            
-            if ocr_service == 'ocrspace':
-                # 使用 OCR.space API
-                texts = process_ocrspace(file_path)
-            else:
-                # 使用本地 PaddleOCR
-                if extension == 'pdf':
-                    texts = process_pdf(file_path)
-                else:
-                    texts = process_image(file_path)
+            if mode == 'amount':
+                # 只提取发票金额: 先识别金额区域，未命中再整页识别
+                stats = {}
+                invoice_amount, _ = extract_amount_fast(upload, original_filename, ocr_service, stats=stats,
+                                                        deadline=deadline)
+                return api_json_response({
+                    'success': True,
+                    'data': {
+                        'mode': 'amount',
+                        'invoice_amount': invoice_amount,
+                        'ocr_service': ocr_service_name,
+                        'stats': stats
+                    }
+                })
             
-            # 提取发票金额
-            invoice_amount = extract_invoice_amount(texts) if texts else "0"
+            stats = {}
+            texts, fields, cached = run_ocr(upload, original_filename, ocr_service, stats=stats,
+                                            deadline=deadline)
             
-            # 构建响应数据
-            response_data = {
-                'text': '\n'.join(texts) if texts else '',
-                'lines': texts if texts else [],
-                'line_count': len(texts) if texts else 0,
-                'invoice_amount': invoice_amount,
-                'ocr_service': ocr_service_name
-            }
+            # 构建响应数据 (识别文本按 format 裁剪)
+            response_data = ocr_text_fields(texts, response_format)
+            response_data.update({
+                'invoice_amount': fields['invoice_amount'],
+                'invoice_fields': fields,
+                'ocr_service': ocr_service_name,
+                'cached': cached,
+                **truncation_fields(stats)
+            })
+            if stats:
+                response_data['stats'] = stats
             
             # 可选保存结果文件
             if save_result_file and texts:
                 result_filename = save_result(texts, original_filename)
                 response_data['download_file'] = result_filename
             
-            return jsonify({
+            return api_json_response({
                 'success': True,
                 'data': response_data
             })
             
         finally:
-            # 清理临时文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # 释放上传文件缓冲
+            upload.close()
                 
     except Exception as e:
         logger.error(f"API OCR error: {str(e)}")
@@ -563,6 +1700,580 @@ def api_ocr():
         }), 500
 
 
+# ==================== 异步任务 API ====================
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """
+    API 接口：提交异步 OCR 任务 (适合大 PDF)
+    
+    请求方式: POST
+    Content-Type: multipart/form-data
+    
+    参数:
+        file: 文件 (必需) - 支持 JPG, PNG, JPEG, PDF
+        ocr_service: OCR 服务 (可选, 默认 1) - 1: 本地, 2: OCR.space
+        priority: 优先级 (可选, 默认 normal) - high / normal / low
+    
+    返回 (202):
+    {
+        "success": true,
+        "data": {"job_id": "...", "status": "queued", "status_url": "...", "result_url": "..."}
+    }
+    队列已满时返回 429
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({
+                'success': False,
+                'error': '缺少 file 参数'
+            }), 400
+        
+        file = request.files['file']
+        
+        if file.filename == '':
+            return jsonify({
+                'success': False,
+                'error': '未选择文件'
+            }), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({
+                'success': False,
+                'error': f'不支持的文件格式。支持: {", ".join(ALLOWED_EXTENSIONS)}'
+            }), 400
+        
+        priority = request.form.get('priority', 'normal').lower()
+        if priority not in PRIORITIES:
+            return jsonify({
+                'success': False,
+                'error': f'priority 必须为 {", ".join(PRIORITIES)} 之一'
+            }), 400
+        
+        ocr_service, ocr_service_name = parse_ocr_service(request.form.get('ocr_service', '1'))
+        
+        # 接收文件并写入 uploads/ (排队期间不占用内存)，任务完成后由 cleanup_job 删除
+        original_filename = secure_filename(file.filename)
+        upload = receive_upload(file, original_filename, in_memory=False)
+        
+        try:
+            job = get_job_manager().submit({
+                'upload': upload,
+                'filename': original_filename,
+                'ocr_service': ocr_service,
+                'ocr_service_name': ocr_service_name
+            }, priority=priority)
+        except JobQueueFull as e:
+            upload.close()
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 429
+        
+        logger.info(f"Job {job.id} queued: {original_filename}, priority: {priority}")
+        
+        data = job.to_dict()
+        data['status_url'] = f'/api/jobs/{job.id}'
+        data['result_url'] = f'/api/jobs/{job.id}/result'
+        return jsonify({
+            'success': True,
+            'data': data
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Job submit error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """API 接口：查询异步任务状态与逐页进度"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '任务不存在'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+
+@app.route('/api/jobs/<job_id>/result')
+def api_job_result(job_id):
+    """API 接口：获取异步任务结果 (lines, invoice_amount, download_file)"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '任务不存在'
+        }), 404
+    
+    if job.status == 'failed':
+        return jsonify({
+            'success': False,
+            'error': job.error,
+            'data': job.to_dict()
+        }), 500
+    
+    if job.status != 'done':
+        return jsonify({
+            'success': False,
+            'error': '任务尚未完成',
+            'data': job.to_dict()
+        }), 409
+    
+    data = dict(job.result)
+    data['text'] = '\n'.join(data['lines'])
+    data['job_id'] = job.id
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+
+@app.route('/api/extract', methods=['POST'])
+def api_extract():
+    """
+    API 接口：批量提取发票字段 (不做 OCR，只处理已有识别结果)
+    
+    请求方式: POST
+    Content-Type: application/json
+    
+    参数 (二选一):
+        documents: 识别行列表的列表 [["第1行", "第2行"], ...]
+        result_files: 已保存的结果 id 列表 (download_file)
+    
+    返回 JSON:
+    {
+        "success": true,
+        "data": {"results": [{"invoice_amount": "...", "invoice_number": "...", ...}, ...], "count": N}
+    }
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = {}
+    documents = payload.get('documents')
+    result_files = payload.get('result_files')
+    
+    if documents is None and result_files is None:
+        return jsonify({
+            'success': False,
+            'error': '缺少 documents 或 result_files 参数'
+        }), 400
+    
+    if documents is not None:
+        if not isinstance(documents, list) or not all(
+                isinstance(d, list) and all(isinstance(line, str) for line in d) for d in documents):
+            return jsonify({
+                'success': False,
+                'error': 'documents 必须为识别行 (字符串) 列表的列表'
+            }), 400
+        results = list(invoice_extractor.extract_batch(documents))
+    else:
+        if not isinstance(result_files, list) or not all(isinstance(f, str) for f in result_files):
+            return jsonify({
+                'success': False,
+                'error': 'result_files 必须为结果 id (字符串) 列表'
+            }), 400
+        results = []
+        for filename in result_files:
+            lines = result_store.read_lines(filename)
+            if lines is None:
+                results.append({'file': filename, 'error': '文件不存在'})
+                continue
+            fields = invoice_extractor.extract(lines)
+            results.append({'file': filename, **fields})
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'results': results,
+            'count': len(results)
+        }
+    })
+
+
+@app.route('/api/results/<result_id>')
+def api_result(result_id):
+    """
+    API 接口：按 id 查询已保存的识别结果 (download_file)
+    
+    返回 JSON:
+    {
+        "success": true,
+        "data": {"id": "...", "filename": "原文件名", "created_at": 时间戳, "size": 字节数,
+                 "line_count": 行数, "lines": ["第1行", ...], "download_url": "/download/<id>"}
+    }
+    """
+    meta = result_store.get(result_id)
+    lines = result_store.read_lines(result_id) if meta is not None else None
+    if lines is None:
+        return jsonify({
+            'success': False,
+            'error': '结果不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'id': meta['id'],
+            'filename': meta['filename'],
+            'created_at': meta['created_at'],
+            'size': meta['size'],
+            'line_count': meta['line_count'],
+            'lines': lines,
+            'download_url': f"/download/{meta['id']}"
+        }
+    })
+
+
+# ==================== 监控指标 ====================
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.stage_timings = begin_request_timings()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record request counters/latency and expose stage timings as Server-Timing"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    HTTP_SECONDS.observe(elapsed, endpoint=endpoint)
+    response.headers['Server-Timing'] = server_timing_header(g.get('stage_timings', []), total=elapsed)
+    return response
+
+
+def _cache_metric(key):
+    return lambda: ocr_cache.stats()[key]
+
+
+def _job_metric(key):
+    return lambda: _job_manager.stats()[key] if _job_manager is not None else None
+
+
+def _batcher_histogram(key):
+    return lambda: _batcher.stats()[key] if _batcher is not None else None
+
+
+def _pool_metric(key):
+    def collect():
+        pool = _engine_pool if ENGINE_POOL_CONFIG['size'] > 0 else None
+        return pool.health()[key] if pool is not None else None
+    return collect
+
+
+def _router_in_flight():
+    if _router is None:
+        return None
+    return {(name,): engine['in_flight'] for name, engine in _router.stats()['engines'].items()}
+
+
+def _router_metric(key):
+    """Router counter: per-engine dicts become {(engine,): n}, totals pass through"""
+    def collect():
+        if _router is None:
+            return None
+        value = _router.stats()[key]
+        if isinstance(value, dict):
+            return {(name,): count for name, count in value.items()}
+        return value
+    return collect
+
+
+def _ocrspace_metric(key):
+    return lambda: _ocrspace_client.stats()[key] if _ocrspace_client is not None else None
+
+
+REGISTRY.callback('ocr_cache_hits_total', 'OCR result cache hits', 'counter', _cache_metric('hits'))
+REGISTRY.callback('ocr_cache_misses_total', 'OCR result cache misses', 'counter', _cache_metric('misses'))
+REGISTRY.callback('ocr_cache_entries', 'OCR result cache entries by tier', 'gauge',
+                  lambda: {('memory',): ocr_cache.stats()['memory_entries'],
+                           ('disk',): ocr_cache.stats()['disk_entries']}, ['tier'])
+REGISTRY.callback('ocr_cache_disk_bytes', 'Bytes used by the disk cache tier', 'gauge', _cache_metric('disk_bytes'))
+REGISTRY.callback('ocr_result_store_entries', 'Saved OCR results in the result store', 'gauge',
+                  lambda: result_store.stats()['entries'])
+REGISTRY.callback('ocr_result_store_bytes', 'Bytes used by the result store (after compression)', 'gauge',
+                  lambda: result_store.stats()['stored_bytes'])
+REGISTRY.callback('ocr_result_store_evictions_total', 'Results removed by TTL expiry or the size limit', 'counter',
+                  lambda: {('expired',): result_store.stats()['expired'],
+                           ('size',): result_store.stats()['evicted']}, ['reason'])
+REGISTRY.callback('ocr_admission_in_flight', 'Recognition requests being processed', 'gauge',
+                  lambda: admission.stats()['in_flight'])
+REGISTRY.callback('ocr_admission_queue_depth', 'Recognition requests waiting for a slot', 'gauge',
+                  lambda: admission.stats()['queued'])
+REGISTRY.callback('ocr_admission_rejected_total', 'Recognition requests rejected with 429', 'counter',
+                  lambda: admission.stats()['rejected'])
+REGISTRY.callback('ocr_admission_queue_wait_milliseconds', 'Time recognition requests wait for a slot', 'histogram',
+                  lambda: admission.stats()['queue_wait_ms'])
+REGISTRY.callback('ocr_process_peak_rss_bytes', 'Peak resident memory of the server process', 'gauge',
+                  peak_rss_bytes)
+REGISTRY.callback('ocr_jobs_queued', 'Async jobs waiting in the queue', 'gauge', _job_metric('queued'))
+REGISTRY.callback('ocr_jobs_running', 'Async jobs being processed', 'gauge', _job_metric('running'))
+REGISTRY.callback('ocr_batcher_queue_depth', 'Images waiting for the micro-batcher', 'gauge',
+                  lambda: _batcher.queue_depth() if _batcher is not None else None)
+REGISTRY.callback('ocr_batch_size', 'Images per micro-batch', 'histogram', _batcher_histogram('batch_size'))
+REGISTRY.callback('ocr_batch_queue_wait_milliseconds', 'Time images wait for a micro-batch', 'histogram',
+                  _batcher_histogram('queue_wait_ms'))
+REGISTRY.callback('ocr_pool_ready_workers', 'Engine pool workers ready to serve', 'gauge',
+                  _pool_metric('ready_workers'))
+REGISTRY.callback('ocr_pool_busy_workers', 'Engine pool workers running a task', 'gauge',
+                  _pool_metric('busy_workers'))
+REGISTRY.callback('ocr_pool_queued_tasks', 'Tasks waiting for an engine pool worker', 'gauge',
+                  _pool_metric('queued_tasks'))
+REGISTRY.callback('ocr_engine_in_flight', 'Recognitions in progress per engine', 'gauge',
+                  _router_in_flight, ['engine'])
+REGISTRY.callback('ocr_route_decisions_total', 'Requests routed to each engine as first choice', 'counter',
+                  _router_metric('decisions'), ['engine'])
+REGISTRY.callback('ocr_route_wins_total', 'Routed requests answered by each engine', 'counter',
+                  _router_metric('wins'), ['engine'])
+REGISTRY.callback('ocr_route_hedges_total', 'Routed requests hedged with the second engine', 'counter',
+                  _router_metric('hedges'))
+REGISTRY.callback('ocr_route_hedge_wins_total', 'Hedged requests answered by the second engine', 'counter',
+                  _router_metric('hedge_wins'))
+REGISTRY.callback('ocr_route_failovers_total', 'Routed requests retried on the other engine after a failure', 'counter',
+                  _router_metric('failovers'))
+REGISTRY.callback('ocrspace_requests_total', 'HTTP requests sent to OCR.space (including retries)', 'counter',
+                  _ocrspace_metric('requests'))
+REGISTRY.callback('ocrspace_retries_total', 'OCR.space request retries', 'counter', _ocrspace_metric('retries'))
+REGISTRY.callback('ocrspace_in_flight', 'OCR.space requests in progress', 'gauge', _ocrspace_metric('in_flight'))
+REGISTRY.callback('ocrspace_request_duration_milliseconds', 'OCR.space HTTP request latency', 'histogram',
+                  _ocrspace_metric('latency_ms'))
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 指标 (文本格式)"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ==================== 准入控制 ====================
+
+@app.before_request
+def admit_request():
+    """Wait for a recognition slot; reject with 429 + Retry-After when the queue is full"""
+    if not ADMISSION_CONFIG['enabled'] or request.endpoint not in ADMISSION_CONFIG['endpoints']:
+        return None
+    try:
+        with stage('admission.wait'):
+            g.admission_ticket = admission.acquire()
+    except AdmissionRejected as e:
+        logger.warning(f"Request rejected ({request.endpoint}): {str(e)}")
+        response = jsonify({
+            'success': False,
+            'error': str(e)
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
+
+@app.after_request
+def release_admission(response):
+    """Hold the slot until the response body has been sent (covers streamed responses)"""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        response.call_on_close(ticket.release)
+    return response
+
+
+@app.teardown_request
+def abort_admission(exc):
+    """Release the slot when the request failed before after_request"""
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+
+
+# ==================== 请求采样分析 ====================
+
+@app.before_request
+def start_request_profile():
+    # Do not let admin/metrics scrapes push real requests out of the ring buffer
+    if not profiler.enabled or request.path.startswith('/admin/') or request.path == '/metrics':
+        return
+    g.profile_session = profiler.start(request.headers.get('X-Profile'),
+                                       request.headers.get('X-Profile-Mode'))
+
+
+@app.after_request
+def finish_request_profile(response):
+    """Stop profiling once the response body has been sent (covers streamed responses)"""
+    session = g.pop('profile_session', None)
+    if session is None:
+        return response
+    method, path, status = request.method, request.path, response.status_code
+    response.headers['X-Profile-Id'] = session.id
+    response.call_on_close(lambda: profiler.finish(session, method, path, status))
+    return response
+
+
+@app.teardown_request
+def abort_request_profile(exc):
+    """Make sure a profile is not left running when the request failed before after_request"""
+    session = g.pop('profile_session', None)
+    if session is not None:
+        profiler.finish(session, request.method, request.path, 500)
+
+
+def check_profile_token():
+    """Admin endpoints require the profiler secret (X-Profile-Token header or ?token=)"""
+    token = request.headers.get('X-Profile-Token') or request.args.get('token')
+    return profiler.check_secret(token)
+
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """管理接口：已保存的请求分析结果列表"""
+    if not check_profile_token():
+        return jsonify({'success': False, 'error': '无权访问'}), 403
+    return jsonify({
+        'success': True,
+        'data': {
+            'profiler': profiler.stats(),
+            'profiles': profiler.list()
+        }
+    })
+
+
+@app.route('/admin/profiles/<profile_id>')
+def admin_profile_download(profile_id):
+    """
+    管理接口：下载单个分析结果
+    
+    format: pstats (cprofile 默认) / text (cprofile 文本报告) / collapsed (stack 默认，火焰图输入)
+    """
+    if not check_profile_token():
+        return jsonify({'success': False, 'error': '无权访问'}), 403
+    record = profiler.get(profile_id)
+    if record is None:
+        return jsonify({'success': False, 'error': '分析结果不存在或已被淘汰'}), 404
+    
+    fmt = request.args.get('format') or ('pstats' if record['mode'] == 'cprofile' else 'collapsed')
+    if record['mode'] == 'cprofile' and fmt == 'pstats':
+        return Response(export_pstats(record), mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename=profile_{profile_id}.pstats'})
+    if record['mode'] == 'cprofile' and fmt == 'text':
+        return Response(export_text(record), mimetype='text/plain; charset=utf-8')
+    if record['mode'] == 'stack' and fmt == 'collapsed':
+        return Response(export_collapsed(record), mimetype='text/plain; charset=utf-8', headers={
+            'Content-Disposition': f'attachment; filename=profile_{profile_id}.collapsed'})
+    return jsonify({
+        'success': False,
+        'error': f"{record['mode']} 模式的分析结果不支持 format={fmt}"
+    }), 400
+
+
+# ==================== 健康检查 ====================
+
+@app.route('/healthz')
+def healthz():
+    """存活探针: 进程可以响应请求即返回 200"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """
+    就绪探针: 模型已加载并预热后返回 200，否则返回 503
+    
+    未开启预加载 (WARMUP_CONFIG['eager']=False) 时模型在首个请求时加载，始终返回 200
+    """
+    ready = _engine_state['ready'] or not WARMUP_CONFIG['eager']
+    data = dict(_engine_state)
+    data['eager'] = WARMUP_CONFIG['eager']
+    pool = get_engine_pool() if _engine_state['ready'] else None
+    if pool is not None:
+        health = pool.health()
+        data['ready_workers'] = health['ready_workers']
+        ready = ready and health['healthy']
+    data['status'] = 'ready' if ready else 'not_ready'
+    return jsonify(data), 200 if ready else 503
+
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """API 接口：OCR 结果缓存命中统计"""
+    return jsonify({
+        'success': True,
+        'data': ocr_cache.stats()
+    })
+
+
+@app.route('/api/pool/health')
+def api_pool_health():
+    """API 接口：PaddleOCR 引擎进程池健康状态"""
+    pool = get_engine_pool()
+    if pool is None:
+        return jsonify({
+            'success': True,
+            'data': {'enabled': False}
+        })
+    health = pool.health()
+    health['enabled'] = True
+    return jsonify({
+        'success': True,
+        'data': health
+    }), 200 if health['healthy'] else 503
+
+
+@app.route('/api/batcher/stats')
+def api_batcher_stats():
+    """API 接口：微批调度器批大小与排队等待时间直方图"""
+    batcher = get_batcher()
+    if batcher is None:
+        return jsonify({
+            'success': True,
+            'data': {'enabled': False}
+        })
+    stats = batcher.stats()
+    stats['enabled'] = True
+    return jsonify({
+        'success': True,
+        'data': stats
+    })
+
+
+@app.route('/api/admission/stats')
+def api_admission_stats():
+    """API 接口：识别请求的并发数、排队数、拒绝数与排队等待直方图"""
+    stats = admission.stats()
+    stats['enabled'] = ADMISSION_CONFIG['enabled']
+    return jsonify({
+        'success': True,
+        'data': stats
+    })
+
+
+@app.route('/api/ocrspace/stats')
+def api_ocrspace_stats():
+    """API 接口：OCR.space 客户端请求数、重试、状态码与延迟直方图"""
+    return jsonify({
+        'success': True,
+        'data': get_ocrspace_client().stats()
+    })
+
+
+@app.route('/api/router/stats')
+def api_router_stats():
+    """API 接口：自动路由 (ocr_service=auto) 的引擎延迟、排队与路由决策统计"""
+    return jsonify({
+        'success': True,
+        'data': get_router().stats()
+    })
+
+
 @app.errorhandler(413)
 def too_large(e):
     """Handle file too large error"""
@@ -581,8 +2292,16 @@ def server_error(e):
     }), 500
 
 
+# Eager startup when imported by a WSGI/ASGI server (gunicorn app:app, waitress-serve app:app)
+if WARMUP_CONFIG['eager'] and __name__ == 'app':
+    start_engine_warmup()
+
+
 if __name__ == '__main__':
     logger.info("Starting OCR Web Application...")
+    # With the debug reloader, only warm up in the child process that serves requests
+    if WARMUP_CONFIG['eager'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_engine_warmup()
     logger.info("Access the application at: http://localhost:5000")
     # Run with host='0.0.0.0' for network access
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,231 @@
+"""
+ASGI 服务入口 (生产部署)
+========================
+
+事件循环负责连接和请求体的读写，Flask 应用在有界线程池中执行:
+    - 线程数 = 准入控制的 max_in_flight + max_queue + 轻量请求 (健康检查、指标、下载) 预留线程
+    - 每个请求 (含响应体迭代和 close()) 固定在一个工作线程上执行
+    - 线程池已满时直接在事件循环中返回 503 + Retry-After，不再为新请求创建线程
+    - 识别接口由 app.py 中的准入控制限流 (本入口默认开启)，排队已满时返回 429 + Retry-After
+    - 客户端断开时设置 environ['ocr.disconnected'] (threading.Event)
+
+启动:
+    pip install uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    python asgi.py
+"""
+import io
+import os
+import sys
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# 有界线程池依赖准入控制限流识别请求: ASGI 部署时默认开启 (OCR_ADMISSION=0 可关闭)
+os.environ.setdefault('OCR_ADMISSION', '1')
+
+from app import app as flask_app  # noqa: E402
+from config import ADMISSION_CONFIG, SERVER_CONFIG, MAX_CONTENT_LENGTH  # noqa: E402
+
+class _ClientDisconnected(Exception):
+    """客户端在请求体读完之前断开"""
+
+
+class WSGIBridge:
+    """
+    在有界线程池中运行 WSGI 应用的 ASGI 应用
+
+    参数:
+        wsgi_app: WSGI 应用
+        workers: 线程池大小
+        max_body: 请求体最大字节数 (超出返回 413)
+        retry_after: 线程池已满时返回的 Retry-After 秒数
+    """
+
+    def __init__(self, wsgi_app, workers, max_body, retry_after=1):
+        self.wsgi_app = wsgi_app
+        self.workers = max(1, workers)
+        self.max_body = max_body
+        self.retry_after = retry_after
+        self.busy = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='asgi-worker')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        # 线程池满载: 在事件循环中直接拒绝，不读取请求体
+        if self.busy >= self.workers:
+            self.rejected += 1
+            await _send_simple(send, 503, b'{"success": false, "error": "server busy"}',
+                               [(b'retry-after', str(self.retry_after).encode())])
+            return
+
+        # 读取请求体时即占用名额，同时限制缓存在内存中的请求体总量
+        self.busy += 1
+        try:
+            try:
+                body = await self._read_body(receive)
+            except _ClientDisconnected:
+                return
+            if body is None:
+                await _send_simple(send, 413, b'{"success": false, "error": "request entity too large"}')
+                return
+
+            disconnected = threading.Event()
+            environ = _build_environ(scope, body)
+            environ['ocr.disconnected'] = disconnected
+            watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected))
+            try:
+                await self._run(environ, send, disconnected)
+            finally:
+                watcher.cancel()
+        finally:
+            self.busy -= 1
+
+    async def _run(self, environ, send, disconnected):
+        loop = asyncio.get_running_loop()
+        # 每个请求使用事件循环上下文的一份拷贝，ContextVar (阶段耗时等) 不会在复用的线程间串用
+        context = contextvars.copy_context()
+        await loop.run_in_executor(self._executor, context.run, self._run_sync, environ, send, disconnected, loop)
+
+    def _run_sync(self, environ, send, disconnected, loop):
+        """
+        在同一个工作线程中完成整个请求: 调用应用、迭代响应体、close()
+
+        请求采样分析 (cProfile / 调用栈采样) 和 ContextVar 依赖请求始终在同一线程上执行；
+        响应块通过事件循环发送，发送完成前不读取下一块 (背压)。
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None  # write() 不支持 (Flask 不使用)
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start():
+            response['started'] = True
+            emit({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            # start_response 可能在产出第一块时才调用
+            for chunk in iterable:
+                if not chunk:
+                    continue
+                if not response.get('started'):
+                    start()
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if disconnected.is_set():
+                    break
+            if not response.get('started'):
+                start()
+            emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            # close() 触发 Flask 的 call_on_close 回调 (释放准入名额、结束采样分析)
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    async def _read_body(self, receive):
+        """读取完整请求体，超过 max_body 返回 None"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise _ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            disconnected.set()
+            return
+
+
+async def _send_simple(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode()), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _build_environ(scope, body):
+    """ASGI HTTP scope -> WSGI environ (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'content-length':
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+app = WSGIBridge(
+    flask_app,
+    workers=ADMISSION_CONFIG['max_in_flight'] + ADMISSION_CONFIG['max_queue'] + SERVER_CONFIG['light_workers'],
+    # multipart 边界和表单字段的余量
+    max_body=MAX_CONTENT_LENGTH + 64 * 1024
+)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("ASGI serving requires uvicorn. Please run: pip install uvicorn")
+    uvicorn.run(app, host=SERVER_CONFIG['host'], port=SERVER_CONFIG['port'],
+                backlog=SERVER_CONFIG['backlog'], log_level='info')
@@ -0,0 +1,338 @@
+"""
+OCR API 并发批量客户端
+======================
+
+对 /api/ocr 并发提交文件，用于夜间批量补录和容量评估:
+
+- 线程池并发 (--concurrency)，可按目标速率发送 (--rps，0 表示不限速)
+- 复用 keep-alive 连接 (requests.Session 连接池)
+- 记录每个请求的延迟，结束时输出吞吐量与延迟分位数
+- 结果逐行写入 JSONL，中断后可用 --resume 跳过已成功的文件
+- 429 / 503 / 网络错误按 Retry-After 或指数退避重试 (--retries)
+
+用法:
+    python batch_client.py invoices/ --concurrency 8 --output results.jsonl --include-result
+    python batch_client.py invoices/ --concurrency 8 --output results.jsonl --resume
+    python batch_client.py invoice.pdf --repeat 200 --concurrency 16 --rps 20 --output load.jsonl
+    python batch_client.py --stand-in --repeat 100 --concurrency 8    # 本地替代服务，无需模型
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# API 服务地址
+API_URL = "http://localhost:5000/api/ocr"
+
+FILE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pdf')
+RETRY_STATUS = (429, 503)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def expand_paths(paths):
+    """文件、目录 (不递归) 和通配符展开为按名称排序的文件列表"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = [os.path.join(path, name) for name in os.listdir(path)]
+        else:
+            matches = glob.glob(path) or [path]
+        files.extend(sorted(p for p in matches if p.lower().endswith(FILE_EXTENSIONS)))
+    return files
+
+
+def load_completed(output):
+    """读取已有 JSONL 中识别成功的文件 (--resume)"""
+    completed = set()
+    if not output or not os.path.exists(output):
+        return completed
+    with open(output, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 上次中断时写了一半的行
+            if record.get('ok'):
+                completed.add(record['file'])
+    return completed
+
+
+class RatePacer:
+    """按固定间隔分配发送时刻 (开环)，调用方在分配的时刻之前等待"""
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self._next = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """等待轮到本次发送，返回计划发送时刻 (perf_counter)"""
+        now = time.perf_counter()
+        if not self.interval:
+            return now
+        with self._lock:
+            if self._next is None:
+                self._next = now
+            scheduled = self._next
+            self._next += self.interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+        return scheduled
+
+
+class BatchClient:
+    """
+    并发 OCR API 客户端
+
+    参数:
+        url: /api/ocr 地址
+        concurrency: 同时进行的请求数 (也是连接池大小)
+        rps: 目标发送速率 (每秒请求数，0 = 不限速，尽快发送)
+        ocr_service: '1' 本地 / '2' OCR.space / 'auto'
+        save_result: 是否在服务器保存结果文件
+        timeout: 单个请求超时 (秒)
+        retries: 429 / 503 / 网络错误的重试次数
+    """
+
+    def __init__(self, url=API_URL, concurrency=4, rps=0, ocr_service='1', save_result=False,
+                 timeout=300, retries=2):
+        self.url = url
+        self.concurrency = max(1, int(concurrency))
+        self.rps = rps
+        self.ocr_service = ocr_service
+        self.save_result = save_result
+        self.timeout = timeout
+        self.retries = retries
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def close(self):
+        self._session.close()
+
+    def submit(self, file_path):
+        """
+        提交一个文件 (含重试)
+
+        返回:
+            (记录字典, 响应中的 data 或 None)
+        """
+        record = {'file': file_path, 'ok': False, 'status': None, 'attempts': 0}
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        record['bytes'] = len(content)
+        data = {
+            'ocr_service': self.ocr_service,
+            'save_result': 'true' if self.save_result else 'false',
+        }
+
+        result = None
+        start = time.perf_counter()
+        while True:
+            record['attempts'] += 1
+            retry_after = None
+            try:
+                response = self._session.post(
+                    self.url, files={'file': (os.path.basename(file_path), content)},
+                    data=data, timeout=self.timeout
+                )
+                record['status'] = response.status_code
+                server_timing = response.headers.get('Server-Timing')
+                if server_timing:
+                    record['server_timing'] = server_timing
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                if response.status_code == 200 and body.get('success'):
+                    record['ok'] = True
+                    record.pop('error', None)
+                    result = body['data']
+                    break
+                record['error'] = body.get('error') or f"HTTP {response.status_code}"
+                if response.status_code not in RETRY_STATUS:
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except requests.exceptions.RequestException as e:
+                record['status'] = None
+                record['error'] = f"{type(e).__name__}: {str(e)}"
+            if record['attempts'] > self.retries:
+                break
+            time.sleep(self._backoff(record['attempts'], retry_after))
+
+        record['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        if result is not None:
+            record['invoice_amount'] = result.get('invoice_amount')
+            record['line_count'] = result.get('line_count')
+        return record, result
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+    def run(self, files, output=None, include_result=False, on_record=None):
+        """
+        并发处理文件列表
+
+        参数:
+            files: 文件路径列表 (可重复，用于压测)
+            output: JSONL 输出路径 (追加写入，每完成一个请求写一行)
+            include_result: JSONL 中是否包含完整识别结果 (data)
+            on_record: 每完成一个请求调用一次 on_record(record, data)
+        返回:
+            汇总字典 (见 summarize)
+        """
+        pacer = RatePacer(self.rps)
+        records = []
+        lock = threading.Lock()
+        out = open(output, 'a', encoding='utf-8') if output else None
+
+        def task(seq, file_path):
+            scheduled = pacer.wait()
+            record, result = self.submit(file_path)
+            # 发送时刻落后计划的时间: 并发不足以维持目标速率时增大
+            record['lag_ms'] = round((time.perf_counter() - scheduled) * 1000 - record['latency_ms'], 1)
+            record['seq'] = seq
+            record['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            line = dict(record, result=result) if include_result else record
+            with lock:
+                records.append(record)
+                if out is not None:
+                    out.write(json.dumps(line, ensure_ascii=False) + '\n')
+                    out.flush()
+                if on_record is not None:
+                    on_record(record, result)
+
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='batch-client')
+        try:
+            for future in [executor.submit(task, seq, path) for seq, path in enumerate(files)]:
+                future.result()
+        except BaseException:
+            # 中断或出错时不再发送排队中的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown()
+            if out is not None:
+                out.close()
+        return self.summarize(records, time.perf_counter() - start)
+
+    def summarize(self, records, elapsed):
+        latencies = [r['latency_ms'] for r in records]
+        lags = [r['lag_ms'] for r in records]
+        status_codes = {}
+        for r in records:
+            key = str(r['status']) if r['status'] is not None else 'error'
+            status_codes[key] = status_codes.get(key, 0) + 1
+        return {
+            'requests': len(records),
+            'succeeded': sum(1 for r in records if r['ok']),
+            'failed': sum(1 for r in records if not r['ok']),
+            'retried': sum(1 for r in records if r['attempts'] > 1),
+            'status_codes': status_codes,
+            'concurrency': self.concurrency,
+            'target_rps': self.rps,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(records) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies) if latencies else 0.0,
+            },
+            'lag_ms_p99': percentile(lags, 99),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent batch / load client for the OCR API')
+    parser.add_argument('paths', nargs='*', help='文件、目录或通配符')
+    parser.add_argument('--url', default=API_URL)
+    parser.add_argument('--service', default='1', choices=['1', '2', 'auto'], help='OCR 服务类型')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rps', type=float, default=0, help='目标速率 (每秒请求数，0 = 不限速)')
+    parser.add_argument('--repeat', type=int, default=1, help='每个文件提交次数 (压测用)')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--save-result', action='store_true', help='在服务器保存结果文件')
+    parser.add_argument('--output', help='JSONL 结果文件 (追加)')
+    parser.add_argument('--include-result', action='store_true', help='JSONL 中包含完整识别结果')
+    parser.add_argument('--resume', action='store_true', help='跳过 --output 中已成功的文件')
+    parser.add_argument('--stand-in', action='store_true',
+                        help='在本进程启动使用替代引擎的服务 (无需模型)，未指定文件时使用合成发票')
+    parser.add_argument('--quiet', action='store_true', help='不逐条打印请求结果')
+    args = parser.parse_args()
+
+    server = None
+    if args.stand_in:
+        import logging
+        from benchmarks.fake_engine import start_stand_in_server
+        logging.disable(logging.INFO)
+        args.url, server = start_stand_in_server()
+        if not args.paths:
+            import tempfile
+            from benchmarks.synthetic import make_invoice_image
+            path = os.path.join(tempfile.mkdtemp(prefix='ocr-batch-'), 'invoice.jpg')
+            with open(path, 'wb') as f:
+                f.write(make_invoice_image(seed=1))
+            args.paths = [path]
+
+    files = expand_paths(args.paths)
+    if args.resume:
+        completed = load_completed(args.output)
+        files = [path for path in files if path not in completed]
+        print(f"跳过已完成 {len(completed)} 个文件", file=sys.stderr)
+    files = files * max(1, args.repeat)
+    if not files:
+        parser.error('没有可提交的文件')
+
+    client = BatchClient(args.url, args.concurrency, args.rps, args.service, args.save_result,
+                         args.timeout, args.retries)
+    total = len(files)
+    done = [0]
+
+    def report(record, result):
+        done[0] += 1
+        if not args.quiet:
+            status = record['status'] if record['ok'] else f"{record['status']} {record.get('error', '')}"
+            print(f"[{done[0]}/{total}] {record['file']} {status} {record['latency_ms']}ms", file=sys.stderr)
+
+    try:
+        summary = client.run(files, args.output, args.include_result, on_record=report)
+    except KeyboardInterrupt:
+        print("已中断，可使用 --resume 继续", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        client.close()
+        if server is not None:
+            server.shutdown()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(0 if summary['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+跨请求动态微批调度器
+====================
+
+并发请求各自提交单张图片，调度器在一个很短的时间窗口内 (max_wait_ms)
+收集最多 max_batch_size 张图片，合并为一次批量推理，再把结果分发回各个请求。
+以几毫秒的额外延迟换取突发负载下更高的吞吐量。
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000]
+
+
+class _Request:
+    __slots__ = ('image', 'future', 'enqueued_at')
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    动态微批调度器
+
+    参数:
+        predict_fn: 批量推理函数，输入图片列表，返回等长的结果列表
+        max_batch_size: 每批最多图片数
+        max_wait_ms: 批次中第一个请求最多等待的毫秒数
+        max_concurrent_batches: 同时执行的批次数 (使用引擎池时可设为进程数)
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, max_concurrent_batches=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+
+        self.batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self.batches = 0
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent_batches)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                            thread_name_prefix='micro-batch')
+        self._thread = threading.Thread(target=self._collect, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """提交单张图片，返回 Future (结果为该图片的识别结果)"""
+        request = _Request(image)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, image):
+        """同步识别单张图片"""
+        return self.submit(image).result()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """返回批大小与排队等待时间直方图"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'max_concurrent_batches': self.max_concurrent_batches,
+            'batches': self.batches,
+            'requests': self.requests,
+            'queue_depth': self.queue_depth(),
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait_ms': self.queue_wait_histogram.snapshot(),
+        }
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+
+    # ---------- 内部方法 ----------
+
+    def _collect(self):
+        """后台线程: 收集请求组成批次"""
+        while True:
+            # 所有批次执行槽位都忙时先等待，期间新请求继续排队，形成更大的批次
+            self._slots.acquire()
+            first = self._queue.get()
+            if first is None:
+                self._slots.release()
+                break
+
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            started = time.perf_counter()
+            for item in batch:
+                self.queue_wait_histogram.observe((started - item.enqueued_at) * 1000)
+            self.batch_size_histogram.observe(len(batch))
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+
+            try:
+                results = self.predict_fn([item.image for item in batch])
+                if len(results) != len(batch):
+                    raise Exception(f"Batch predict returned {len(results)} results for {len(batch)} inputs")
+            except Exception as e:
+                logger.error(f"Micro-batch of {len(batch)} failed: {str(e)}")
+                for item in batch:
+                    item.future.set_exception(e)
+                return
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+        finally:
+            self._slots.release()
@@ -0,0 +1,8 @@
+"""
+OCR 性能基准测试
+
+运行方式 (在项目根目录):
+    python -m benchmarks.pipeline --output bench.json    # 流水线离线基准 (合成发票，无需模型)
+    python -m benchmarks.amount_roi invoice.pdf
+    python -m benchmarks.response_format --pages 50       # /api/ocr 响应大小与编码耗时
+"""
@@ -0,0 +1,71 @@
+"""
+发票金额快速提取 (mode=amount) 与整页识别的延迟对比
+
+用法:
+    python -m benchmarks.amount_roi invoice1.pdf invoice2.jpg [--repeat 5]
+
+对每个文件分别运行:
+    full   - 整页识别 + extract_invoice_amount
+    amount - extract_amount_fast (文本层 / 区域识别，未命中再整页)
+结果缓存在测试期间关闭，首轮预热不计入统计。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def time_call(fn, repeat):
+    """运行 fn repeat 次，返回 (最后一次结果, 每次耗时毫秒列表)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='mode=amount vs full-page OCR latency')
+    parser.add_argument('files', nargs='+', help='发票文件 (PDF / JPG / PNG)')
+    parser.add_argument('--repeat', type=int, default=5, help='每种模式重复次数')
+    parser.add_argument('--service', default='local', choices=['local', 'ocrspace'])
+    args = parser.parse_args()
+
+    import app
+    from upload_buffer import UploadBuffer
+
+    app.ocr_cache.enabled = False
+
+    print(f"{'file':30} {'mode':7} {'median_ms':>10} {'min_ms':>10} {'amount':>14} source")
+    for path in args.files:
+        filename = os.path.basename(path)
+        upload = UploadBuffer.from_path(path)
+
+        def full():
+            texts, fields, _ = app.run_ocr(upload, filename, args.service)
+            return fields['invoice_amount'], 'full_page'
+
+        def amount_only():
+            return app.extract_amount_fast(upload, filename, args.service)
+
+        # 预热 (模型加载等)
+        full()
+
+        medians = {}
+        for mode, fn in (('full', full), ('amount', amount_only)):
+            (amount, source), timings = time_call(fn, args.repeat)
+            medians[mode] = statistics.median(timings)
+            print(f"{filename[:30]:30} {mode:7} {medians[mode]:10.1f} {min(timings):10.1f} "
+                  f"{amount:>14} {source}")
+
+        if medians['amount'] > 0:
+            print(f"{'':30} speedup x{medians['full'] / medians['amount']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+发票字段提取微基准
+
+对比:
+    legacy  - 旧版 extract_invoice_amount (每行 4 次正则，只提取金额)
+    amount  - InvoiceExtractor 只提取金额
+    fields  - InvoiceExtractor 一次扫描提取全部字段
+    batch   - InvoiceExtractor.extract_batch 多进程批量提取
+
+用法:
+    python -m benchmarks.extract_fields [--docs 5000] [--lines 60] [--processes 4]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_extractor import InvoiceExtractor  # noqa: E402
+
+FIELD_LINES = [
+    '电子发票（增值税专用发票）',
+    '发票号码：24442000000012345678',
+    '开票日期：2024年03月15日',
+    '名称：深圳市某某科技有限公司',
+    '统一社会信用代码/纳税人识别号：91440300MA5XXXXX1A',
+    '名称：广州市某某贸易有限公司',
+    '统一社会信用代码/纳税人识别号：91440101MA5YYYYY2B',
+    '价税合计（大写）',
+    '壹拾捌万陆仟柒佰捌拾壹圆整',
+    '（小写）￥186,781.00',
+]
+
+FILLER_LINES = [
+    '*信息技术服务*软件开发服务', '项', '1', '165,293.81', '13%', '21,488.19',
+    '合计', '¥165293.81', '¥21488.19', '备注', '开票人：张三', '规格型号', '单位', '数量',
+]
+
+
+def legacy_extract_invoice_amount(texts):
+    """旧版实现 (逐行 4 次正则匹配，仅作基准对比)"""
+    xiaoxie_candidates = []
+    other_candidates = []
+    for i, text in enumerate(texts):
+        match = re.search(r'[（\(]小写[）\)]\s*[￥¥]?\s*([\d,]+\.?\d*)', text)
+        if match:
+            amount = match.group(1).replace(',', '')
+            try:
+                if float(amount) >= 100:
+                    xiaoxie_candidates.append((i, float(amount), amount))
+            except ValueError:
+                pass
+        match = re.search(r'小写\s+(\d[\d,]*\.?\d*)', text)
+        if match:
+            amount = match.group(1).replace(',', '')
+            try:
+                if float(amount) >= 100:
+                    xiaoxie_candidates.append((i, float(amount), amount))
+            except ValueError:
+                pass
+        if text.strip() in ['小写', '(小写)', '（小写）']:
+            if i + 1 < len(texts):
+                next_line = texts[i + 1].strip()
+                match = re.match(r'^(\d[\d,]*\.\d{2})$', next_line)
+                if match:
+                    amount = match.group(1).replace(',', '')
+                    try:
+                        if float(amount) >= 100:
+                            xiaoxie_candidates.append((i, float(amount), amount))
+                    except ValueError:
+                        pass
+        match = re.match(r'^(\d{5,}\.?\d*)$', text.strip())
+        if match:
+            amount = match.group(1)
+            try:
+                if float(amount) >= 10000:
+                    other_candidates.append((i, float(amount), amount))
+            except ValueError:
+                pass
+    if xiaoxie_candidates:
+        xiaoxie_candidates.sort(key=lambda x: -x[0])
+        return xiaoxie_candidates[0][2]
+    if other_candidates:
+        other_candidates.sort(key=lambda x: -x[0])
+        return other_candidates[0][2]
+    return "0"
+
+
+def make_documents(count, lines, seed=42):
+    """生成合成识别结果: 字段行按顺序穿插在随机填充行之间"""
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        filler = [rng.choice(FILLER_LINES) for _ in range(max(0, lines - len(FIELD_LINES)))]
+        positions = sorted(rng.sample(range(len(filler) + 1), len(FIELD_LINES)), reverse=True)
+        doc = list(filler)
+        for pos, line in zip(positions, reversed(FIELD_LINES)):
+            doc.insert(pos, line)
+        documents.append(doc)
+    return documents
+
+
+def bench(name, fn, documents):
+    start = time.perf_counter()
+    fn(documents)
+    elapsed = time.perf_counter() - start
+    per_doc_us = elapsed / len(documents) * 1e6
+    print(f"{name:8} {elapsed * 1000:10.1f} ms total {per_doc_us:10.1f} us/doc "
+          f"{len(documents) / elapsed:12.0f} docs/sec")
+    return per_doc_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice field extraction micro-benchmark')
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--lines', type=int, default=60, help='每个文档的识别行数')
+    parser.add_argument('--processes', type=int, default=0, help='batch 模式进程数 (0 = 跳过)')
+    args = parser.parse_args()
+
+    documents = make_documents(args.docs, args.lines)
+    amount_only = InvoiceExtractor(['invoice_amount'])
+    all_fields = InvoiceExtractor()
+
+    # 结果一致性检查
+    for doc in documents[:200]:
+        assert legacy_extract_invoice_amount(doc) == amount_only.extract(doc)['invoice_amount']
+
+    print(f"{args.docs} documents x {args.lines} lines")
+    bench('legacy', lambda docs: [legacy_extract_invoice_amount(d) for d in docs], documents)
+    bench('amount', lambda docs: [amount_only.extract(d) for d in docs], documents)
+    bench('fields', lambda docs: [all_fields.extract(d) for d in docs], documents)
+    if args.processes > 1:
+        bench('batch', lambda docs: list(all_fields.extract_batch(docs, processes=args.processes)), documents)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+模型无关的替代 OCR 引擎
+
+与 PaddleOCR 3.x 的 predict() 接口和结果结构一致 (rec_texts / rec_scores / rec_polys)，
+用于在没有模型和 GPU 的机器上测量推理以外的开销 (文件保存、PDF 渲染、预处理、
+字段提取、JSON 序列化等)。
+
+启用:
+    OCR_ENGINE_FACTORY=benchmarks.fake_engine:FakeOCR python app.py
+
+可选模拟推理耗时 (默认 0，只测开销):
+    OCR_FAKE_BASE_MS       每张图片固定耗时 (毫秒)
+    OCR_FAKE_MS_PER_MP     每百万像素耗时 (毫秒)
+"""
+import os
+import time
+
+import numpy as np
+
+INVOICE_LINES = [
+    '电子发票（增值税专用发票）',
+    '发票号码：24442000000012345678',
+    '开票日期：2024年03月15日',
+    '名称：深圳市某某科技有限公司',
+    '统一社会信用代码/纳税人识别号：91440300MA5XXXXX1A',
+    '*信息技术服务*软件开发服务',
+    '165,293.81',
+    '13%',
+    '21,488.19',
+    '名称：广州市某某贸易有限公司',
+    '统一社会信用代码/纳税人识别号：91440101MA5YYYYY2B',
+    '价税合计（大写）',
+    '壹拾捌万陆仟柒佰捌拾壹圆整',
+    '（小写）￥186,781.00',
+    '开票人：张三',
+]
+
+
+class FakeOCR:
+    """替代 PaddleOCR 的引擎，忽略所有构造参数"""
+
+    def __init__(self, **kwargs):
+        self.base_ms = float(os.environ.get('OCR_FAKE_BASE_MS', '0'))
+        self.ms_per_mp = float(os.environ.get('OCR_FAKE_MS_PER_MP', '0'))
+        self.calls = 0
+
+    def predict(self, input, **kwargs):
+        images = input if isinstance(input, list) else [input]
+        self.calls += 1
+        results = []
+        for image in images:
+            height, width = _image_size(image)
+            delay_ms = self.base_ms + self.ms_per_mp * width * height / 1e6
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000)
+            results.append(_make_result(width, height))
+        return results
+
+
+def _image_size(image):
+    shape = getattr(image, 'shape', None)
+    if shape is not None:
+        return shape[0], shape[1]
+    # 文件路径 / 字节: 只读取尺寸，不解码
+    from PIL import Image
+    import io
+    with Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image) as img:
+        return img.height, img.width
+
+
+def _make_result(width, height):
+    """按行均匀排布的识别结果 (检测框、分数与文本一一对应)"""
+    line_height = max(1, height // (len(INVOICE_LINES) + 1))
+    polys = []
+    for i in range(len(INVOICE_LINES)):
+        y0 = i * line_height + line_height // 2
+        y1 = y0 + max(1, line_height // 2)
+        polys.append(np.array([[10, y0], [width - 10, y0], [width - 10, y1], [10, y1]], dtype=np.int16))
+    return {
+        'rec_texts': list(INVOICE_LINES),
+        'rec_scores': [0.98] * len(INVOICE_LINES),
+        'rec_polys': polys,
+    }
+
+
+def start_stand_in_server(port=0, ms_per_mp=None):
+    """
+    在后台线程启动使用替代引擎的完整 OCR 服务 (app.py)，供客户端压测
+
+    必须在本进程导入 app 之前调用。
+
+    参数:
+        port: 监听端口 (0 = 随机空闲端口)
+        ms_per_mp: 每百万像素模拟推理耗时 (毫秒，None = 沿用环境变量)
+    返回:
+        (/api/ocr 地址, server)，用完调用 server.shutdown()
+    """
+    import logging
+    import threading
+    from werkzeug.serving import make_server
+
+    os.environ['OCR_ENGINE_FACTORY'] = 'benchmarks.fake_engine:FakeOCR'
+    os.environ.setdefault('OCR_CACHE_ENABLED', '0')  # 重复提交同一文件时不命中缓存
+    if ms_per_mp is not None:
+        os.environ['OCR_FAKE_MS_PER_MP'] = str(ms_per_mp)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    import app
+    server = make_server('127.0.0.1', port, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/api/ocr', server
@@ -0,0 +1,98 @@
+"""
+OCR.space 客户端并发压测 (针对本地模拟服务)
+
+用法:
+    python -m benchmarks.ocrspace_load --requests 40 --concurrency 4 --throttle-rate 0.1
+
+启动 benchmarks.ocrspace_stub 模拟服务，用 OCRSpaceClient 并发提交请求，
+输出吞吐量、延迟分位数以及客户端 (重试、状态码) 和服务端 (最大并发) 统计。
+也可用 --endpoint 指向已运行的模拟服务。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCRSpaceClient load test against a local stub')
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=4, help='客户端并发上限')
+    parser.add_argument('--callers', type=int, default=16, help='同时调用 parse() 的线程数')
+    parser.add_argument('--rate-per-minute', type=float, default=0, help='限速 (0 = 不限速)')
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--endpoint', help='已运行的模拟服务地址 (默认在本进程内启动)')
+    args = parser.parse_args()
+
+    from ocrspace_client import OCRSpaceClient, OCRSpaceError
+    from benchmarks.ocrspace_stub import start_stub_server
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        endpoint, server = start_stub_server(
+            latency_ms=args.latency_ms, throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate, retry_after=0
+        )
+
+    client = OCRSpaceClient(
+        endpoint, 'stub-key', max_concurrency=args.concurrency,
+        rate_per_minute=args.rate_per_minute, burst=args.concurrency,
+        max_retries=args.max_retries, backoff_base=0.05, backoff_max=1.0
+    )
+
+    def call(i):
+        start = time.perf_counter()
+        try:
+            client.parse(f'invoice_{i}.jpg', b'fake image bytes')
+            ok = True
+        except OCRSpaceError:
+            ok = False
+        return ok, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.callers) as executor:
+        results = list(executor.map(call, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for _, ms in results]
+    report = {
+        'requests': args.requests,
+        'succeeded': sum(1 for ok, _ in results if ok),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+            'p99': round(percentile(latencies, 99), 1),
+        },
+        'client': {k: v for k, v in client.stats().items()
+                   if k not in ('latency_ms', 'rate_limit_wait_ms')},
+    }
+    if server is not None:
+        import requests
+        report['stub'] = requests.get(endpoint.replace('/parse/image', '/stats')).json()
+        server.shutdown()
+    client.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
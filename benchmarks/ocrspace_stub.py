@@ -0,0 +1,137 @@
+"""
+本地 OCR.space 模拟服务
+=======================
+
+返回与 OCR.space /parse/image 相同结构的 JSON (ParsedResults)，
+可注入延迟、429 限流和 5xx 错误，用于在不消耗真实配额的情况下
+测试 OCRSpaceClient 的并发、限速与重试。
+
+用法:
+    python -m benchmarks.ocrspace_stub --port 8089 --latency-ms 300 --throttle-rate 0.1
+    OCRSPACE_ENDPOINT=http://127.0.0.1:8089/parse/image python app.py
+"""
+import time
+import random
+import argparse
+import threading
+
+from flask import Flask, request, jsonify
+
+STUB_TEXT = '\n'.join([
+    '电子发票（普通发票）',
+    '发票号码：24440000000012345678',
+    '开票日期：2024年01月15日',
+    '价税合计（大写） 壹万贰仟叁佰肆拾伍元陆角柒分',
+    '（小写）¥12,345.67',
+])
+
+
+def count_pages(filename, data):
+    """PDF 返回页数，其他文件按 1 页处理"""
+    if not filename.lower().endswith('.pdf'):
+        return 1
+    try:
+        import fitz
+        with fitz.open(stream=data, filetype='pdf') as doc:
+            return len(doc)
+    except Exception:
+        return 1
+
+
+def create_stub_app(latency_ms=200, jitter_ms=50, throttle_rate=0.0, error_rate=0.0,
+                    retry_after=1, text=STUB_TEXT):
+    """
+    创建模拟服务
+
+    参数:
+        latency_ms / jitter_ms: 每个请求的模拟处理耗时及随机抖动 (毫秒)
+        throttle_rate: 返回 429 (带 Retry-After) 的概率
+        error_rate: 返回 503 的概率
+        retry_after: 429 响应的 Retry-After 秒数
+        text: 每页返回的 ParsedText
+    """
+    app = Flask(__name__)
+    lock = threading.Lock()
+    counters = {'requests': 0, 'throttled': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    @app.route('/parse/image', methods=['POST'])
+    def parse_image():
+        with lock:
+            counters['requests'] += 1
+            counters['in_flight'] += 1
+            counters['max_in_flight'] = max(counters['max_in_flight'], counters['in_flight'])
+        try:
+            roll = random.random()
+            if roll < throttle_rate:
+                with lock:
+                    counters['throttled'] += 1
+                response = jsonify({'ErrorMessage': ['Rate limit exceeded']})
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            if roll < throttle_rate + error_rate:
+                with lock:
+                    counters['errors'] += 1
+                return jsonify({'ErrorMessage': ['Service unavailable']}), 503
+
+            upload = request.files.get('file')
+            if upload is None or not request.form.get('apikey'):
+                return jsonify({
+                    'IsErroredOnProcessing': True,
+                    'ErrorMessage': ['No file or apikey'],
+                })
+            pages = count_pages(upload.filename or '', upload.read())
+
+            delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+            time.sleep(delay * pages)
+
+            return jsonify({
+                'ParsedResults': [
+                    {'FileParseExitCode': 1, 'ParsedText': text, 'ErrorMessage': ''}
+                    for _ in range(pages)
+                ],
+                'OCRExitCode': 1,
+                'IsErroredOnProcessing': False,
+                'ProcessingTimeInMilliseconds': str(round(delay * pages * 1000)),
+            })
+        finally:
+            with lock:
+                counters['in_flight'] -= 1
+
+    @app.route('/stats')
+    def stats():
+        with lock:
+            return jsonify(dict(counters))
+
+    return app
+
+
+def start_stub_server(port=0, **kwargs):
+    """
+    在后台线程启动模拟服务
+
+    返回:
+        (endpoint, server)，用完调用 server.shutdown()
+    """
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', port, create_stub_app(**kwargs), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/parse/image', server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OCR.space stand-in server')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='返回 429 的概率')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    app = create_stub_app(args.latency_ms, args.jitter_ms, args.throttle_rate,
+                          args.error_rate, args.retry_after)
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
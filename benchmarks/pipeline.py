@@ -0,0 +1,203 @@
+"""
+OCR 流水线离线基准
+
+用合成发票 (benchmarks.synthetic) 测量:
+    process_image        单张图片识别
+    process_pdf_scanned  扫描件 PDF (逐页渲染 + 识别)
+    process_pdf_digital  电子 PDF (文本层)
+    extract_amount       extract_invoice_amount (每次迭代调用 100 次，报告单次耗时)
+    api_ocr_image        Flask /api/ocr 图片 (test client，含上传解析与 JSON 序列化)
+    api_ocr_pdf          Flask /api/ocr 扫描件 PDF
+
+输出每项的吞吐量与 p50/p95/p99，可保存为 JSON 并与之前的结果对比。
+默认使用替代引擎 (benchmarks.fake_engine)，只测推理以外的开销，任何机器都能运行；
+--engine paddle 使用真实 PaddleOCR。
+
+用法:
+    python -m benchmarks.pipeline --iterations 30 --output bench.json
+    python -m benchmarks.pipeline --compare bench.json
+    python -m benchmarks.pipeline --engine paddle --cases process_image,api_ocr_image
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASES = ('process_image', 'process_pdf_scanned', 'process_pdf_digital', 'extract_amount',
+         'api_ocr_image', 'api_ocr_pdf')
+EXTRACT_CALLS = 100
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(timings_ms, ops_per_call=1):
+    """耗时列表 (毫秒) -> 吞吐量与分位数 (按单次操作计)"""
+    per_op = [ms / ops_per_call for ms in timings_ms]
+    total_s = sum(timings_ms) / 1000
+    return {
+        'iterations': len(timings_ms),
+        'ops': len(timings_ms) * ops_per_call,
+        'throughput_ops': round(len(timings_ms) * ops_per_call / total_s, 2) if total_s else 0.0,
+        'mean_ms': round(sum(per_op) / len(per_op), 3),
+        'p50_ms': round(percentile(per_op, 50), 3),
+        'p95_ms': round(percentile(per_op, 95), 3),
+        'p99_ms': round(percentile(per_op, 99), 3),
+    }
+
+
+def run_case(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    header = f"{'case':22} {'ops/s':>10} {'p50_ms':>10} {'p95_ms':>10} {'p99_ms':>10}"
+    if baseline:
+        header += f" {'p50 vs base':>12} {'ops/s vs base':>14}"
+    print(header)
+    for name, result in report['results'].items():
+        line = (f"{name:22} {result['throughput_ops']:10.1f} {result['p50_ms']:10.3f} "
+                f"{result['p95_ms']:10.3f} {result['p99_ms']:10.3f}")
+        base = (baseline or {}).get('results', {}).get(name)
+        if base:
+            line += f" {_delta(result['p50_ms'], base['p50_ms']):>12} "
+            line += f"{_delta(result['throughput_ops'], base['throughput_ops']):>14}"
+        print(line)
+
+
+def _delta(value, base):
+    if not base:
+        return '-'
+    return f"{(value - base) / base * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline OCR pipeline benchmark')
+    parser.add_argument('--iterations', type=int, default=20, help='每项计时次数')
+    parser.add_argument('--warmup', type=int, default=2, help='每项预热次数 (不计时)')
+    parser.add_argument('--pages', type=int, default=5, help='PDF 页数')
+    parser.add_argument('--cases', default=','.join(CASES), help='逗号分隔的测试项')
+    parser.add_argument('--engine', default='fake', choices=['fake', 'paddle'])
+    parser.add_argument('--fake-ms-per-mp', type=float, default=0.0,
+                        help='替代引擎每百万像素模拟耗时 (毫秒)')
+    parser.add_argument('--output', help='结果保存为 JSON 文件')
+    parser.add_argument('--compare', help='与之前保存的 JSON 结果对比')
+    args = parser.parse_args()
+
+    cases = [c for c in args.cases.split(',') if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    # 必须在导入 app 之前设置 (引擎池工作进程同样读取)
+    if args.engine == 'fake':
+        os.environ['OCR_ENGINE_FACTORY'] = 'benchmarks.fake_engine:FakeOCR'
+        os.environ['OCR_FAKE_MS_PER_MP'] = str(args.fake_ms_per_mp)
+    os.environ.setdefault('OCR_CACHE_ENABLED', '0')
+
+    import logging
+    logging.disable(logging.INFO)
+
+    import app
+    from benchmarks.synthetic import make_invoice_image, make_invoice_pdf
+
+    app.ocr_cache.enabled = False
+    client = app.app.test_client()
+
+    workdir = tempfile.mkdtemp(prefix='ocr-bench-')
+    image_bytes = make_invoice_image(seed=1)
+    scanned_pdf = make_invoice_pdf(args.pages, 'scanned', seed=1)
+    digital_pdf = make_invoice_pdf(args.pages, 'digital', seed=1)
+    paths = {}
+    for name, data in (('invoice.jpg', image_bytes), ('scanned.pdf', scanned_pdf), ('digital.pdf', digital_pdf)):
+        paths[name] = os.path.join(workdir, name)
+        with open(paths[name], 'wb') as f:
+            f.write(data)
+    lines = app.process_image(paths['invoice.jpg'])
+
+    def extract_amount():
+        for _ in range(EXTRACT_CALLS):
+            app.extract_invoice_amount(lines)
+
+    def api_ocr(data, filename):
+        def call():
+            response = client.post('/api/ocr', data={
+                'file': (io.BytesIO(data), filename),
+                'ocr_service': '1',
+                'save_result': 'false',
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/ocr returned {response.status_code}: {response.get_data(as_text=True)}")
+        return call
+
+    functions = {
+        'process_image': (lambda: app.process_image(paths['invoice.jpg']), 1),
+        'process_pdf_scanned': (lambda: app.process_pdf(paths['scanned.pdf']), 1),
+        'process_pdf_digital': (lambda: app.process_pdf(paths['digital.pdf']), 1),
+        'extract_amount': (extract_amount, EXTRACT_CALLS),
+        'api_ocr_image': (api_ocr(image_bytes, 'invoice.jpg'), 1),
+        'api_ocr_pdf': (api_ocr(scanned_pdf, 'scanned.pdf'), 1),
+    }
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'engine': args.engine,
+            'fake_ms_per_mp': args.fake_ms_per_mp if args.engine == 'fake' else None,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'pdf_pages': args.pages,
+            'image_bytes': len(image_bytes),
+            'scanned_pdf_bytes': len(scanned_pdf),
+        },
+        'results': {},
+    }
+    for name in cases:
+        fn, ops = functions[name]
+        report['results'][name] = summarize(run_case(fn, args.iterations, args.warmup), ops)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+/api/ocr 响应大小与编码耗时基准
+
+对比每种 format (full / lines / text / boxes) 下:
+    jsonify  - Flask 默认 jsonify (标准库 json，中文转义为 \\uXXXX)
+    json     - 标准库 json (ensure_ascii=False，紧凑分隔符)
+    orjson   - orjson (已安装时)
+及 gzip / br (已安装 brotli 时) 压缩后的大小和压缩耗时。
+
+用法:
+    python -m benchmarks.response_format [--pages 50] [--repeat 20]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_engine import OCRLine  # noqa: E402
+from responses import RESPONSE_FORMATS, ocr_text_fields, compress, available_encodings  # noqa: E402
+from responses import _load_orjson  # noqa: E402
+from benchmarks.fake_engine import INVOICE_LINES  # noqa: E402
+
+
+def make_lines(pages):
+    """合成多页识别结果: 每页 INVOICE_LINES 带分数和检测框，页间插入分页标记"""
+    lines = []
+    step = 1 / (len(INVOICE_LINES) + 1)
+    for page in range(1, pages + 1):
+        lines.append(f"--- 第 {page} 页 ---")
+        for i, text in enumerate(INVOICE_LINES):
+            y0 = round(step * (i + 0.5), 4)
+            lines.append(OCRLine(text, 0.9876, [0.0123, y0, 0.9877, round(y0 + step / 2, 4)]))
+    return lines
+
+
+def make_payload(lines, response_format):
+    data = ocr_text_fields(lines, response_format)
+    data.update({
+        'invoice_amount': '186781.00',
+        'invoice_fields': {'invoice_amount': '186781.00', 'invoice_number': '24442000000012345678'},
+        'ocr_service': '本地 PaddleOCR',
+        'cached': False,
+    })
+    return {'success': True, 'data': data}
+
+
+def time_ms(fn, repeat):
+    """返回 (结果, 中位耗时毫秒)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return result, timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/ocr payload size and encode time')
+    parser.add_argument('--pages', type=int, default=50, help='合成 PDF 页数')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    encoders = {
+        'jsonify': lambda obj: json.dumps(obj).encode('utf-8'),
+        'json': lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+    }
+    orjson = _load_orjson()
+    if orjson is not None:
+        encoders['orjson'] = orjson.dumps
+
+    lines = make_lines(args.pages)
+    print(f"{args.pages} pages, {len(lines)} lines")
+    print(f"{'format':7} {'encoder':8} {'bytes':>10} {'encode_ms':>10}"
+          + ''.join(f" {enc + '_bytes':>10} {enc + '_ms':>8}" for enc in available_encodings()))
+    for response_format in RESPONSE_FORMATS:
+        payload = make_payload(lines, response_format)
+        for name, encode in encoders.items():
+            body, encode_ms = time_ms(lambda: encode(payload), args.repeat)
+            row = f"{response_format:7} {name:8} {len(body):10d} {encode_ms:10.2f}"
+            for encoding in available_encodings():
+                compressed, compress_ms = time_ms(lambda: compress(body, encoding), args.repeat)
+                row += f" {len(compressed):10d} {compress_ms:8.2f}"
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+合成发票图片 / PDF (基准测试输入)
+
+相同参数 (seed) 生成的图片逐字节相同、PDF 页面内容相同，不依赖真实发票:
+    make_invoice_image  - 扫描件风格的 JPEG (表格线 + 文字行)
+    make_invoice_pdf    - 多页 PDF: scanned (每页一张图片，无文本层) /
+                          digital (内嵌中文文本层) / mixed (两者交替)
+"""
+import io
+import random
+
+from benchmarks.fake_engine import INVOICE_LINES
+
+# PIL 默认字体不含中文，图片中使用对应的拼音/英文行，版式与字段位置相同
+IMAGE_LINES = [
+    'DIANZI FAPIAO (ZENGZHISHUI ZHUANYONG FAPIAO)',
+    'Fapiao haoma: 24442000000012345678',
+    'Kaipiao riqi: 2024-03-15',
+    'Mingcheng: Shenzhen XX Technology Co., Ltd.',
+    'Nashuiren shibiehao: 91440300MA5XXXXX1A',
+    '*Information service* software development',
+    '165,293.81        13%        21,488.19',
+    'Mingcheng: Guangzhou XX Trading Co., Ltd.',
+    'Nashuiren shibiehao: 91440101MA5YYYYY2B',
+    'Jiashui heji (daxie)',
+    '(xiaoxie) 186,781.00',
+    'Kaipiaoren: Zhang San',
+]
+
+
+def make_invoice_image(width=1654, height=1169, seed=0, quality=85):
+    """
+    生成一张发票扫描件风格的 JPEG
+
+    参数:
+        width / height: 像素尺寸 (默认约为 A5 横版 200 DPI)
+        seed: 随机种子 (控制噪点和行偏移)
+    返回:
+        JPEG 字节
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height), (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+
+    # 表格框线
+    margin = width // 20
+    draw.rectangle([margin, margin, width - margin, height - margin], outline=(120, 60, 60), width=3)
+    for y in range(height // 4, height - margin, height // 6):
+        draw.line([margin, y, width - margin, y], fill=(150, 80, 80), width=2)
+
+    # 文字行
+    line_height = (height - 2 * margin) // (len(IMAGE_LINES) + 1)
+    for i, line in enumerate(IMAGE_LINES):
+        x = margin + 20 + rng.randint(0, 30)
+        y = margin + 10 + i * line_height + rng.randint(-3, 3)
+        draw.text((x, y), line, fill=(20, 20, 20))
+
+    # 扫描噪点
+    for _ in range(width * height // 2000):
+        x, y = rng.randrange(width), rng.randrange(height)
+        shade = rng.randint(120, 200)
+        draw.point((x, y), fill=(shade, shade, shade))
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def make_invoice_pdf(pages=5, kind='scanned', seed=0, image_size=(1654, 1169)):
+    """
+    生成多页发票 PDF
+
+    参数:
+        pages: 页数
+        kind: 'scanned' / 'digital' / 'mixed'
+        seed: 随机种子
+        image_size: scanned 页面嵌入图片的像素尺寸
+    返回:
+        PDF 字节
+    """
+    import fitz  # PyMuPDF
+
+    if kind not in ('scanned', 'digital', 'mixed'):
+        raise ValueError("kind 必须为 scanned / digital / mixed 之一")
+
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=420)  # A5 横版 (pt)
+        scanned = kind == 'scanned' or (kind == 'mixed' and i % 2 == 1)
+        if scanned:
+            image = make_invoice_image(*image_size, seed=seed + i)
+            page.insert_image(page.rect, stream=image)
+        else:
+            y = 40
+            for line in INVOICE_LINES:
+                page.insert_text((40, y), line, fontname='china-s', fontsize=11)
+                y += 24
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
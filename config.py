@@ -9,8 +9,14 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Upload configuration
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 RESULT_FOLDER = os.path.join(BASE_DIR, 'results')
+CACHE_FOLDER = os.path.join(BASE_DIR, 'cache')
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+# 上传文件缓冲: 不超过此大小的上传只保存在内存，更大的才写入 UPLOAD_FOLDER 下的临时文件
+UPLOAD_CONFIG = {
+    'memory_max_bytes': int(os.environ.get('OCR_UPLOAD_MEMORY_MB', '8')) * 1024 * 1024,
+}
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'pdf'}
 
@@ -25,6 +31,98 @@ OCR_CONFIG = {
     # 使用 Mobile 轻量模型替代 Server 模型
     'text_detection_model_name': 'PP-OCRv4_mobile_det',
     'text_recognition_model_name': 'PP-OCRv4_mobile_rec',
+    'text_recognition_batch_size': 8,       # 识别阶段每批文本行数
+}
+
+# PDF 处理配置
+PDF_CONFIG = {
+    # 按页选择渲染缩放 (pdf_render.py): 目标 DPI，超出单页像素预算的页面 (A0 图纸等) 降低缩放
+    'dpi': int(os.environ.get('OCR_PDF_DPI', '144')),   # 144 DPI = 2x 缩放
+    'max_page_pixels': int(float(os.environ.get('OCR_PDF_MAX_PAGE_MP', '12')) * 1_000_000),
+    # 单个请求同时持有的渲染缓冲上限 (超出时拆小批次，0 = 不限)
+    'max_render_bytes': int(os.environ.get('OCR_PDF_MAX_RENDER_MB', '256')) * 1024 * 1024,
+    'batch_size': int(os.environ.get('OCR_PDF_BATCH_SIZE', '4')),  # 每次 predict() 的页数
+    'stream_batch_size': 1,  # 流式返回时每批页数 (1 = 每页完成即返回)
+    # 流式识别完成后写入结果缓存的最大页数: 写缓存需要保留全部页的结果，
+    # 更长的 PDF 不缓存，流式内存不随页数增长 (0 = 流式结果不写缓存)
+    'stream_cache_max_pages': int(os.environ.get('OCR_STREAM_CACHE_MAX_PAGES', '50')),
+    # 电子发票等自带文本层的页面直接提取文本，跳过渲染和 OCR
+    'text_layer': os.environ.get('OCR_PDF_TEXT_LAYER', '1') == '1',
+    'text_layer_min_chars': 20,  # 文本层少于此字符数视为扫描页，回退到 OCR
+}
+
+# 图片预处理配置 (EXIF 方向、RGB 转换、限制最长边)
+# 同时作用于上传图片和 PDF 渲染页，全部在内存中完成
+PREPROCESS_CONFIG = {
+    'enabled': os.environ.get('OCR_PREPROCESS', '1') == '1',
+    'max_side': int(os.environ.get('OCR_MAX_SIDE', '2560')),  # 最长边上限 (像素)
+}
+
+# 发票字段提取配置 (invoice_extractor.py，一次扫描提取全部字段)
+INVOICE_FIELDS = [
+    'invoice_amount',   # 价税合计 (小写)
+    'invoice_code',     # 发票代码
+    'invoice_number',   # 发票号码
+    'issue_date',       # 开票日期
+    'check_code',       # 校验码
+    'buyer_tax_id',     # 购买方纳税人识别号
+    'seller_tax_id',    # 销售方纳税人识别号
+]
+
+# 发票金额快速提取 (mode=amount) 配置
+# 先只识别页面上的若干区域 (按页面宽高比例 x0, y0, x1, y1)，找到"小写"金额即返回；
+# 全部区域都未命中时回退到整页识别；PDF 区域的渲染缩放与内存上限同 PDF_CONFIG (按区域尺寸计算)
+AMOUNT_ROI_CONFIG = {
+    'regions': [
+        (0.0, 0.55, 1.0, 0.80),  # 增值税发票 价税合计/小写 所在区域
+        (0.0, 0.35, 1.0, 1.00),  # 扩大到页面下半部分
+    ],
+    'max_pages': 2,    # PDF 只在前几页查找区域
+}
+
+# PaddleOCR 引擎进程池配置
+# size=0 时在 Flask 进程内使用单个 PaddleOCR 实例；size>0 时启动 N 个工作进程，
+# 每个进程加载独立模型，请求通过任务队列分发，可利用多核
+ENGINE_POOL_CONFIG = {
+    'size': int(os.environ.get('OCR_POOL_SIZE', '0')),
+    'cpu_threads': int(os.environ.get('OCR_POOL_CPU_THREADS', '2')),  # 每个工作进程的 CPU 线程数
+    'task_timeout': 300,  # 单个识别任务超时 (秒)
+    # 为交互式请求 (/upload, /api/ocr) 预留的工作进程数: 异步任务最多占用 size - interactive_reserve 个
+    'interactive_reserve': int(os.environ.get('OCR_POOL_INTERACTIVE_RESERVE', '1')),
+}
+
+# 模型预加载与预热配置
+# eager=True 时启动即在后台加载模型并运行合成图片预热，/readyz 在完成前返回 503
+WARMUP_CONFIG = {
+    'eager': os.environ.get('OCR_EAGER_LOAD', '0') == '1',
+    'warmup_runs': int(os.environ.get('OCR_WARMUP_RUNS', '1')),  # 预热推理次数 (0 = 只加载不预热)
+    'timeout': 600,  # 等待引擎池全部就绪的最长时间 (秒)
+}
+
+# 跨请求动态微批配置 (单张图片请求)
+# 在 max_wait_ms 窗口内收集最多 max_batch_size 个并发请求，合并为一次批量推理
+BATCHER_CONFIG = {
+    'enabled': os.environ.get('OCR_BATCHING', '0') == '1',
+    'max_batch_size': int(os.environ.get('OCR_BATCH_MAX_SIZE', '8')),
+    'max_wait_ms': float(os.environ.get('OCR_BATCH_MAX_WAIT_MS', '10')),
+}
+
+# 异步任务队列配置 (/api/jobs)
+# 后台工作线程数固定，批量大文件不会占满交互式请求的处理能力
+JOB_CONFIG = {
+    'workers': int(os.environ.get('OCR_JOB_WORKERS', '2')),
+    'max_queue': int(os.environ.get('OCR_JOB_MAX_QUEUE', '100')),  # 最多排队任务数
+    'max_finished': 1000,  # 最多保留的已完成任务 (结果可查询)
+}
+
+# 请求采样分析 (/admin/profiles)
+# 按比例随机抽样，或请求头 X-Profile 携带密钥时强制分析该请求；下载分析结果同样需要密钥
+PROFILER_CONFIG = {
+    'sample_rate': float(os.environ.get('OCR_PROFILE_SAMPLE_RATE', '0')),  # 0 ~ 1
+    'secret': os.environ.get('OCR_PROFILE_SECRET', ''),  # 为空时禁用请求头触发和下载
+    'mode': os.environ.get('OCR_PROFILE_MODE', 'cprofile'),  # cprofile / stack
+    'interval_ms': 5,     # stack 模式采样间隔
+    'max_profiles': 50,   # 环形缓冲区保留的分析结果数
 }
 
 # Flask configuration
@@ -43,11 +141,95 @@ os.makedirs(RESULT_FOLDER, exist_ok=True)
 # OCR.space API 配置
 OCRSPACE_CONFIG = {
     'api_key': os.environ.get('OCRSPACE_API_KEY') or 'K87544821288957',
-    'endpoint': 'https://api.ocr.space/parse/image',
+    # 可指向本地模拟服务 (python -m benchmarks.ocrspace_stub) 做压测
+    'endpoint': os.environ.get('OCRSPACE_ENDPOINT') or 'https://api.ocr.space/parse/image',
     'language': 'chs',  # 简体中文
     'engine': '2',      # OCR Engine 2
 }
 
+# OCR.space 客户端: 连接池、并发上限、限速与重试 (不影响识别结果，不参与缓存键)
+OCRSPACE_CLIENT_CONFIG = {
+    'timeout': float(os.environ.get('OCRSPACE_TIMEOUT', '60')),                # 单次请求超时 (秒)
+    'max_concurrency': int(os.environ.get('OCRSPACE_MAX_CONCURRENCY', '4')),   # 同时进行的请求数 (= 连接池大小)
+    'rate_per_minute': float(os.environ.get('OCRSPACE_RATE_PER_MINUTE', '60')),  # 套餐每分钟请求配额 (0 = 不限速)
+    'burst': int(os.environ.get('OCRSPACE_BURST', '4')),                       # 允许的瞬时突发请求数
+    'max_retries': int(os.environ.get('OCRSPACE_MAX_RETRIES', '3')),           # 429 / 5xx / 网络错误的最多重试次数
+    'backoff_base': 0.5,   # 指数退避基数 (秒)
+    'backoff_max': 10.0,   # 单次退避上限 (秒)
+}
+
+# OCR.space 大 PDF 分块: 按页拆成小 PDF 并发上传，按页序重组，只重试失败的块
+OCRSPACE_CHUNK_CONFIG = {
+    'enabled': os.environ.get('OCRSPACE_PDF_CHUNKING', '1') == '1',
+    'pages_per_chunk': int(os.environ.get('OCRSPACE_PAGES_PER_CHUNK', '2')),
+    'min_pages': int(os.environ.get('OCRSPACE_CHUNK_MIN_PAGES', '3')),  # 少于该页数时整份上传
+    'max_parallel': int(os.environ.get('OCRSPACE_CHUNK_PARALLEL', '4')),  # 单个文件同时上传的块数
+    'chunk_retries': 1,  # 失败块的额外重试轮数 (客户端自身的 HTTP 重试之外)
+}
+
+# ==================== 自动路由配置 (ocr_service=auto) ====================
+
+# 按最近每页耗时和排队深度在本地 PaddleOCR 与 OCR.space 之间选择更快的引擎
+ROUTER_CONFIG = {
+    'window': 100,  # 每个引擎保留的最近耗时样本数
+    # 无样本时的每页耗时估计 (毫秒)
+    'prior_ms_per_page': {'local': 1500, 'ocrspace': 3000},
+    # 对冲: 首选引擎超过 p95 预计耗时未返回时同时请求另一个引擎，取先返回的结果
+    'hedge': os.environ.get('OCR_ROUTER_HEDGE', '0') == '1',
+    'hedge_min_ms': float(os.environ.get('OCR_ROUTER_HEDGE_MIN_MS', '500')),
+    'failure_cooldown': 30,  # 引擎失败后降为备选的时长 (秒)
+}
+
+# ==================== OCR 结果缓存配置 ====================
+
+# 相同文件 + 相同引擎/配置 直接返回缓存结果，不再调用 PaddleOCR 或 OCR.space
+CACHE_CONFIG = {
+    'enabled': os.environ.get('OCR_CACHE_ENABLED', '1') == '1',
+    'memory_entries': 256,                  # 内存 LRU 最大条目数
+    'disk_max_bytes': 256 * 1024 * 1024,    # 磁盘缓存总大小上限 (0 表示仅内存)
+}
+
+# ==================== 服务与准入控制 ====================
+
+# 识别请求 (/upload、/api/ocr) 的并发与排队上限，超出时返回 429 + Retry-After
+# 默认只在 asgi.py 部署时开启 (python app.py / waitress 需设置 OCR_ADMISSION=1)
+ADMISSION_CONFIG = {
+    'enabled': os.environ.get('OCR_ADMISSION', '0') == '1',
+    'max_in_flight': int(os.environ.get('OCR_MAX_IN_FLIGHT', '4')),   # 同时处理的识别请求数
+    'max_queue': int(os.environ.get('OCR_MAX_QUEUE', '16')),          # 排队等待的请求数上限
+    'queue_timeout': float(os.environ.get('OCR_QUEUE_TIMEOUT', '30')),  # 最长排队秒数
+    'endpoints': ('upload_file', 'api_ocr'),
+}
+
+# 识别请求截止时间: 请求参数 timeout (秒) / deadline (Unix 时间戳)，到期后返回已完成的页 (truncated)
+DEADLINE_CONFIG = {
+    'default_timeout': float(os.environ.get('OCR_REQUEST_TIMEOUT', '0')),    # 未携带参数时的默认值 (0 = 不限时)
+    'max_timeout': float(os.environ.get('OCR_MAX_REQUEST_TIMEOUT', '600')),  # 客户端参数的上限 (0 = 不限)
+}
+
+# ASGI 服务 (asgi.py): 线程池 = max_in_flight + max_queue + light_workers
+SERVER_CONFIG = {
+    'host': os.environ.get('OCR_HOST', '0.0.0.0'),
+    'port': int(os.environ.get('OCR_PORT', '5000')),
+    'backlog': int(os.environ.get('OCR_BACKLOG', '256')),   # 监听队列长度
+    'light_workers': 8,    # 健康检查、指标、下载等轻量请求的预留线程
+}
+
+# /api/ocr 响应压缩 (客户端 Accept-Encoding 支持 br / gzip 时; br 需安装 brotli)
+RESPONSE_CONFIG = {
+    'compression': os.environ.get('OCR_RESPONSE_COMPRESSION', '1') == '1',
+    'compress_min_bytes': 1024,   # 小于此大小的响应不压缩
+    'gzip_level': 5,
+    'brotli_quality': 4,
+}
+
+# 识别结果存储 (results/，供 /download 和 /api/extract 使用)
+RESULT_STORE_CONFIG = {
+    'compression': os.environ.get('OCR_RESULT_COMPRESSION', 'gzip'),  # none / gzip / zstd (需安装 zstandard)
+    'ttl_days': float(os.environ.get('OCR_RESULT_TTL_DAYS', '30')),    # 保留天数 (0 表示不按时间清理)
+    'max_bytes': int(os.environ.get('OCR_RESULT_MAX_MB', '1024')) * 1024 * 1024,  # 总大小上限 (0 表示不限)
+}
+
 # 可用的 OCR 服务列表
 OCR_SERVICES = {
     'local': {
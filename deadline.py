@@ -0,0 +1,83 @@
+"""
+请求截止时间
+============
+
+/upload、/api/ocr 可携带 timeout (秒) 或 deadline (Unix 时间戳) 参数:
+    - PDF 逐页识别在每批页面之间检查，到期后停止并返回已完成的页 (truncated)
+    - OCR.space 请求的超时、限速等待和重试退避不超过剩余时间
+    - 客户端断开 (ASGI 部署时 environ['ocr.disconnected']) 视为立即到期
+    - 对冲请求中落选的引擎 (另一引擎已返回) 同样立即到期
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# 等待并发任务时检查客户端是否断开的间隔 (秒)
+POLL_SECONDS = 0.5
+
+
+class Deadline:
+    """
+    单个请求的截止时间 (线程安全，只读)
+
+    参数:
+        timeout: 从 start 起的秒数，None 表示不限时 (只响应取消)
+        start: time.perf_counter() 时刻，默认当前时刻 (传入请求开始时刻时排队时间也计入)
+        cancelled: 可选 threading.Event，被设置时视为已到期 (客户端断开)
+        superseded: 可选 threading.Event，被设置时视为已到期 (结果已不再需要，如对冲中另一引擎已返回)
+    """
+
+    __slots__ = ('at', 'cancelled', 'superseded')
+
+    def __init__(self, timeout=None, start=None, cancelled=None, superseded=None):
+        if start is None:
+            start = time.perf_counter()
+        self.at = None if timeout is None else start + timeout
+        self.cancelled = cancelled
+        self.superseded = superseded
+
+    def superseded_by(self, event):
+        """返回同一截止时间、另外在 event 被设置时也视为到期的 Deadline"""
+        deadline = Deadline(cancelled=self.cancelled, superseded=event)
+        deadline.at = self.at
+        return deadline
+
+    def remaining(self):
+        """剩余秒数 (已到期返回 0)；不限时且未被取消时返回 None"""
+        if self.reason in ('disconnected', 'superseded'):
+            return 0.0
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time.perf_counter())
+
+    def expired(self):
+        return self.remaining() == 0.0
+
+    @property
+    def reason(self):
+        """到期原因: disconnected / superseded / timeout，未到期时为 None"""
+        if self.cancelled is not None and self.cancelled.is_set():
+            return 'disconnected'
+        if self.superseded is not None and self.superseded.is_set():
+            return 'superseded'
+        if self.at is not None and time.perf_counter() >= self.at:
+            return 'timeout'
+        return None
+
+
+def as_completed_until(futures, deadline, poll=POLL_SECONDS):
+    """
+    与 concurrent.futures.as_completed 相同，但截止时间到期 (或客户端断开) 时
+    不再等待剩余任务，直接结束迭代
+
+    deadline 为 None 时等待全部任务完成。
+    """
+    pending = set(futures)
+    while pending:
+        timeout = None
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining == 0.0:
+                return
+            timeout = poll if remaining is None else min(remaining, poll)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        yield from done
@@ -0,0 +1,391 @@
+"""
+PaddleOCR 引擎进程池
+====================
+
+启动 N 个工作进程，每个进程持有独立加载的 PaddleOCR 模型，
+父进程把识别请求逐个分发给空闲的工作进程，实现多核并行。
+每个工作进程有自己的任务队列和结果管道，终止一个进程不会影响其他进程的通信
+(共享队列在写入中途被终止的进程可能损坏或永久持有锁)。
+
+- 每个工作进程的 CPU 线程数可配置
+- 分发时即记录任务所在的工作进程:
+  工作进程崩溃时立即让其任务返回错误，随后自动重启
+- 任务超时后返回错误，并终止、重启执行该任务的工作进程 (不再继续占用名额)
+- 后台任务 (异步任务队列) 走低优先级通道: 交互式任务优先分发，
+  且后台任务最多占用 size - interactive_reserve 个工作进程
+- health() 返回各工作进程状态
+"""
+import os
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait as wait_connections
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class EnginePoolError(Exception):
+    """引擎池任务失败 (工作进程报错或崩溃)"""
+
+
+def _worker_main(worker_id, task_queue, results, ocr_config, cpu_threads, warmup_runs):
+    """工作进程入口: 加载模型 (并预热) 后循环处理任务"""
+    from ocr_engine import create_ocr_engine, parse_ocr_result, warmup_engine
+
+    try:
+        start = time.perf_counter()
+        ocr = create_ocr_engine(ocr_config, cpu_threads=cpu_threads)
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        if warmup_runs:
+            warmup_engine(ocr, warmup_runs)
+        warmup_seconds = time.perf_counter() - start
+        results.send(('ready', worker_id, os.getpid(), load_seconds, warmup_seconds))
+    except Exception as e:
+        results.send(('failed', worker_id, os.getpid(), str(e)))
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, images = task
+        try:
+            result = ocr.predict(list(images))
+            result = list(result) if result is not None else []
+            if len(result) != len(images):
+                raise Exception(f"OCR engine returned {len(result)} results for {len(images)} images")
+            texts = [parse_ocr_result(item) for item in result]
+            results.send(('done', worker_id, task_id, texts))
+        except Exception as e:
+            results.send(('error', worker_id, task_id, str(e)))
+
+
+class _WorkerState:
+    """父进程中记录的工作进程状态"""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.task_queue = None
+        self.results = None  # 结果管道的父进程端 (multiprocessing.connection.Connection)
+        self.pid = None
+        self.started_at = 0.0
+        self.ready = False
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.current_task = None
+        self.background = False  # current_task 是否为后台任务
+        self.tasks_done = 0
+        self.tasks_failed = 0
+        self.restarts = 0
+        self.last_error = None
+
+
+class EnginePool:
+    """PaddleOCR 多进程引擎池"""
+
+    # 工作进程两次启动之间的最小间隔 (秒)，避免模型加载失败时反复重启
+    RESTART_INTERVAL = 5
+
+    def __init__(self, size, ocr_config, cpu_threads=None, task_timeout=300, warmup_runs=0,
+                 interactive_reserve=0):
+        self.size = max(1, size)
+        # 至少留一个工作进程给后台任务，否则后台任务永远无法执行
+        self.background_limit = max(1, self.size - max(0, interactive_reserve))
+        self.ocr_config = dict(ocr_config)
+        self.cpu_threads = cpu_threads
+        self.task_timeout = task_timeout
+        self.warmup_runs = warmup_runs
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._retired = []  # 已被替换的结果管道，由收集线程关闭
+        self._lock = threading.Lock()
+        self._ready_changed = threading.Condition(self._lock)
+        self._pending = {}  # task_id -> Future
+        self._queued = deque()  # 等待空闲工作进程的交互式任务 (task_id, images)
+        self._background = deque()  # 等待空闲工作进程的后台任务 (task_id, images)
+        self._task_ids = itertools.count(1)
+        self._workers = [_WorkerState(i) for i in range(self.size)]
+        self._running = False
+
+    def start(self):
+        """启动工作进程及后台收集/监控线程"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for state in self._workers:
+                self._spawn(state)
+
+        threading.Thread(target=self._collect_results, name='engine-pool-collector', daemon=True).start()
+        threading.Thread(target=self._monitor_workers, name='engine-pool-monitor', daemon=True).start()
+        logger.info(f"Engine pool started: {self.size} workers, cpu_threads={self.cpu_threads}")
+
+    def submit(self, images, background=False):
+        """
+        提交一批图片 (路径或 ndarray)，返回 Future，结果为每张图片的文本行列表
+
+        background=True 时进入低优先级通道 (只在没有排队的交互式任务时分发，且不占用预留的工作进程)
+        """
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending[task_id] = future
+            (self._background if background else self._queued).append((task_id, list(images)))
+            self._dispatch()
+        future.task_id = task_id
+        return future
+
+    def predict(self, images, background=False):
+        """同步识别一批图片，返回每张图片的文本行列表"""
+        future = self.submit(images, background=background)
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            self._cancel(future.task_id)
+            raise EnginePoolError(f"OCR task timed out after {self.task_timeout}s")
+
+    def wait_ready(self, timeout=None):
+        """等待所有工作进程加载完成，返回是否全部就绪"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._ready_changed:
+            while not all(s.ready for s in self._workers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._ready_changed.wait(timeout=remaining if remaining is not None else 1)
+            return True
+
+    def health(self):
+        """返回引擎池健康状态"""
+        with self._lock:
+            workers = [{
+                'worker_id': s.worker_id,
+                'pid': s.pid,
+                'alive': bool(s.process and s.process.is_alive()),
+                'ready': s.ready,
+                'busy': s.current_task is not None,
+                'background': s.current_task is not None and s.background,
+                'load_seconds': round(s.load_seconds, 2) if s.load_seconds is not None else None,
+                'warmup_seconds': round(s.warmup_seconds, 2) if s.warmup_seconds is not None else None,
+                'tasks_done': s.tasks_done,
+                'tasks_failed': s.tasks_failed,
+                'restarts': s.restarts,
+                'last_error': s.last_error,
+            } for s in self._workers]
+            pending = len(self._pending)
+            queued = len(self._queued)
+            queued_background = len(self._background)
+        ready = sum(1 for w in workers if w['alive'] and w['ready'])
+        busy = sum(1 for w in workers if w['busy'])
+        background = sum(1 for w in workers if w['background'])
+        return {
+            'healthy': ready > 0,
+            'size': self.size,
+            'ready_workers': ready,
+            'busy_workers': busy,
+            'pending_tasks': pending,
+            'queued_tasks': queued + queued_background,
+            'background_workers': background,
+            'background_limit': self.background_limit,
+            'queued_background_tasks': queued_background,
+            'cpu_threads': self.cpu_threads,
+            'workers': workers,
+        }
+
+    def shutdown(self):
+        """停止所有工作进程"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            workers = list(self._workers)
+            queued = [self._pending.pop(task_id, None)
+                      for task_id, _ in itertools.chain(self._queued, self._background)]
+            self._queued.clear()
+            self._background.clear()
+        for future in queued:
+            if future is not None and not future.done():
+                future.set_exception(EnginePoolError("Engine pool is shutting down"))
+        for state in workers:
+            state.task_queue.put(None)
+        for state in workers:
+            if state.process is not None:
+                state.process.join(timeout=5)
+                if state.process.is_alive():
+                    state.process.terminate()
+        logger.info("Engine pool stopped")
+
+    # ---------- 内部方法 ----------
+
+    def _spawn(self, state):
+        """启动 (或重启) 一个工作进程 (调用方需持有锁)"""
+        # 每次启动使用新的任务队列和结果管道: 被终止的进程可能留下损坏的队列、
+        # 写了一半的消息或未取走的任务，随旧进程一起丢弃
+        if state.results is not None:
+            self._retired.append(state.results)
+        state.task_queue = self._ctx.Queue()
+        state.results, child_results = self._ctx.Pipe(duplex=False)
+        state.process = self._ctx.Process(
+            target=_worker_main,
+            args=(state.worker_id, state.task_queue, child_results,
+                  self.ocr_config, self.cpu_threads, self.warmup_runs),
+            name=f'ocr-worker-{state.worker_id}',
+            daemon=True
+        )
+        state.process.start()
+        # 父进程不持有写端，工作进程退出后读端收到 EOF
+        child_results.close()
+        state.started_at = time.monotonic()
+        state.pid = state.process.pid
+        state.ready = False
+        state.current_task = None
+
+    def _dispatch(self):
+        """
+        把排队的任务分发给空闲的就绪工作进程，并记录任务所在进程 (调用方需持有锁)
+
+        交互式任务优先；后台任务只在没有排队的交互式任务、且进行中的后台任务
+        少于 background_limit 时分发。
+        """
+        if not self._running:
+            return
+        background = sum(1 for s in self._workers if s.current_task is not None and s.background)
+        for state in self._workers:
+            if not self._queued and not (self._background and background < self.background_limit):
+                return
+            if not state.ready or state.current_task is not None:
+                continue
+            if state.process is None or not state.process.is_alive():
+                continue
+            if self._queued:
+                task_id, images = self._queued.popleft()
+                state.background = False
+            else:
+                task_id, images = self._background.popleft()
+                state.background = True
+                background += 1
+            state.current_task = task_id
+            state.task_queue.put((task_id, images))
+
+    def _cancel(self, task_id):
+        """
+        放弃一个任务 (超时): 仍在排队则移出队列；
+        已分发则终止执行它的工作进程并重启，让名额回到池中
+        """
+        stopped = None
+        with self._lock:
+            self._pending.pop(task_id, None)
+            for queued in (self._queued, self._background):
+                for i, (queued_id, _) in enumerate(queued):
+                    if queued_id == task_id:
+                        del queued[i]
+                        return
+            for state in self._workers:
+                if state.current_task != task_id:
+                    continue
+                logger.error(f"OCR worker {state.worker_id} (pid {state.pid}) timed out "
+                             f"on task {task_id}, restarting")
+                stopped = state.process
+                stopped.terminate()
+                state.last_error = f"task timed out after {self.task_timeout}s"
+                state.tasks_failed += 1
+                state.restarts += 1
+                self._spawn(state)
+                break
+        if stopped is not None:
+            stopped.join(timeout=5)
+
+    def _collect_results(self):
+        """后台线程: 接收各工作进程结果管道中的消息并完成对应 Future"""
+        while self._running:
+            with self._lock:
+                retired, self._retired = self._retired, []
+                connections = {s.results: s for s in self._workers if s.results is not None}
+            for connection in retired:
+                connection.close()
+            for connection in wait_connections(list(connections), timeout=1):
+                state = connections[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # 工作进程已退出 (由监控线程重启)，不再监听这个管道
+                    with self._lock:
+                        if state.results is connection:
+                            state.results = None
+                    connection.close()
+                    continue
+                self._handle_message(state, connection, message)
+
+    def _handle_message(self, state, connection, message):
+        """处理一条工作进程消息 (来自已被替换的管道的迟到消息直接丢弃)"""
+        kind, worker_id = message[0], message[1]
+        future = None
+        with self._lock:
+            if state.results is not connection:
+                return
+            if kind == 'ready':
+                state.ready = True
+                state.load_seconds = message[3]
+                state.warmup_seconds = message[4]
+                self._ready_changed.notify_all()
+                logger.info(f"OCR worker {worker_id} (pid {message[2]}) ready: "
+                            f"load {message[3]:.1f}s, warmup {message[4]:.1f}s")
+                self._dispatch()
+            elif kind == 'failed':
+                state.last_error = message[3]
+                logger.error(f"OCR worker {worker_id} failed to load model: {message[3]}")
+            elif kind in ('done', 'error') and state.current_task == message[2]:
+                task_id = message[2]
+                state.current_task = None
+                future = self._pending.pop(task_id, None)
+                if kind == 'done':
+                    state.tasks_done += 1
+                else:
+                    state.tasks_failed += 1
+                    state.last_error = message[3]
+                self._dispatch()
+
+        if future is not None and not future.done():
+            if kind == 'done':
+                future.set_result(message[3])
+            else:
+                future.set_exception(EnginePoolError(message[3]))
+
+    def _monitor_workers(self):
+        """后台线程: 检测崩溃的工作进程并重启"""
+        while self._running:
+            time.sleep(1)
+            failed = []
+            with self._lock:
+                if not self._running:
+                    break
+                for state in self._workers:
+                    if state.process is None or state.process.is_alive():
+                        continue
+                    exitcode = state.process.exitcode
+                    state.ready = False
+                    # 进程中的任务立即返回错误，不等到重启或任务超时
+                    if state.current_task is not None:
+                        future = self._pending.pop(state.current_task, None)
+                        if future is not None:
+                            failed.append(future)
+                        state.current_task = None
+                        state.tasks_failed += 1
+                        state.last_error = f"worker exited with code {exitcode}"
+                    if time.monotonic() - state.started_at < self.RESTART_INTERVAL:
+                        continue
+                    logger.error(f"OCR worker {state.worker_id} (pid {state.pid}) exited "
+                                 f"with code {exitcode}, restarting")
+                    state.last_error = f"worker exited with code {exitcode}"
+                    state.restarts += 1
+                    self._spawn(state)
+
+            for future in failed:
+                if not future.done():
+                    future.set_exception(EnginePoolError("OCR worker crashed while processing the request"))
@@ -0,0 +1,316 @@
+"""
+发票多字段提取引擎
+==================
+
+规则在导入时预编译，一次扫描 OCR 识别行即可提取全部配置字段:
+    invoice_amount  价税合计 (小写)
+    invoice_code    发票代码
+    invoice_number  发票号码
+    issue_date      开票日期 (YYYY-MM-DD)
+    check_code      校验码
+    buyer_tax_id    购买方纳税人识别号
+    seller_tax_id   销售方纳税人识别号
+
+每条规则命中时产生带分数的候选，同一字段取 (分数, 行号) 最大的候选，
+即高分规则优先、同分时取位置最靠后的。
+
+命令行批量提取已保存的识别结果 (输出 JSONL):
+    python invoice_extractor.py <结果 id> ... [--processes 4]     # 应用保存的结果 (download_file)
+    python invoice_extractor.py exported/*.txt                    # 纯文本结果文件 (每行一条)
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from collections import namedtuple
+
+# 候选: 字段名, 值, 分数, 行号
+Candidate = namedtuple('Candidate', ['field', 'value', 'score', 'line'])
+
+# 金额分数: "小写"相关匹配优先于独立大金额行
+AMOUNT_XIAOXIE_SCORE = 100
+AMOUNT_FALLBACK_SCORE = 10
+
+ALL_FIELDS = ('invoice_amount', 'invoice_code', 'invoice_number', 'issue_date',
+              'check_code', 'buyer_tax_id', 'seller_tax_id')
+
+# 未识别到时的默认值
+DEFAULTS = {'invoice_amount': '0'}
+
+
+def _parse_amount(minimum):
+    def parse(match):
+        amount = match.group(1).replace(',', '')
+        try:
+            if float(amount) >= minimum:
+                return amount
+        except ValueError:
+            pass
+        return None
+    return parse
+
+
+def _parse_group(match):
+    return match.group(1)
+
+
+def _parse_digits(match):
+    return re.sub(r'\s', '', match.group(1))
+
+
+def _parse_date(match):
+    year, month, day = match.group(1), int(match.group(2)), int(match.group(3))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+class _Rule:
+    """
+    单条提取规则
+
+    参数:
+        field: 字段名 ('tax_id' 为多值字段，后处理为购买方/销售方)
+        keyword: 行内必须包含的关键字 (用 in 预筛，不包含时跳过正则)
+        pattern: 同一行内匹配的正则 (search)
+        line_pattern: 整行匹配的正则 (match，作用于去除首尾空白的行)
+        labels: 整行等于其中之一时，检查下一行是否匹配 next_pattern
+        next_pattern: 标签行的下一行需要匹配的正则
+        parse: 从 match 提取值的函数，返回 None 表示丢弃
+        score: 候选分数
+    """
+
+    def __init__(self, field, score, parse=_parse_group, keyword=None, pattern=None,
+                 line_pattern=None, labels=None, next_pattern=None):
+        self.field = field
+        self.score = score
+        self.parse = parse
+        self.keyword = keyword
+        self.pattern = re.compile(pattern) if pattern else None
+        self.line_pattern = re.compile(line_pattern) if line_pattern else None
+        self.labels = frozenset(labels) if labels else None
+        self.next_pattern = re.compile(next_pattern) if next_pattern else None
+
+
+# 规则顺序即同一行内候选的产生顺序 (同分同行时先产生的优先)
+RULES = (
+    # 金额 模式1: (小写)￥xxx.xx 或 (小写）￥xxx.xx
+    _Rule('invoice_amount', AMOUNT_XIAOXIE_SCORE, _parse_amount(100), keyword='小写',
+          pattern=r'[（\(]小写[）\)]\s*[￥¥]?\s*([\d,]+\.?\d*)'),
+    # 金额 模式2: 小写 xxx.xx (同一行，不带括号)
+    _Rule('invoice_amount', AMOUNT_XIAOXIE_SCORE, _parse_amount(100), keyword='小写',
+          pattern=r'小写\s+(\d[\d,]*\.?\d*)'),
+    # 金额 模式3: 当前行是"小写"，下一行是金额
+    _Rule('invoice_amount', AMOUNT_XIAOXIE_SCORE, _parse_amount(100), keyword='小写',
+          labels=('小写', '(小写)', '（小写）'), next_pattern=r'^(\d[\d,]*\.\d{2})$'),
+    # 金额 模式4: 独立的大金额行 (> 10000) - 备用
+    _Rule('invoice_amount', AMOUNT_FALLBACK_SCORE, _parse_amount(10000),
+          line_pattern=r'^(\d{5,}\.?\d*)$'),
+
+    _Rule('invoice_code', 100, keyword='发票代码',
+          pattern=r'发票代码\s*[:：]?\s*(\d{10,12})(?!\d)'),
+    _Rule('invoice_code', 80, keyword='发票代码',
+          labels=('发票代码', '发票代码:', '发票代码：'), next_pattern=r'^(\d{10,12})$'),
+
+    _Rule('invoice_number', 100, keyword='发票号码',
+          pattern=r'发票号码\s*[:：]?\s*(\d{8,20})(?!\d)'),
+    _Rule('invoice_number', 80, keyword='发票号码',
+          labels=('发票号码', '发票号码:', '发票号码：'), next_pattern=r'^(\d{8,20})$'),
+
+    _Rule('issue_date', 100, _parse_date, keyword='开票日期',
+          pattern=r'开票日期\s*[:：]?\s*(\d{4})\s*[年\-/.]\s*(\d{1,2})\s*[月\-/.]\s*(\d{1,2})'),
+    _Rule('issue_date', 80, _parse_date, keyword='开票日期',
+          labels=('开票日期', '开票日期:', '开票日期：'),
+          next_pattern=r'^(\d{4})\s*[年\-/.]\s*(\d{1,2})\s*[月\-/.]\s*(\d{1,2})'),
+
+    _Rule('check_code', 100, _parse_digits, keyword='校验码',
+          pattern=r'校验码\s*[:：]?\s*(\d[\d\s]{18,}\d)'),
+
+    _Rule('tax_id', 100, keyword='识别号',
+          pattern=r'识别号\s*[:：]?\s*([0-9A-Z]{15,20})(?![0-9A-Z])'),
+    _Rule('tax_id', 100, keyword='信用代码',
+          pattern=r'信用代码\s*[:：]?\s*([0-9A-Z]{15,20})(?![0-9A-Z])'),
+    _Rule('tax_id', 80, keyword='识别号',
+          labels=('纳税人识别号', '纳税人识别号:', '纳税人识别号：'), next_pattern=r'^([0-9A-Z]{15,20})$'),
+)
+
+
+class InvoiceExtractor:
+    """单次扫描提取发票字段"""
+
+    def __init__(self, fields=None, rules=RULES):
+        self.fields = tuple(fields) if fields else ALL_FIELDS
+        wanted = set(self.fields)
+        if wanted & {'buyer_tax_id', 'seller_tax_id'}:
+            wanted.add('tax_id')
+        self.rules = tuple(rule for rule in rules if rule.field in wanted)
+
+        # 按关键字分组，同一关键字只做一次 in 判断
+        self._keyword_groups = {}
+        self._plain_rules = []
+        for rule in self.rules:
+            if rule.keyword:
+                self._keyword_groups.setdefault(rule.keyword, []).append(rule)
+            else:
+                self._plain_rules.append(rule)
+
+    def candidates(self, texts):
+        """扫描一次识别行，按产生顺序返回全部候选"""
+        found = []
+        pending = []  # 等待下一行的 (规则, 标签行号)
+
+        for i, text in enumerate(texts):
+            stripped = text.strip()
+
+            if pending:
+                for rule, label_line in pending:
+                    match = rule.next_pattern.match(stripped)
+                    if match:
+                        self._add(found, rule, match, label_line)
+                pending = []
+
+            for keyword, rules in self._keyword_groups.items():
+                if keyword not in text:
+                    continue
+                for rule in rules:
+                    if rule.pattern is not None:
+                        match = rule.pattern.search(text)
+                        if match:
+                            self._add(found, rule, match, i)
+                    if rule.labels is not None and stripped in rule.labels:
+                        pending.append((rule, i))
+
+            for rule in self._plain_rules:
+                match = rule.line_pattern.match(stripped)
+                if match:
+                    self._add(found, rule, match, i)
+
+        return found
+
+    def best(self, texts):
+        """返回每个字段的最佳候选 {字段名: Candidate}"""
+        best = {}
+        tax_ids = []
+        for candidate in self.candidates(texts):
+            if candidate.field == 'tax_id':
+                if candidate.value not in [c.value for c in tax_ids]:
+                    tax_ids.append(candidate)
+                continue
+            current = best.get(candidate.field)
+            if current is None or (candidate.score, candidate.line) > (current.score, current.line):
+                best[candidate.field] = candidate
+
+        # 标准增值税发票上购买方信息在前，销售方在后
+        tax_ids.sort(key=lambda c: c.line)
+        for field, candidate in zip(('buyer_tax_id', 'seller_tax_id'), tax_ids):
+            best[field] = candidate._replace(field=field)
+
+        return {field: best[field] for field in self.fields if field in best}
+
+    def extract(self, texts):
+        """提取全部字段，返回 {字段名: 值}，未识别到的字段为默认值"""
+        best = self.best(texts)
+        return {
+            field: best[field].value if field in best else DEFAULTS.get(field, '')
+            for field in self.fields
+        }
+
+    def extract_batch(self, documents, processes=None, chunksize=64):
+        """
+        批量提取
+
+        参数:
+            documents: 可迭代的识别行列表
+            processes: 进程数，None 或 1 表示在当前进程中逐个处理
+        返回:
+            生成器，按输入顺序产出每个文档的字段字典
+        """
+        if not processes or processes <= 1:
+            for texts in documents:
+                yield self.extract(texts)
+            return
+
+        import multiprocessing
+        with multiprocessing.get_context('spawn').Pool(
+                processes, initializer=_init_worker, initargs=(self.fields,)) as pool:
+            yield from pool.imap(_extract_in_worker, documents, chunksize=chunksize)
+
+    @staticmethod
+    def _add(found, rule, match, line):
+        value = rule.parse(match)
+        if value is not None:
+            found.append(Candidate(rule.field, value, rule.score, line))
+
+
+# ---------- 批量处理 (多进程) ----------
+
+_worker_extractor = None
+
+
+def _init_worker(fields):
+    global _worker_extractor
+    _worker_extractor = InvoiceExtractor(fields)
+
+
+def _extract_in_worker(texts):
+    return _worker_extractor.extract(texts)
+
+
+def read_result_file(path):
+    """读取纯文本识别结果文件 (每行一条识别文本)，返回识别行列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def read_result(ref, store=None):
+    """
+    读取一个识别结果
+
+    参数:
+        ref: 结果 id (经 ResultStore 读取，支持压缩和分目录存储) 或纯文本结果文件路径
+        store: 可选 result_store.ResultStore
+    返回:
+        识别行列表，找不到时返回 None
+    """
+    if store is not None:
+        lines = store.read_lines(ref)
+        if lines is not None:
+            return lines
+    if os.path.isfile(ref):
+        return read_result_file(ref)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量提取已保存识别结果中的发票字段 (输出 JSONL)')
+    parser.add_argument('files', nargs='+', help='结果 id (download_file)，或纯文本结果文件 (每行一条识别文本)')
+    parser.add_argument('--results-dir', help='结果存储目录 (默认 config.RESULT_FOLDER)')
+    parser.add_argument('--processes', type=int, default=1, help='并行进程数')
+    parser.add_argument('--fields', help='逗号分隔的字段列表 (默认全部)')
+    args = parser.parse_args()
+
+    from config import RESULT_FOLDER, RESULT_STORE_CONFIG
+    from result_store import ResultStore
+    store = ResultStore(
+        args.results_dir or RESULT_FOLDER,
+        max_bytes=RESULT_STORE_CONFIG['max_bytes'],
+        ttl_seconds=RESULT_STORE_CONFIG['ttl_days'] * 86400,
+        compression=RESULT_STORE_CONFIG['compression']
+    )
+    try:
+        documents = [(ref, read_result(ref, store)) for ref in args.files]
+    finally:
+        store.close()
+
+    extractor = InvoiceExtractor(args.fields.split(',') if args.fields else None)
+    found = [(ref, lines) for ref, lines in documents if lines is not None]
+    results = dict(zip((ref for ref, _ in found),
+                       extractor.extract_batch((lines for _, lines in found), processes=args.processes)))
+    for ref, lines in documents:
+        record = {'file': ref, **results[ref]} if lines is not None else {'file': ref, 'error': '结果不存在'}
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+异步 OCR 任务队列
+=================
+
+大文件通过 POST /api/jobs 提交后立即返回任务 ID，
+由后台线程池按优先级处理，客户端轮询状态、进度并获取结果。
+
+- 优先级: high / normal / low (同优先级先进先出)
+- 排队任务数有上限，队列满时拒绝提交
+- 后台工作线程数固定；启用引擎池时任务的识别走低优先级通道，
+  不占用为交互式请求 (/upload, /api/ocr) 预留的工作进程 (见 EnginePool)
+"""
+import time
+import uuid
+import queue
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class JobQueueFull(Exception):
+    """排队任务数已达上限"""
+
+
+class Job:
+    """单个异步 OCR 任务"""
+
+    def __init__(self, payload, priority='normal'):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.priority = priority
+        self.status = 'queued'  # queued / running / done / failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.pages_done = 0
+        self.pages_total = None
+        self.result = None
+        self.error = None
+
+    def update_progress(self, pages_done, pages_total):
+        self.pages_done = pages_done
+        self.pages_total = pages_total
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': {
+                'pages_done': self.pages_done,
+                'pages_total': self.pages_total,
+            },
+            'error': self.error,
+        }
+
+
+class JobManager:
+    """
+    带优先级、有界队列的后台任务执行器
+
+    参数:
+        run_fn: 任务处理函数 run_fn(job) -> 结果字典，可调用 job.update_progress() 汇报进度
+        workers: 后台工作线程数
+        max_queue: 最多排队任务数
+        max_finished: 最多保留的已完成任务数 (超出时淘汰最早完成的)
+        cleanup_fn: 任务被丢弃/完成后清理 payload 的函数 (可选)
+    """
+
+    def __init__(self, run_fn, workers=2, max_queue=100, max_finished=1000, cleanup_fn=None):
+        self.run_fn = run_fn
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.cleanup_fn = cleanup_fn
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished = OrderedDict()  # job_id -> None (按完成顺序)
+        self._queued = 0
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'ocr-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job manager started: {self.workers} workers, max queue {self.max_queue}")
+
+    def submit(self, payload, priority='normal'):
+        """提交任务，返回 Job；队列已满时抛出 JobQueueFull"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority 必须为 {', '.join(PRIORITIES)} 之一")
+
+        job = Job(payload, priority)
+        with self._lock:
+            if self._queued >= self.max_queue:
+                raise JobQueueFull(f"任务队列已满 ({self.max_queue})，请稍后重试")
+            self._jobs[job.id] = job
+            self._queued += 1
+        self._queue.put((PRIORITIES[priority], next(self._seq), job.id))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return {
+                'workers': self.workers,
+                'queued': self._queued,
+                'running': running,
+                'finished': len(self._finished),
+                'max_queue': self.max_queue,
+            }
+
+    # ---------- 内部方法 ----------
+
+    def _worker(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                self._queued -= 1
+                if job is None:
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+
+            try:
+                job.result = self.run_fn(job)
+                job.status = 'done'
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                if self.cleanup_fn is not None:
+                    try:
+                        self.cleanup_fn(job)
+                    except Exception as e:
+                        logger.warning(f"Job {job.id} cleanup failed: {str(e)}")
+                self._mark_finished(job)
+
+    def _mark_finished(self, job):
+        with self._lock:
+            self._finished[job.id] = None
+            while len(self._finished) > self.max_finished:
+                old_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_id, None)
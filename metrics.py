@@ -0,0 +1,247 @@
+"""
+Lightweight in-process metrics
+
+Histograms, labelled counters and scrape-time callbacks rendered in the
+Prometheus text exposition format, plus per-stage timers whose durations
+are also collected per request for the Server-Timing response header.
+"""
+import sys
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Cumulative bucket histogram (thread-safe)"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """Return cumulative bucket counts plus count/sum/mean"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = {}
+        running = 0
+        for bound, n in zip(self.buckets + ['+Inf'], counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {
+            'buckets': cumulative,
+            'count': count,
+            'sum': round(total, 6),
+            'mean': round(total / count, 6) if count else 0.0,
+        }
+
+
+class Counter:
+    """Monotonic counter with optional labels (thread-safe)"""
+
+    def __init__(self, labelnames=()):
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class LabeledHistogram:
+    """One Histogram per label combination"""
+
+    def __init__(self, buckets, labelnames=()):
+        self.buckets = sorted(buckets)
+        self.labelnames = tuple(labelnames)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def snapshots(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return {key: histogram.snapshot() for key, histogram in items}
+
+
+class Registry:
+    """
+    Collection of metrics rendered together for /metrics
+
+    Besides counters and histograms owned by the registry, callbacks can
+    expose values that live elsewhere (cache sizes, queue depths, histograms
+    of other components); they are evaluated at scrape time and may return
+    None to skip the metric.
+    """
+
+    def __init__(self):
+        self._families = []  # (name, help, type, labelnames, source)
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labelnames=()):
+        counter = Counter(labelnames)
+        self._add(name, help_text, 'counter', labelnames, counter)
+        return counter
+
+    def histogram(self, name, help_text, buckets, labelnames=()):
+        histogram = LabeledHistogram(buckets, labelnames)
+        self._add(name, help_text, 'histogram', labelnames, histogram)
+        return histogram
+
+    def callback(self, name, help_text, metric_type, fn, labelnames=()):
+        """
+        Register a scrape-time callback
+
+        fn returns a number (no labels) or {label values tuple: number};
+        for metric_type 'histogram' it returns Histogram.snapshot() results
+        in the same shapes.
+        """
+        self._add(name, help_text, metric_type, labelnames, fn)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            families = list(self._families)
+        lines = []
+        for name, help_text, metric_type, labelnames, source in families:
+            if callable(source):
+                try:
+                    values = source()
+                except Exception:
+                    continue
+                if values is None:
+                    continue
+            elif metric_type == 'histogram':
+                values = source.snapshots()
+            else:
+                values = source.samples()
+            if not isinstance(values, dict) or (metric_type == 'histogram' and 'buckets' in values):
+                values = {(): values}
+
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in sorted(values.items()):
+                labels = list(zip(labelnames, key))
+                if metric_type == 'histogram':
+                    for bound, count in value['buckets'].items():
+                        lines.append(f"{name}_bucket{_labels(labels + [('le', bound)])} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+                    lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _add(self, name, help_text, metric_type, labelnames, source):
+        with self._lock:
+            self._families.append((name, help_text, metric_type, tuple(labelnames), source))
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# ---------- Pipeline stage timers ----------
+
+REGISTRY = Registry()
+
+STAGE_SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'ocr_stage_duration_seconds', 'Time spent in each OCR pipeline stage',
+    STAGE_SECONDS_BUCKETS, ['stage'])
+
+# Stage durations of the current request (None outside a request)
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into STAGE_SECONDS and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def begin_request_timings():
+    """Start collecting stage timings for the current request; returns the list"""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings, total=None):
+    """Format stage timings as a Server-Timing header value (durations summed per stage, ms)"""
+    durations = {}
+    for name, elapsed in timings:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in durations.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
+
+
+# ---------- Process ----------
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process in bytes, or None when unavailable
+    
+    Uses resource.getrusage (Linux / macOS); on Windows falls back to psutil's
+    peak working set when psutil is installed.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
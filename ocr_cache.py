@@ -0,0 +1,215 @@
+"""
+OCR 结果缓存
+============
+
+以 "上传文件内容 + OCR 引擎 + 引擎配置" 的 SHA-256 作为键，缓存识别结果。
+两级缓存:
+    1. 内存 LRU (按条目数限制)
+    2. 磁盘缓存 (按总字节数限制，超出时淘汰最久未使用的条目)
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class OCRCache:
+    """内存 LRU + 磁盘两级 OCR 结果缓存 (线程安全)"""
+
+    def __init__(self, folder, memory_entries=256, disk_max_bytes=256 * 1024 * 1024, enabled=True):
+        self.folder = folder
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()    # key -> value
+        self._disk_index = OrderedDict()  # key -> 文件大小 (按最近使用排序)
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.enabled and self.disk_max_bytes > 0:
+            os.makedirs(self.folder, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(data, engine, settings):
+        """
+        计算缓存键
+
+        参数:
+            data: 上传文件的原始字节，或二进制文件对象 (分块读取)
+            engine: OCR 引擎标识 (如 'local:pdf', 'ocrspace:png')
+            settings: 影响识别结果的配置字典
+        返回:
+            十六进制 SHA-256 字符串
+        """
+        digest = hashlib.sha256()
+        digest.update(engine.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        digest.update(b'\0')
+        if hasattr(data, 'read'):
+            for chunk in iter(lambda: data.read(1024 * 1024), b''):
+                digest.update(chunk)
+        else:
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """查询缓存，未命中返回 None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return self._memory[key]
+            on_disk = key in self._disk_index
+
+        value = self._read_disk(key) if on_disk else None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+            self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        """写入缓存 (内存 + 磁盘)"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._remember(key, value)
+
+        if self.disk_max_bytes <= 0:
+            return
+
+        try:
+            payload = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Cache value not serializable, skip disk tier: {str(e)}")
+            return
+        if len(payload) > self.disk_max_bytes:
+            return
+
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Cache disk write failed: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(payload)
+            self._disk_bytes += len(payload)
+            evicted = self._evict_disk()
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """返回命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': len(self._disk_index),
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes,
+            }
+
+    # ---------- 内部方法 ----------
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        """写入内存 LRU (调用方需持有锁)"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """淘汰磁盘条目直到总大小不超限 (调用方需持有锁)，返回被淘汰的键"""
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            old_key, size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(old_key)
+        return evicted
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(f.read().decode('utf-8'))
+            os.utime(path)  # 更新 mtime，重启后仍保持 LRU 顺序
+            return value
+        except (OSError, ValueError):
+            with self._lock:
+                self._disk_bytes -= self._disk_index.pop(key, 0)
+            return None
+
+    def _load_disk_index(self):
+        """启动时扫描磁盘缓存目录，按 mtime 重建 LRU 索引"""
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                    continue
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-len('.json')], st.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+        evicted = self._evict_disk()
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+        logger.info(f"OCR cache loaded: {len(self._disk_index)} entries, {self._disk_bytes} bytes on disk")
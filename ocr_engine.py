@@ -0,0 +1,178 @@
+"""
+PaddleOCR engine helpers shared by the Flask app and the engine pool workers
+"""
+import os
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# "module:callable" building a stand-in engine instead of PaddleOCR, e.g.
+# OCR_ENGINE_FACTORY=benchmarks.fake_engine:FakeOCR for model-free benchmarks.
+# Read from the environment so engine pool workers pick it up as well.
+ENGINE_FACTORY_ENV = 'OCR_ENGINE_FACTORY'
+
+
+def engine_factory_name():
+    """Configured engine factory, or '' for PaddleOCR"""
+    return os.environ.get(ENGINE_FACTORY_ENV, '')
+
+
+def create_ocr_engine(ocr_config, cpu_threads=None):
+    """
+    Create a PaddleOCR instance (or the engine named by OCR_ENGINE_FACTORY)
+
+    cpu_threads: limit the CPU threads used by this instance (None = PaddleOCR default)
+    """
+    config = dict(ocr_config)
+    if cpu_threads:
+        # Must be set before Paddle is imported to take effect in this process
+        os.environ.setdefault('OMP_NUM_THREADS', str(cpu_threads))
+        config['cpu_threads'] = cpu_threads
+    factory = engine_factory_name()
+    if factory:
+        module_name, _, attr = factory.partition(':')
+        logger.info(f"Using OCR engine factory {factory}")
+        return getattr(importlib.import_module(module_name), attr)(**config)
+    from paddleocr import PaddleOCR
+    return PaddleOCR(**config)
+
+
+def make_warmup_image():
+    """Synthetic invoice-like BGR image used to warm up detection and recognition"""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (640, 240), 'white')
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(('INVOICE No. 20240001', 'Date 2024-01-01', 'Total 12,345.67')):
+        draw.text((20, 30 + i * 60), line, fill='black')
+    return np.asarray(img)[:, :, ::-1].copy()
+
+
+def warmup_engine(ocr, runs=1):
+    """Run synthetic inferences so the first real request does not pay one-off init costs"""
+    image = make_warmup_image()
+    for _ in range(max(1, runs)):
+        ocr.predict([image])
+
+
+class OCRLine(str):
+    """
+    A recognized text line: behaves as the plain str everywhere, and carries the
+    recognition score and the axis-aligned box [x0, y0, x1, y1] (None when unknown,
+    e.g. PDF text layer or OCR.space lines)
+    """
+    score = None
+    box = None
+
+    def __new__(cls, text, score=None, box=None):
+        line = super().__new__(cls, text)
+        if score is not None:
+            line.score = score
+        if box is not None:
+            line.box = box
+        return line
+
+    def __reduce__(self):
+        # Keep score / box when results come back from engine pool workers
+        return OCRLine, (str(self), self.score, self.box)
+
+
+def _poly_to_box(poly):
+    """Detection polygon (or [x0, y0, x1, y1]) -> [x0, y0, x1, y1]"""
+    points = poly.tolist() if hasattr(poly, 'tolist') else list(poly)
+    if points and not isinstance(points[0], (list, tuple)):
+        return [float(v) for v in points[:4]]
+    xs = [float(p[0]) for p in points]
+    ys = [float(p[1]) for p in points]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _make_lines(texts, scores=None, polys=None):
+    scores = list(scores) if scores is not None else []
+    polys = list(polys) if polys is not None else []
+    lines = []
+    for i, text in enumerate(texts):
+        score = round(float(scores[i]), 4) if i < len(scores) else None
+        box = _poly_to_box(polys[i]) if i < len(polys) else None
+        lines.append(OCRLine(text, score, box))
+    return lines
+
+
+def _result_field(result, key):
+    if isinstance(result, dict):
+        return result.get(key)
+    return getattr(result, key, None)
+
+
+def parse_ocr_result(result):
+    """
+    Extract recognized text lines from a PaddleOCR predict() result item
+
+    Lines are OCRLine strings carrying the recognition score and the box (pixels
+    of the image passed to predict()) when the result provides them.
+    """
+    texts = []
+    if result is None:
+        return texts
+    # Handle new result format
+    if hasattr(result, 'rec_texts') or (isinstance(result, dict) and 'rec_texts' in result):
+        # Direct access to recognized texts (rec_polys: detection polygons per line)
+        polys = _result_field(result, 'rec_polys')
+        if polys is None:
+            polys = _result_field(result, 'rec_boxes')
+        texts.extend(_make_lines(_result_field(result, 'rec_texts'), _result_field(result, 'rec_scores'), polys))
+    elif isinstance(result, dict):
+        # Dictionary format with 'rec_text' key
+        if 'rec_text' in result:
+            texts.append(result['rec_text'])
+    elif isinstance(result, list):
+        # Legacy format: list of [bbox, (text, score)]
+        for line in result:
+            if line and len(line) >= 2:
+                if isinstance(line[1], tuple):
+                    score = line[1][1] if len(line[1]) > 1 else None
+                    texts.append(OCRLine(line[1][0], round(float(score), 4) if score is not None else None,
+                                         _poly_to_box(line[0]) if line[0] is not None else None))
+                elif isinstance(line[1], str):
+                    texts.append(line[1])
+    return texts
+
+
+def normalize_boxes(lines, image):
+    """
+    Scale line boxes (in place) from pixels to fractions of the image passed to
+    predict(): an HxWx3 ndarray, image bytes or an image file path
+    """
+    boxed = [line for line in lines if getattr(line, 'box', None) is not None]
+    if not boxed:
+        return lines
+    shape = getattr(image, 'shape', None)
+    if shape is not None:
+        height, width = shape[0], shape[1]
+    else:
+        # Only the header is read, the image is not decoded
+        import io
+        from PIL import Image
+        with Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image) as img:
+            width, height = img.size
+    for line in boxed:
+        x0, y0, x1, y1 = line.box
+        line.box = [round(x0 / width, 4), round(y0 / height, 4), round(x1 / width, 4), round(y1 / height, 4)]
+    return lines
+
+
+def line_details(lines):
+    """[score, box] per line for caching, or None when no line carries any"""
+    if not any(getattr(line, 'score', None) is not None or getattr(line, 'box', None) is not None
+               for line in lines):
+        return None
+    return [[getattr(line, 'score', None), getattr(line, 'box', None)] for line in lines]
+
+
+def restore_lines(lines, details):
+    """Inverse of line_details(): rebuild OCRLine objects from cached text and details"""
+    if not details or len(details) != len(lines):
+        return lines
+    return [OCRLine(text, score, box) for text, (score, box) in zip(lines, details)]
@@ -0,0 +1,257 @@
+"""
+OCR.space API 客户端
+====================
+
+- 复用连接池 (requests.Session + keep-alive)
+- 限制同时进行的请求数
+- 令牌桶限速，匹配套餐的每分钟请求配额
+- 429 / 5xx / 网络错误时按指数退避 + 随机抖动重试，支持 Retry-After
+- 可选截止时间: 单次超时、限速等待和重试退避都不超过剩余时间
+- 记录请求延迟、重试次数等指标
+"""
+import time
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+LATENCY_MS_BUCKETS = [100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+RATE_WAIT_MS_BUCKETS = [1, 10, 100, 500, 1000, 5000, 30000]
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OCRSpaceError(Exception):
+    """OCR.space 请求失败 (重试后仍失败或接口返回处理错误)"""
+
+
+class OCRSpaceTimeout(OCRSpaceError):
+    """OCR.space 请求超时"""
+
+
+class TokenBucket:
+    """令牌桶限速器 (线程安全)"""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """取一个令牌，必要时等待；超时返回 False"""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class OCRSpaceClient:
+    """
+    OCR.space 客户端
+
+    参数:
+        endpoint / api_key / language / engine: 接口参数
+        timeout: 单次 HTTP 请求超时 (秒)
+        max_concurrency: 同时进行的请求数上限 (同时也是连接池大小)
+        rate_per_minute: 每分钟最多请求数 (0 表示不限速)
+        burst: 令牌桶容量 (允许的瞬时突发请求数)
+        max_retries: 最多重试次数
+        backoff_base / backoff_max: 指数退避基数与上限 (秒)
+    """
+
+    def __init__(self, endpoint, api_key, language='chs', engine='2', timeout=60,
+                 max_concurrency=4, rate_per_minute=0, burst=1, max_retries=3,
+                 backoff_base=0.5, backoff_max=10.0):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.language = language
+        self.engine = engine
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._bucket = TokenBucket(rate_per_minute / 60.0, burst)
+
+        self._lock = threading.Lock()
+        self.latency_histogram = Histogram(LATENCY_MS_BUCKETS)
+        self.rate_wait_histogram = Histogram(RATE_WAIT_MS_BUCKETS)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.status_codes = {}
+
+    def parse(self, filename, data, timeout=None, deadline=None):
+        """
+        识别一个文件
+
+        参数:
+            filename: 文件名 (OCR.space 根据扩展名判断类型)
+            data: 文件字节，或可 seek 的二进制文件对象 (每次重试从头读取)
+            timeout: 单次请求超时 (秒)，默认使用 self.timeout
+            deadline: 可选，带 remaining() 方法的截止时间 (见 deadline.Deadline)；
+                      到期后不再发起请求或重试，抛出 OCRSpaceTimeout
+        返回:
+            接口返回的 ParsedResults 列表
+        """
+        payload = {
+            'apikey': self.api_key,
+            'language': self.language,
+            'OCREngine': self.engine,
+            'isOverlayRequired': 'false',
+        }
+        timeout = timeout or self.timeout
+
+        attempt = 0
+        while True:
+            remaining = deadline.remaining() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise OCRSpaceTimeout("OCR.space API 请求已到截止时间")
+            try:
+                result = self._post(filename, data, payload,
+                                    timeout if remaining is None else min(timeout, remaining), remaining)
+            except _Retryable as e:
+                delay = self._backoff(attempt, e.retry_after)
+                remaining = deadline.remaining() if deadline is not None else None
+                # 重试次数用完，或退避结束时已过截止时间
+                if attempt >= self.max_retries or (remaining is not None and delay >= remaining):
+                    with self._lock:
+                        self.failures += 1
+                    if isinstance(e.error, requests.exceptions.Timeout):
+                        raise OCRSpaceTimeout(f"OCR.space API 请求超时 (已尝试 {attempt + 1} 次)")
+                    raise OCRSpaceError(f"OCR.space API 网络错误 (已尝试 {attempt + 1} 次): {e}")
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"OCR.space {e}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            if result.get('IsErroredOnProcessing'):
+                with self._lock:
+                    self.failures += 1
+                error_msg = result.get('ErrorMessage', ['Unknown error'])
+                raise OCRSpaceError(f"OCR.space API error: {error_msg}")
+            return result.get('ParsedResults', []) or []
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'in_flight': self.in_flight,
+                'status_codes': dict(self.status_codes),
+                'max_concurrency': self.max_concurrency,
+                'rate_per_minute': self._bucket.rate * 60,
+                'latency_ms': self.latency_histogram.snapshot(),
+                'rate_limit_wait_ms': self.rate_wait_histogram.snapshot(),
+            }
+
+    def close(self):
+        self._session.close()
+
+    # ---------- 内部方法 ----------
+
+    def _post(self, filename, data, payload, timeout, wait_timeout=None):
+        """
+        发送一次请求 (限速 + 并发控制)，可重试的失败抛出 _Retryable
+
+        wait_timeout: 等待限速令牌和并发名额的最长秒数 (None 表示一直等待)，超时抛出 OCRSpaceTimeout
+        """
+        wait_start = time.perf_counter()
+        if not self._bucket.acquire(timeout=wait_timeout):
+            raise OCRSpaceTimeout("OCR.space API 等待限速配额超过截止时间")
+        if wait_timeout is not None:
+            wait_timeout = max(0.0, wait_timeout - (time.perf_counter() - wait_start))
+        if not self._slots.acquire(timeout=wait_timeout):
+            raise OCRSpaceTimeout("OCR.space API 等待并发名额超过截止时间")
+        try:
+            self.rate_wait_histogram.observe((time.perf_counter() - wait_start) * 1000)
+            with self._lock:
+                self.requests += 1
+                self.in_flight += 1
+            if hasattr(data, 'seek'):
+                data.seek(0)
+            start = time.perf_counter()
+            try:
+                response = self._session.post(
+                    self.endpoint,
+                    files={'file': (filename, data)},
+                    data=payload,
+                    timeout=timeout
+                )
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                raise _Retryable(e)
+            finally:
+                self.latency_histogram.observe((time.perf_counter() - start) * 1000)
+                with self._lock:
+                    self.in_flight -= 1
+        finally:
+            self._slots.release()
+
+        with self._lock:
+            self.status_codes[response.status_code] = self.status_codes.get(response.status_code, 0) + 1
+
+        if response.status_code in RETRY_STATUS_CODES:
+            raise _Retryable(f"HTTP {response.status_code}", _parse_retry_after(response))
+        try:
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            raise OCRSpaceError(f"OCR.space API 网络错误: {str(e)}")
+        except ValueError:
+            raise OCRSpaceError("OCR.space API 返回了无效的 JSON")
+
+    def _backoff(self, attempt, retry_after=None):
+        """指数退避 + 全随机抖动；服务端给出 Retry-After 时不早于该时间"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+
+class _Retryable(Exception):
+    """内部使用: 可重试的失败"""
+
+    def __init__(self, error, retry_after=None):
+        super().__init__(str(error))
+        self.error = error
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(response):
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
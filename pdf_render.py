@@ -0,0 +1,148 @@
+"""
+PDF 页面渲染 (内存有界)
+=======================
+
+按页选择渲染缩放，而不是所有页面固定 2x:
+    - 以目标 DPI 为准 (144 DPI = 原来的 2x)
+    - 单页像素超过 max_pixels 或最长边超过 max_side 时等比降低缩放 (A0 图纸、海报扫描页)
+    - 同一批同时持有的像素缓冲不超过 max_bytes (单个请求的渲染内存上限):
+      批内页面总量超出时拆成更小的批，单页超出时继续降低该页缩放
+    - 只渲染页面局部区域 (region，按页面宽高比例) 时，以上预算按区域尺寸计算
+"""
+import math
+
+POINTS_PER_INCH = 72
+BYTES_PER_PIXEL = 3  # RGB, alpha=False
+
+
+def page_zoom(width, height, dpi, max_pixels=None, max_side=None, max_bytes=None):
+    """
+    计算一页的渲染缩放
+
+    参数:
+        width / height: 页面尺寸 (PDF 点，1/72 英寸)
+        dpi: 目标 DPI
+        max_pixels: 单页像素上限，None 或 0 表示不限
+        max_side: 最长边像素上限，None 或 0 表示不限
+        max_bytes: 单页像素缓冲字节上限，None 或 0 表示不限
+    返回:
+        缩放倍数 (PDF 点 -> 像素)
+    """
+    zoom = dpi / POINTS_PER_INCH
+    area = width * height
+    if area <= 0:
+        return zoom
+    if max_pixels:
+        zoom = min(zoom, math.sqrt(max_pixels / area))
+    if max_side:
+        zoom = min(zoom, max_side / max(width, height))
+    if max_bytes:
+        zoom = min(zoom, math.sqrt(max_bytes / BYTES_PER_PIXEL / area))
+    return zoom
+
+
+def region_rect(page, region):
+    """按比例区域 (x0, y0, x1, y1) 换算为页面坐标 (fitz.Rect)"""
+    import fitz  # PyMuPDF
+
+    x0, y0, x1, y1 = region
+    rect = page.rect
+    return fitz.Rect(rect.x0 + rect.width * x0, rect.y0 + rect.height * y0,
+                     rect.x0 + rect.width * x1, rect.y0 + rect.height * y1)
+
+
+def pixel_size(width, height, zoom):
+    """预计渲染后的像素尺寸 (宽, 高)，向上取整"""
+    return math.ceil(width * zoom), math.ceil(height * zoom)
+
+
+class PageRenderer:
+    """
+    单个请求的 PDF 渲染器 (非线程安全，每个请求创建一个)
+
+    参数:
+        dpi: 目标 DPI
+        max_pixels: 单页像素上限
+        max_side: 单页最长边上限 (通常为预处理的最长边，渲染更大只会被预处理缩小)
+        max_bytes: 同时持有的像素缓冲字节上限 (0 表示不限)
+
+    用法:
+        for group in renderer.groups(pdf_document, page_indexes, batch_size):
+            pixmaps = [renderer.render(pdf_document[i], zoom) for i, zoom in group]
+            ...  # 识别
+            del pixmaps
+            renderer.release()
+
+    groups() / render() 传入 region 时只渲染页面的该比例区域 (clip)。
+    """
+
+    def __init__(self, dpi=144, max_pixels=None, max_side=None, max_bytes=None):
+        self.dpi = dpi
+        self.max_pixels = max_pixels
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+
+        self.pages = 0
+        self.pixels = 0
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self.min_zoom = None
+        self.max_zoom = None
+
+    def zoom_for(self, page, region=None):
+        """一页 (或页面中 region 区域) 的渲染缩放，像素与字节预算按渲染区域的尺寸计算"""
+        rect = page.rect if region is None else region_rect(page, region)
+        return page_zoom(rect.width, rect.height, self.dpi, self.max_pixels, self.max_side, self.max_bytes)
+
+    def groups(self, pdf_document, page_indexes, batch_size, region=None):
+        """
+        把待渲染页分成批: 每批最多 batch_size 页，预计像素缓冲总量不超过 max_bytes
+
+        产出:
+            [(页索引, 缩放), ...]
+        """
+        group = []
+        group_bytes = 0
+        for i in page_indexes:
+            page = pdf_document[i]
+            zoom = self.zoom_for(page, region)
+            rect = page.rect if region is None else region_rect(page, region)
+            width, height = pixel_size(rect.width, rect.height, zoom)
+            page_bytes = width * height * BYTES_PER_PIXEL
+            if group and (len(group) >= batch_size
+                          or (self.max_bytes and group_bytes + page_bytes > self.max_bytes)):
+                yield group
+                group = []
+                group_bytes = 0
+            group.append((i, zoom))
+            group_bytes += page_bytes
+        if group:
+            yield group
+
+    def render(self, page, zoom, region=None):
+        """按给定缩放渲染一页 (或其 region 区域，RGB，无透明通道)，计入像素统计"""
+        import fitz  # PyMuPDF
+
+        clip = None if region is None else region_rect(page, region)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+        self.pages += 1
+        self.pixels += pix.width * pix.height
+        self.live_bytes += len(pix.samples_mv)
+        self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+        self.min_zoom = zoom if self.min_zoom is None else min(self.min_zoom, zoom)
+        self.max_zoom = zoom if self.max_zoom is None else max(self.max_zoom, zoom)
+        return pix
+
+    def release(self):
+        """调用方已释放本批的 pixmap"""
+        self.live_bytes = 0
+
+    def stats(self):
+        return {
+            'dpi': self.dpi,
+            'pages': self.pages,
+            'pixels': self.pixels,
+            'peak_bytes': self.peak_bytes,
+            'min_zoom': round(self.min_zoom, 3) if self.min_zoom is not None else None,
+            'max_zoom': round(self.max_zoom, 3) if self.max_zoom is not None else None,
+        }
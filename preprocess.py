@@ -0,0 +1,76 @@
+"""
+OCR 前图片预处理
+================
+
+在内存中完成 (不落盘):
+    - 按 EXIF 方向旋转 (手机照片)
+    - 统一转换为 RGB (CMYK / 调色板 / 灰度 / 带透明通道等)
+    - 限制最长边，超出时等比缩小，减少检测阶段的计算量和内存占用
+输出 PaddleOCR 使用的 HxWx3 uint8 BGR ndarray。
+"""
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+def prepare_image(source, max_side=None, stats=None):
+    """
+    预处理一张图片
+
+    参数:
+        source: 文件路径、图片字节，或 HxWx3 BGR ndarray (如 PDF 渲染页)
+        max_side: 最长边上限 (像素)，None 或 0 表示不缩放
+        stats: 可选字典，累加 images / pixels_in / pixels_out / pixels_saved / ms
+    返回:
+        HxWx3 uint8 BGR ndarray (ndarray 输入无需缩放时原样返回，不复制)
+    """
+    start = time.perf_counter()
+
+    if isinstance(source, np.ndarray):
+        height, width = source.shape[:2]
+        pixels_in = width * height
+        scale = _scale_for(width, height, max_side)
+        if scale < 1.0:
+            img = Image.fromarray(np.ascontiguousarray(source[:, :, ::-1]))
+            img = img.resize(_scaled_size(width, height, scale), Image.BILINEAR)
+            result = np.asarray(img)[:, :, ::-1]
+        else:
+            result = source
+    else:
+        img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        width, height = img.size
+        pixels_in = width * height
+        scale = _scale_for(width, height, max_side)
+        if scale < 1.0 and img.format == 'JPEG':
+            # JPEG 解码时直接按 1/2、1/4、1/8 缩小，避免解码全尺寸图片
+            img.draft('RGB', _scaled_size(width, height, scale))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        scale = _scale_for(img.width, img.height, max_side)
+        if scale < 1.0:
+            img = img.resize(_scaled_size(img.width, img.height, scale), Image.BILINEAR)
+        result = np.asarray(img)[:, :, ::-1]
+
+    if stats is not None:
+        pixels_out = result.shape[0] * result.shape[1]
+        stats['images'] = stats.get('images', 0) + 1
+        stats['pixels_in'] = stats.get('pixels_in', 0) + pixels_in
+        stats['pixels_out'] = stats.get('pixels_out', 0) + pixels_out
+        stats['pixels_saved'] = stats.get('pixels_saved', 0) + max(0, pixels_in - pixels_out)
+        stats['ms'] = round(stats.get('ms', 0.0) + (time.perf_counter() - start) * 1000, 2)
+
+    return result
+
+
+def _scale_for(width, height, max_side):
+    longest = max(width, height)
+    if not max_side or longest <= max_side:
+        return 1.0
+    return max_side / longest
+
+
+def _scaled_size(width, height, scale):
+    return max(1, round(width * scale)), max(1, round(height * scale))
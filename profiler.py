@@ -0,0 +1,224 @@
+"""
+按需请求采样分析
+================
+
+对一部分请求 (按比例随机抽样，或请求头携带密钥) 在处理线程上采集性能分析数据，
+无需重新部署即可查看 process_image / process_pdf 等内部耗时分布:
+
+    cprofile - cProfile 函数级统计，可下载为 pstats 文件 (snakeviz / pstats 查看)
+    stack    - 定时采样调用栈，可下载为 collapsed stacks (flamegraph.pl / speedscope 生成火焰图)
+
+分析结果保存在有界环形缓冲区中，超出上限时丢弃最早的记录。
+只采集处理请求的线程；引擎进程池、微批调度器等其他线程/进程中的耗时不在其中。
+"""
+import io
+import sys
+import time
+import uuid
+import hmac
+import random
+import pstats
+import marshal
+import logging
+import cProfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'stack')
+
+
+class StackSampler:
+    """后台线程定时采样目标线程的调用栈，累计为 collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+class ProfileSession:
+    """一次请求的分析会话 (在处理请求的线程上启动和结束)"""
+
+    def __init__(self, mode, interval):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._profile = None
+        self._sampler = None
+        if mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), interval)
+            self._sampler.start()
+
+    def stop(self):
+        """结束采集，返回记录字典"""
+        duration_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        record = {
+            'id': self.id,
+            'mode': self.mode,
+            'created_at': self.started_at,
+            'duration_ms': duration_ms,
+        }
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.create_stats()
+            record['stats'] = self._profile.stats
+        else:
+            self._sampler.stop()
+            record['stacks'] = self._sampler.stacks
+            record['samples'] = self._sampler.samples
+        return record
+
+
+class RequestProfiler:
+    """
+    请求采样分析器
+
+    参数:
+        sample_rate: 随机抽样比例 (0 ~ 1，0 表示只按请求头触发)
+        secret: 请求头触发及下载分析结果所需的密钥 (为空时禁用请求头触发和下载)
+        mode: 'cprofile' 或 'stack'
+        interval_ms: stack 模式的采样间隔 (毫秒)
+        max_profiles: 环形缓冲区保留的分析结果数
+    """
+
+    def __init__(self, sample_rate=0.0, secret='', mode='cprofile', interval_ms=5, max_profiles=50):
+        if mode not in MODES:
+            raise ValueError(f"mode 必须为 {', '.join(MODES)} 之一")
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.secret)
+
+    def check_secret(self, value):
+        """常量时间比较密钥；未配置密钥时始终返回 False"""
+        return bool(self.secret) and bool(value) and hmac.compare_digest(str(value), self.secret)
+
+    def start(self, header_value=None, mode=None):
+        """
+        判断是否分析当前请求，需要时开始采集
+
+        参数:
+            header_value: 请求头中的密钥 (匹配时强制分析)
+            mode: 请求指定的模式 (仅密钥匹配时生效)
+        返回:
+            ProfileSession 或 None
+        """
+        forced = self.check_secret(header_value)
+        if not forced and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return None
+        if not (forced and mode in MODES):
+            mode = self.mode
+        try:
+            session = ProfileSession(mode, self.interval)
+        except ValueError as e:
+            # Python 3.12+ 中 cProfile 同一时间只能有一个实例在采集
+            logger.warning(f"Profiler busy, request not profiled: {str(e)}")
+            with self._lock:
+                self.skipped += 1
+            return None
+        with self._lock:
+            self.started += 1
+        return session
+
+    def finish(self, session, method='', path='', status=None):
+        """结束采集并存入环形缓冲区"""
+        record = session.stop()
+        record.update({'method': method, 'path': path, 'status': status})
+        with self._lock:
+            self._profiles[record['id']] = record
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return record
+
+    def list(self):
+        """返回已保存分析结果的摘要 (最新的在前)"""
+        with self._lock:
+            records = list(self._profiles.values())
+        return [
+            {k: v for k, v in record.items() if k not in ('stats', 'stacks')}
+            for record in reversed(records)
+        ]
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'mode': self.mode,
+                'stored': len(self._profiles),
+                'max_profiles': self.max_profiles,
+                'started': self.started,
+                'skipped': self.skipped,
+            }
+
+
+def export_pstats(record):
+    """cprofile 记录导出为 pstats 文件内容 (与 Profile.dump_stats 相同格式)"""
+    return marshal.dumps(record['stats'])
+
+
+def export_text(record, limit=40):
+    """cprofile 记录导出为按累计耗时排序的文本报告"""
+    stream = io.StringIO()
+    stats = pstats.Stats(_LoadedProfile(record['stats']), stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+class _LoadedProfile:
+    """pstats.Stats 可加载的已采集统计 (替代 cProfile.Profile)"""
+
+    def __init__(self, stats):
+        self.stats = dict(stats)
+
+    def create_stats(self):
+        pass
+
+
+def export_collapsed(record):
+    """stack 记录导出为 collapsed stacks (每行: 栈;帧 次数)"""
+    return ''.join(f"{stack} {count}\n" for stack, count in
+                   sorted(record['stacks'].items(), key=lambda item: -item[1]))
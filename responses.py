@@ -0,0 +1,113 @@
+"""
+API 响应序列化
+==============
+
+    - 识别结果按 format 参数裁剪: full (text + lines)、lines、text、boxes (每行文本 + 分数 + 检测框)
+    - JSON 使用 orjson 编码 (未安装时使用标准库 json)，中文不转义为 \\uXXXX
+    - 客户端 Accept-Encoding 支持时压缩响应: br 优先 (需安装 brotli)，其次 gzip
+"""
+import gzip
+import json
+
+from flask import Response
+
+from metrics import stage
+
+RESPONSE_FORMATS = ('full', 'lines', 'text', 'boxes')
+
+
+def _load_orjson():
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
+
+def _load_brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+_orjson = _load_orjson()
+_brotli = _load_brotli()
+
+
+def dumps(obj):
+    """对象 -> 紧凑的 UTF-8 JSON 字节"""
+    if _orjson is not None:
+        return _orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def line_entries(lines):
+    """识别行 -> [{"text", "score", "box"}] (box 为相对页面宽高的比例 [x0, y0, x1, y1])"""
+    return [{'text': str(line), 'score': getattr(line, 'score', None), 'box': getattr(line, 'box', None)}
+            for line in lines]
+
+
+def ocr_text_fields(lines, response_format='full'):
+    """
+    按 format 构建识别文本字段
+
+    返回:
+        full:  {"text", "lines", "line_count"}
+        lines: {"lines", "line_count"}
+        text:  {"text", "line_count"}
+        boxes: {"lines": [{"text", "score", "box"}, ...], "line_count"}
+    """
+    lines = lines or []
+    fields = {}
+    if response_format in ('full', 'text'):
+        fields['text'] = '\n'.join(lines)
+    if response_format in ('full', 'lines'):
+        fields['lines'] = lines
+    elif response_format == 'boxes':
+        fields['lines'] = line_entries(lines)
+    fields['line_count'] = len(lines)
+    return fields
+
+
+def available_encodings():
+    return ('br', 'gzip') if _brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    按客户端 Accept-Encoding (werkzeug Accept 对象) 选择压缩算法，不压缩时返回 None
+    """
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(body, encoding, gzip_level=5, brotli_quality=4):
+    if encoding == 'br':
+        return _brotli.compress(body, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    return body
+
+
+def json_response(obj, status=200, encoding=None, min_size=1024, gzip_level=5, brotli_quality=4):
+    """
+    生成 JSON 响应 (序列化与压缩耗时计入 serialize / compress 阶段)
+
+    参数:
+        encoding: negotiate_encoding() 的结果，None 表示不压缩
+        min_size: 小于此字节数的响应不压缩
+    """
+    with stage('serialize'):
+        body = dumps(obj)
+
+    compressed = bool(encoding) and len(body) >= min_size
+    if compressed:
+        with stage('compress'):
+            body = compress(body, encoding, gzip_level, brotli_quality)
+
+    response = Response(body, status=status, mimetype='application/json')
+    if compressed:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,291 @@
+"""
+识别结果存储
+============
+
+保存识别结果 (每行一条识别文本)，供 /download 下载和 /api/extract 批量提取字段:
+    - 每个结果以随机 id 命名 (同一秒内的多个结果不会冲突)，按 id 前两位分目录存放
+    - SQLite 索引 (index.sqlite3) 记录原文件名、大小、内容哈希和创建时间，按 id 查询无需扫描目录
+    - 可选 gzip / zstd 压缩 (zstd 需安装 zstandard，未安装时改用 gzip)
+    - 超过保留期 (TTL) 的结果被清理；总大小超限时删除最早的结果
+
+旧版 results/ 下平铺的 .txt 文件在启动时登记到索引 (以文件名为 id)，原下载地址仍然有效。
+"""
+import io
+import os
+import re
+import gzip
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+SUFFIXES = {'none': '.txt', 'gzip': '.txt.gz', 'zstd': '.txt.zst'}
+INDEX_FILE = 'index.sqlite3'
+
+# 结果 id: 新结果为 32 位十六进制，旧版为 secure_filename 生成的文件名
+RESULT_ID_PATTERN = re.compile(r'^[A-Za-z0-9][\w.\-]{0,254}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    compression TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    line_count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at);
+"""
+COLUMNS = ('id', 'filename', 'path', 'compression', 'size', 'stored_bytes', 'sha256', 'line_count', 'created_at')
+INSERT_SQL = f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def _load_zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+class ResultStore:
+    """
+    有界、带索引的识别结果存储 (线程安全)
+
+    参数:
+        folder: 存储目录
+        max_bytes: 磁盘占用 (压缩后) 上限，0 表示不限
+        ttl_seconds: 保留时间，0 表示不按时间清理
+        compression: 'none' / 'gzip' / 'zstd'
+        sweep_interval: 两次过期清理之间的最短间隔 (秒)
+    """
+
+    def __init__(self, folder, max_bytes=1024 * 1024 * 1024, ttl_seconds=30 * 86400,
+                 compression='gzip', sweep_interval=60):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression 必须为 {', '.join(COMPRESSIONS)} 之一")
+        self._zstd = _load_zstd() if compression == 'zstd' else None
+        if compression == 'zstd' and self._zstd is None:
+            logger.warning("zstandard is not installed, storing results with gzip instead")
+            compression = 'gzip'
+
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compression = compression
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.evicted = 0
+        self.expired = 0
+
+        os.makedirs(self.folder, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.folder, INDEX_FILE),
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._import_legacy()
+        self._stored_bytes, self._entries = self._db.execute(
+            'SELECT COALESCE(SUM(stored_bytes), 0), COUNT(*) FROM results').fetchone()
+        self.sweep(force=True)
+        logger.info(f"Result store loaded: {self._entries} results, {self._stored_bytes} bytes ({self.compression})")
+
+    def put(self, texts, filename):
+        """
+        保存一个识别结果
+
+        参数:
+            texts: 识别行列表
+            filename: 原始上传文件名 (用于下载时的文件名)
+        返回:
+            结果 id
+        """
+        content = '\n'.join(texts).encode('utf-8')
+        result_id = uuid.uuid4().hex
+        relative_path = os.path.join(result_id[:2], result_id + SUFFIXES[self.compression])
+        path = os.path.join(self.folder, relative_path)
+        payload = self._compress(content)
+
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        row = (result_id, filename, relative_path, self.compression, len(content), len(payload),
+               hashlib.sha256(content).hexdigest(), len(texts), time.time())
+        with self._lock:
+            self._db.execute(INSERT_SQL, row)
+            self._stored_bytes += len(payload)
+            self._entries += 1
+        self.sweep()
+        return result_id
+
+    def get(self, result_id):
+        """按 id 查询结果元数据，不存在或已过期返回 None"""
+        if not RESULT_ID_PATTERN.match(result_id or ''):
+            return None
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is None:
+            return None
+        meta = dict(zip(COLUMNS, row))
+        if self.ttl_seconds and meta['created_at'] < time.time() - self.ttl_seconds:
+            return None
+        return meta
+
+    def path(self, meta):
+        """结果文件的绝对路径"""
+        return os.path.join(self.folder, meta['path'])
+
+    def read_bytes(self, meta):
+        """读取并解压结果内容 (UTF-8 字节)"""
+        with open(self.path(meta), 'rb') as f:
+            data = f.read()
+        if meta['compression'] == 'gzip':
+            return gzip.decompress(data)
+        if meta['compression'] == 'zstd':
+            zstd = self._zstd or _load_zstd()
+            if zstd is None:
+                raise RuntimeError('读取 zstd 压缩的结果需要安装 zstandard')
+            return zstd.ZstdDecompressor().decompress(data)
+        return data
+
+    def read_lines(self, result_id):
+        """按 id 读取识别行列表，不存在返回 None"""
+        meta = self.get(result_id)
+        if meta is None:
+            return None
+        try:
+            content = self.read_bytes(meta).decode('utf-8')
+        except OSError:
+            return None
+        return content.split('\n') if content else []
+
+    def download_name(self, meta):
+        """下载文件名: 原文件名_创建时间.txt (旧版结果沿用原文件名)"""
+        if meta['id'] == meta['path']:
+            return meta['id']
+        stem = os.path.splitext(meta['filename'])[0] or 'result'
+        return f"{stem}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(meta['created_at']))}.txt"
+
+    def delete(self, result_id):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT path, stored_bytes FROM results WHERE id = ?', (result_id,)).fetchone()
+            if row is None:
+                return False
+            self._db.execute('DELETE FROM results WHERE id = ?', (result_id,))
+            self._stored_bytes -= row[1]
+            self._entries -= 1
+        self._remove_files([row[0]])
+        return True
+
+    def sweep(self, force=False):
+        """
+        清理过期结果，并在总大小超限时按创建时间删除最早的结果
+
+        过期清理最多每 sweep_interval 秒执行一次 (force=True 时立即执行)。
+        返回:
+            删除的结果数
+        """
+        removed = []
+        now = time.time()
+        with self._lock:
+            if self.ttl_seconds and (force or now - self._last_sweep >= self.sweep_interval):
+                self._last_sweep = now
+                rows = self._db.execute(
+                    'SELECT id, path, stored_bytes FROM results WHERE created_at < ?',
+                    (now - self.ttl_seconds,)).fetchall()
+                self.expired += len(rows)
+                removed.extend(rows)
+            if self.max_bytes and self._stored_bytes - sum(r[2] for r in removed) > self.max_bytes:
+                excess = self._stored_bytes - sum(r[2] for r in removed) - self.max_bytes
+                skip = {r[0] for r in removed}
+                for row in self._db.execute('SELECT id, path, stored_bytes FROM results ORDER BY created_at'):
+                    if excess <= 0:
+                        break
+                    if row[0] in skip:
+                        continue
+                    removed.append(row)
+                    excess -= row[2]
+                    self.evicted += 1
+            if removed:
+                self._db.executemany('DELETE FROM results WHERE id = ?', [(r[0],) for r in removed])
+                self._stored_bytes -= sum(r[2] for r in removed)
+                self._entries -= len(removed)
+        self._remove_files([r[1] for r in removed])
+        return len(removed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': self._entries,
+                'stored_bytes': self._stored_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'compression': self.compression,
+                'expired': self.expired,
+                'evicted': self.evicted,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---------- 内部方法 ----------
+
+    def _compress(self, content):
+        if self.compression == 'gzip':
+            buffer = io.BytesIO()
+            # mtime=0: 相同内容压缩结果相同
+            with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6, mtime=0) as f:
+                f.write(content)
+            return buffer.getvalue()
+        if self.compression == 'zstd':
+            return self._zstd.ZstdCompressor(level=3).compress(content)
+        return content
+
+    def _remove_files(self, relative_paths):
+        for relative_path in relative_paths:
+            try:
+                os.remove(os.path.join(self.folder, relative_path))
+            except OSError:
+                pass
+
+    def _import_legacy(self):
+        """把旧版平铺在存储目录下的 .txt 结果登记到索引"""
+        rows = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if not name.endswith('.txt') or not os.path.isfile(path) or not RESULT_ID_PATTERN.match(name):
+                continue
+            if self._db.execute('SELECT 1 FROM results WHERE id = ?', (name,)).fetchone():
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                st = os.stat(path)
+            except OSError:
+                continue
+            line_count = content.count(b'\n') + 1 if content else 0
+            rows.append((name, name, name, 'none', len(content), len(content),
+                         hashlib.sha256(content).hexdigest(), line_count, st.st_mtime))
+        if rows:
+            self._db.executemany(INSERT_SQL, rows)
+            logger.info(f"Result store: indexed {len(rows)} legacy result files")
@@ -0,0 +1,232 @@
+"""
+OCR 引擎自动路由 (ocr_service=auto)
+===================================
+
+为每个引擎 (本地 PaddleOCR / OCR.space) 记录最近的每页耗时和进行中的请求数，
+每个请求路由到预计最快完成的引擎:
+
+    预计耗时 = 每页耗时中位数 × 页数 × (进行中请求数 // 并发容量 + 1)
+
+最近失败过的引擎在冷却期内排在最后。开启对冲 (hedge) 时，
+首选引擎超过其 p95 预计耗时仍未返回，就同时启动备选引擎，取先成功的结果。
+"""
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class _EngineState:
+    """单个引擎的滚动统计"""
+
+    def __init__(self, prior_ms_per_page, capacity, window):
+        self.prior_ms_per_page = prior_ms_per_page
+        self.capacity = max(1, capacity)
+        self.samples = deque(maxlen=window)  # 每页耗时 (毫秒)
+        self.in_flight = 0
+        self.completed = 0
+        self.failures = 0
+        self.last_failure = 0.0
+
+    def percentile(self, pct):
+        if not self.samples:
+            return self.prior_ms_per_page
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class _Sample:
+    """track() 产出的记录对象，调用方可在完成前修正页数"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+
+class LatencyRouter:
+    """
+    基于滚动延迟和排队深度的引擎路由器
+
+    参数:
+        engines: {引擎名: {'prior_ms_per_page': 无样本时的每页耗时估计, 'capacity': 并发容量}}
+        window: 每个引擎保留的最近样本数
+        hedge: 是否开启对冲请求
+        hedge_min_ms: 对冲等待时间下限 (毫秒)
+        failure_cooldown: 引擎失败后降为备选的时长 (秒)
+        max_workers: 对冲模式下执行识别的线程数
+    """
+
+    def __init__(self, engines, window=100, hedge=False, hedge_min_ms=500,
+                 failure_cooldown=30, max_workers=8):
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.failure_cooldown = failure_cooldown
+        self._engines = {
+            name: _EngineState(spec['prior_ms_per_page'], spec.get('capacity', 1), window)
+            for name, spec in engines.items()
+        }
+        self._lock = threading.Lock()
+        self._decide_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ocr-route') if hedge else None
+
+        self.decisions = {name: 0 for name in engines}
+        self.wins = {name: 0 for name in engines}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @contextmanager
+    def track(self, engine, pages=1, decided=None, reserved=False):
+        """
+        记录一次识别: 进入时计入进行中请求数，正常结束时记录每页耗时，异常时记录失败
+
+        参数:
+            decided: 可选 threading.Event，已置位时失败不计入 (对冲中已有结果，
+                     落选请求因上传文件被清理等原因失败不代表引擎不可用)
+            reserved: 进行中请求数已在路由决策时预先计入
+        用法:
+            with router.track('local', pages) as sample:
+                ...  # 可修改 sample.pages
+        """
+        state = self._engines.get(engine)
+        if state is None:
+            yield _Sample(pages)
+            return
+        sample = _Sample(pages)
+        if not reserved:
+            with self._lock:
+                state.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield sample
+        except BaseException:
+            with self._lock:
+                state.in_flight -= 1
+                if decided is None or not decided.is_set():
+                    state.failures += 1
+                    state.last_failure = time.monotonic()
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            state.in_flight -= 1
+            state.completed += 1
+            state.samples.append(elapsed_ms / max(1, sample.pages))
+
+    def estimate(self, engine, pages=1, pct=50):
+        """预计完成耗时 (毫秒)，包含排队等待"""
+        with self._lock:
+            state = self._engines[engine]
+            waves = state.in_flight // state.capacity + 1
+            return state.percentile(pct) * max(1, pages) * waves
+
+    def choose(self, pages=1):
+        """按预计耗时从快到慢返回引擎列表，冷却期内失败过的引擎排在最后"""
+        now = time.monotonic()
+
+        def key(name):
+            state = self._engines[name]
+            cooling = state.last_failure and now - state.last_failure < self.failure_cooldown
+            return (bool(cooling), self.estimate(name, pages))
+
+        return sorted(self._engines, key=key)
+
+    def run(self, fn, pages=1):
+        """
+        路由并执行一次识别 (耗时由路由器记录，fn 内部无需再调用 track())
+
+        参数:
+            fn: fn(引擎名, superseded) -> 结果；superseded 为 threading.Event，
+                对冲中另一引擎已返回结果时被设置，fn 应尽快停止 (调用方随后会释放上传文件等资源)
+            pages: 页数 (用于估算耗时和计算每页耗时)
+        返回:
+            (实际使用的引擎, 结果)；首选引擎失败时自动改用备选引擎
+        """
+        with self._decide_lock:
+            order = self.choose(pages)
+            primary = order[0]
+            secondary = order[1] if len(order) > 1 else None
+            with self._lock:
+                self.decisions[primary] += 1
+                # 决策时即计入进行中请求数，避免并发请求同时选中同一个引擎
+                self._engines[primary].in_flight += 1
+        decided = threading.Event()
+
+        def call(engine, reserved=False):
+            with self.track(engine, pages, decided, reserved):
+                return fn(engine, decided)
+
+        if not self.hedge or secondary is None:
+            try:
+                return self._won(primary, call(primary, reserved=True))
+            except Exception as e:
+                if secondary is None:
+                    raise
+                logger.warning(f"OCR engine {primary} failed, falling back to {secondary}: {str(e)}")
+                with self._lock:
+                    self.failovers += 1
+                return self._won(secondary, call(secondary))
+
+        delay_ms = max(self.hedge_min_ms, self.estimate(primary, pages, pct=95))
+        # 引擎调用在对冲线程中执行，沿用调用方的 ContextVar (阶段耗时、后台任务标记)
+        futures = {self._executor.submit(contextvars.copy_context().run, call, primary, True): primary}
+        done, _ = wait(futures, timeout=delay_ms / 1000, return_when=FIRST_COMPLETED)
+        if not done:
+            logger.info(f"Hedging {primary} with {secondary} after {delay_ms:.0f} ms")
+            with self._lock:
+                self.hedges += 1
+            futures[self._executor.submit(contextvars.copy_context().run, call, secondary)] = secondary
+
+        last_error = None
+        for future in as_completed(futures):
+            engine = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                logger.warning(f"OCR engine {engine} failed: {str(e)}")
+                continue
+            decided.set()
+            if engine != primary:
+                with self._lock:
+                    self.hedge_wins += 1
+            return self._won(engine, result)
+
+        if secondary in futures.values():
+            raise last_error
+        with self._lock:
+            self.failovers += 1
+        return self._won(secondary, call(secondary))
+
+    def stats(self):
+        with self._lock:
+            engines = {
+                name: {
+                    'in_flight': state.in_flight,
+                    'capacity': state.capacity,
+                    'completed': state.completed,
+                    'failures': state.failures,
+                    'samples': len(state.samples),
+                    'ms_per_page_p50': round(state.percentile(50), 1),
+                    'ms_per_page_p95': round(state.percentile(95), 1),
+                }
+                for name, state in self._engines.items()
+            }
+            return {
+                'hedge': self.hedge,
+                'engines': engines,
+                'decisions': dict(self.decisions),
+                'wins': dict(self.wins),
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'failovers': self.failovers,
+            }
+
+    def _won(self, engine, result):
+        with self._lock:
+            self.wins[engine] += 1
+        return engine, result
@@ -0,0 +1,256 @@
+"""
+上传文件缓冲
+============
+
+上传文件在请求处理中不经过 file.save() 落盘再读回:
+    - 表单解析时由 SpoolBuffer 接收文件内容，不超过 max_size 的文件只保存在内存
+    - 超过 max_size 时才转存到临时文件 (只写一次)，之后按路径交给 PyMuPDF / PIL
+识别流程通过 UploadBuffer 访问内容: PDF 用 fitz.open(stream=...) 打开，图片在内存中解码，
+OCR.space 直接转发内存中的字节。
+排队等待的异步任务用 to_disk() 把内容写到临时文件，不在排队期间占用内存。
+"""
+import io
+import os
+import shutil
+import tempfile
+
+
+class SpoolBuffer:
+    """
+    先写内存、超过 max_size 后转存临时文件的可读写缓冲 (werkzeug 表单解析的文件流)
+
+    参数:
+        max_size: 内存中最多保存的字节数
+        dir: 临时文件目录，None 表示系统临时目录
+    """
+
+    def __init__(self, max_size, dir=None):
+        self.max_size = max_size
+        self.dir = dir
+        self.path = None
+        self._file = io.BytesIO()
+
+    @property
+    def rolled(self):
+        """内容是否已转存到临时文件"""
+        return self.path is not None
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        if self.path is None and self._file.tell() + len(data) > self.max_size:
+            self._rollover()
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def detach(self):
+        """
+        取出内容并转移所有权，之后 close() 不再删除临时文件
+
+        返回:
+            (内存中的字节, None) 或 (None, 临时文件路径)
+        """
+        if self.path is None:
+            data, path = self._file.getvalue(), None
+        else:
+            self._file.flush()
+            data, path = None, self.path
+        self._file.close()
+        self._file = None
+        self.path = None
+        return data, path
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self.path is not None:
+            _remove(self.path)
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _rollover(self):
+        fd, path = tempfile.mkstemp(prefix='upload_', dir=self.dir)
+        f = os.fdopen(fd, 'w+b')
+        try:
+            f.write(self._file.getbuffer())
+        except BaseException:
+            f.close()
+            _remove(path)
+            raise
+        self._file.close()
+        self._file = f
+        self.path = path
+
+
+class UploadBuffer:
+    """
+    一个上传文件的内容: 内存中的字节 (data) 或临时文件 (path)，二者只有一个
+
+    参数:
+        filename: 原始文件名 (用于判断类型、转发 OCR.space)
+        data: 文件字节
+        path: 文件路径
+        owns_path: close() 时是否删除 path
+    """
+
+    def __init__(self, filename, data=None, path=None, owns_path=False):
+        if (data is None) == (path is None):
+            raise ValueError('data 和 path 必须且只能提供一个')
+        self.filename = filename
+        self.data = data
+        self.path = path
+        self.owns_path = owns_path
+        self.closed = False
+
+    @classmethod
+    def from_file_storage(cls, file, filename, max_size, dir=None):
+        """
+        接管 werkzeug FileStorage 的内容 (请求结束后仍可使用，如异步任务、流式响应)
+
+        文件流是 SpoolBuffer 时直接取出，不复制到磁盘；其他文件流先复制到新的 SpoolBuffer。
+        """
+        stream = file.stream
+        if not isinstance(stream, SpoolBuffer) or stream.closed:
+            spool = SpoolBuffer(max_size, dir=dir)
+            try:
+                shutil.copyfileobj(stream, spool, 1024 * 1024)
+            except BaseException:
+                spool.close()
+                raise
+            stream = spool
+        data, path = stream.detach()
+        return cls(filename, data=data, path=path, owns_path=path is not None)
+
+    @classmethod
+    def from_path(cls, path, filename=None):
+        """包装已有文件 (不会被删除)"""
+        return cls(filename or os.path.basename(path), path=path)
+
+    @property
+    def in_memory(self):
+        return self.data is not None
+
+    @property
+    def size(self):
+        self._check_open()
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.path)
+
+    @property
+    def source(self):
+        """PIL / PyMuPDF 可直接使用的内容: 字节或文件路径"""
+        self._check_open()
+        return self.data if self.data is not None else self.path
+
+    def getvalue(self):
+        """文件的全部字节 (转存到磁盘的文件会被完整读入)"""
+        self._check_open()
+        if self.data is not None:
+            return self.data
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open(self):
+        """以二进制只读文件对象打开"""
+        self._check_open()
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, 'rb')
+
+    def to_disk(self, dir=None):
+        """把内存中的内容写到临时文件 (close() 时删除) 并释放内存；已在磁盘上时不做任何事"""
+        self._check_open()
+        if self.data is None:
+            return
+        fd, path = tempfile.mkstemp(prefix='upload_', dir=dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.data)
+        except BaseException:
+            _remove(path)
+            raise
+        self.data = None
+        self.path = path
+        self.owns_path = True
+
+    def close(self):
+        """释放内存中的内容，删除自有的临时文件 (之后读取内容抛出 ValueError)"""
+        self.closed = True
+        self.data = None
+        if self.owns_path and self.path is not None:
+            _remove(self.path)
+            self.owns_path = False
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError(f'上传文件缓冲已释放: {self.filename}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        if self.closed:
+            return f"<UploadBuffer {self.filename!r} (closed)>"
+        where = 'memory' if self.in_memory else self.path
+        return f"<UploadBuffer {self.filename!r} ({where})>"
+
+
+def open_pdf(source):
+    """
+    打开 PDF: source 为 UploadBuffer、字节或文件路径
+
+    已释放的 UploadBuffer 抛出 ValueError (而不是打开一个空文档)
+    """
+    import fitz  # PyMuPDF
+
+    if isinstance(source, UploadBuffer):
+        source = source.source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype='pdf')
+    if source is None:
+        # fitz.open(None) 会返回一个新的空文档
+        raise ValueError('没有可打开的 PDF 内容')
+    return fitz.open(source)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass